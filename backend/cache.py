@@ -0,0 +1,151 @@
+"""
+In-process caching primitives shared by the API and services
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry expiry.
+
+    Entries expire `ttl` seconds after being set (overridable per entry) and
+    the least recently used entry is evicted once `maxsize` is reached.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CommitHooks:
+    """
+    Defers cache invalidation until the writing transaction commits.
+
+    Work is collected in session.info under `key` while the transaction runs
+    and handed to `apply` after commit; a rollback discards it. Writes made
+    without a session are applied immediately. `apply` receives the list of
+    recorded items, or None when everything is stale (e.g. after a bulk
+    statement whose rows are unknown).
+
+    Usage:
+        hooks = CommitHooks("catalog_dirty", lambda items: catalog_cache.invalidate())
+        hooks.watch(CATALOG_MODELS)
+        hooks.watch_bulk(CATALOG_MODELS)
+    """
+
+    # Stored in session.info when everything is stale
+    EVERYTHING_MARK = "*"
+
+    def __init__(self, key: str, apply: Callable[[Optional[list]], None]):
+        self.key = key
+        self.apply = apply
+        event.listen(Session, "after_commit", self._on_commit)
+        event.listen(Session, "after_rollback", self._on_rollback)
+
+    def record(self, session: Optional[Session], items: Optional[Iterable] = None):
+        """Queue `items` (or everything) for after the session's commit"""
+        if session is None:
+            self.apply(None if items is None else list(items))
+            return
+        pending = session.info.get(self.key)
+        if items is None:
+            session.info[self.key] = self.EVERYTHING_MARK
+        elif pending is not self.EVERYTHING_MARK:
+            session.info.setdefault(self.key, []).extend(items)
+
+    def watch(
+        self,
+        models: Iterable[type],
+        events: Sequence[str] = ("after_insert", "after_update", "after_delete"),
+        items: Optional[Callable[[Any], Optional[Iterable]]] = None,
+    ):
+        """
+        Record flushed ORM rows of `models`. `items(target)` returns what to
+        record for a row (None: everything, empty: nothing); by default a
+        row makes everything stale.
+        """
+        def on_flush(mapper, connection, target):
+            recorded = items(target) if items is not None else None
+            if recorded is not None:
+                recorded = list(recorded)
+                if not recorded:
+                    return
+            self.record(Session.object_session(target), recorded)
+
+        for model in models:
+            for event_name in events:
+                event.listen(model, event_name, on_flush)
+
+    def watch_bulk(
+        self,
+        models: Iterable[type],
+        when: Optional[Callable[[Any], bool]] = None,
+    ):
+        """
+        Treat ORM-enabled bulk INSERT/UPDATE/DELETE against `models` as
+        making everything stale, unless `when(orm_execute_state)` is false.
+        """
+        models = tuple(models)
+
+        def on_execute(orm_execute_state):
+            if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+                return
+            mapper = orm_execute_state.bind_mapper
+            if mapper is None or mapper.class_ not in models:
+                return
+            if when is not None and not when(orm_execute_state):
+                return
+            self.record(orm_execute_state.session)
+
+        event.listen(Session, "do_orm_execute", on_execute)
+
+    def _on_commit(self, session: Session):
+        pending = session.info.pop(self.key, None)
+        if pending is self.EVERYTHING_MARK:
+            self.apply(None)
+        elif pending:
+            self.apply(pending)
+
+    def _on_rollback(self, session: Session):
+        session.info.pop(self.key, None)
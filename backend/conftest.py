@@ -0,0 +1,32 @@
+"""
+Shared pytest fixtures for the backend
+"""
+
+import pytest
+
+from instrumentation import NPLUSONE_THRESHOLD, track_queries
+
+
+@pytest.fixture
+def no_n_plus_one(request):
+    """
+    Fail the test if any statement shape runs more than NPLUSONE_THRESHOLD times.
+
+    Override the threshold per test with @pytest.mark.nplusone_threshold(n).
+
+    Usage:
+        def test_leaderboard(client, no_n_plus_one):
+            client.get("/api/leaderboard")
+    """
+    marker = request.node.get_closest_marker("nplusone_threshold")
+    threshold = marker.args[0] if marker else NPLUSONE_THRESHOLD
+    with track_queries(threshold, raise_on_repeat=False, label=request.node.nodeid) as tracker:
+        yield tracker
+    if tracker.violations:
+        pytest.fail(tracker.report(), pytrace=False)
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "nplusone_threshold(n): repeats of one statement shape allowed by no_n_plus_one"
+    )
@@ -3,10 +3,13 @@ Database configuration and session management
 """
 
 from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
 import os
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 # Database URL from environment or default for development
 DATABASE_URL = os.getenv(
@@ -39,6 +42,56 @@ SessionLocal = sessionmaker(
 )
 
 
+# ============================================
+# ASYNC ENGINE (used by the API request handlers)
+# ============================================
+
+def _async_url(url: str) -> str:
+    """Map a sync driver URL to its asyncio driver (asyncpg / aiosqlite)"""
+    for sync_prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+    )
+else:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=20,
+        max_overflow=40,
+        pool_pre_ping=True,
+        echo=False,
+    )
+
+# expire_on_commit=False: attributes stay loaded after commit, since lazy
+# refreshes are not possible on an AsyncSession
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+def dialect_insert(db: Session):
+    """
+    The session's dialect-specific insert() (PostgreSQL or SQLite), which
+    supports on_conflict_do_nothing / on_conflict_do_update.
+    """
+    return pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+
 def get_db() -> Generator[Session, None, None]:
     """
     Dependency for FastAPI to get database session.
@@ -55,6 +108,23 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency for FastAPI to get an async database session.
+    
+    Queries are awaited, so the event loop keeps serving other requests
+    while this one waits on the database.
+    
+    Usage:
+        @app.get("/items/")
+        async def read_items(db: AsyncSession = Depends(get_async_db)):
+            result = await db.execute(select(Item))
+            return result.scalars().all()
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     """Initialize database tables"""
     from models import Base
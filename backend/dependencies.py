@@ -4,15 +4,20 @@ Validates DEWA SSO tokens and manages current user context
 """
 
 import os
+import hashlib
+import time
 import jwt
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from fastapi import Depends, HTTPException, status, Request
-from fastapi.security import HTTPBearer, HTTPAuthCredentials
-from sqlalchemy.orm import Session
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import Employee
 from schemas import CurrentUser, TokenPayload
-from database import get_db
+from database import get_async_db
+from cache import CommitHooks, TTLCache
+from jwks import JWKSKeyStore
 
 # Security configuration
 security = HTTPBearer()
@@ -21,6 +26,23 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 DEWA_TOKEN_ISSUER = os.getenv("DEWA_TOKEN_ISSUER", "https://login.dewa.gov.ae")
 DEWA_AUDIENCE = os.getenv("DEWA_AUDIENCE", "ai-hub.dewa.gov.ae")
 
+# Asymmetric verification against DEWA's published keys. When JWKS_URL is
+# set (URL, file:// URL or file path) tokens must be signed by one of its keys.
+JWKS_URL = os.getenv("JWKS_URL")
+JWKS_ALGORITHMS = os.getenv("JWKS_ALGORITHMS", "RS256,ES256").split(",")
+JWKS_REFRESH_SECONDS = float(os.getenv("JWKS_REFRESH_SECONDS", "3600"))
+
+jwks_store = JWKSKeyStore(JWKS_URL, refresh_interval=JWKS_REFRESH_SECONDS) if JWKS_URL else None
+
+# Auth caches - verified tokens live until they expire, employee lookups
+# for USER_CACHE_TTL seconds or until the employee row changes
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "50000"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "20000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE)
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
 
 class AuthenticationError(HTTPException):
     """Authentication error response"""
@@ -41,33 +63,46 @@ class AuthorizationError(HTTPException):
         )
 
 
+def _signing_key(token: str):
+    """Return (key, algorithms) to verify a token with"""
+    if jwks_store is None:
+        return SECRET_KEY, [ALGORITHM]
+    
+    kid = jwt.get_unverified_header(token).get("kid")
+    entry = jwks_store.get_key(kid)
+    if entry is None:
+        raise AuthenticationError("Unknown token signing key")
+    
+    key, key_algorithm = entry
+    # Pin the algorithm to the key's own when the JWKS declares one
+    if key_algorithm:
+        return key, [key_algorithm] if key_algorithm in JWKS_ALGORITHMS else []
+    return key, JWKS_ALGORITHMS
+
+
 def decode_token(token: str) -> TokenPayload:
     """
     Decode and validate JWT token from DEWA SSO.
     
-    In production, validate against DEWA's public keys.
-    For now, uses shared secret key.
+    With JWKS_URL configured, validates RS256/ES256 signatures against
+    DEWA's public keys (pre-parsed and cached by kid). Otherwise uses the
+    shared secret key.
     """
     try:
+        key, algorithms = _signing_key(token)
+        if not algorithms:
+            raise AuthenticationError("Token signing algorithm not allowed")
+        
+        # Signature, issuer, audience and expiry are all checked here
         payload = jwt.decode(
             token,
-            SECRET_KEY,
-            algorithms=[ALGORITHM],
+            key,
+            algorithms=algorithms,
+            audience=DEWA_AUDIENCE,
+            issuer=DEWA_TOKEN_ISSUER,
             options={"verify_signature": True}
         )
         
-        # Validate issuer and audience
-        if payload.get("iss") != DEWA_TOKEN_ISSUER:
-            raise AuthenticationError("Invalid token issuer")
-        
-        if DEWA_AUDIENCE not in payload.get("aud", []):
-            raise AuthenticationError("Invalid token audience")
-        
-        # Check expiration
-        exp = payload.get("exp")
-        if exp and datetime.fromtimestamp(exp) < datetime.utcnow():
-            raise AuthenticationError("Token has expired")
-        
         return TokenPayload(**payload)
     
     except jwt.ExpiredSignatureError:
@@ -76,14 +111,60 @@ def decode_token(token: str) -> TokenPayload:
         raise AuthenticationError(f"Invalid token: {str(e)}")
 
 
+def decode_token_cached(token: str) -> TokenPayload:
+    """
+    Decode a token, reusing the result for repeat presentations.
+    
+    Keyed by SHA-256 of the token so raw tokens are never held as keys.
+    Entries expire with the token itself.
+    """
+    key = hashlib.sha256(token.encode()).hexdigest()
+    payload = _token_cache.get(key)
+    if payload is None:
+        payload = decode_token(token)
+        remaining = payload.exp - time.time()
+        if remaining > 0:
+            _token_cache.set(key, payload, ttl=remaining)
+    return payload
+
+
+async def resolve_user(db: AsyncSession, email: str) -> Optional[CurrentUser]:
+    """Look up the CurrentUser for an email, via the employee cache"""
+    user = _user_cache.get(email)
+    if user is not None:
+        return user
+    
+    employee = await db.scalar(select(Employee).filter(Employee.email == email).limit(1))
+    if not employee:
+        return None
+    
+    user = CurrentUser(
+        employee_id=employee.employee_id,
+        email=employee.email,
+        display_name=employee.display_name,
+        department_id=employee.department_id,
+        role=employee.role,
+        status=employee.status,
+    )
+    _user_cache.set(email, user)
+    return user
+
+
+def invalidate_user(*emails: str):
+    """Drop cached employee lookups, e.g. after a status or department change"""
+    for email in emails:
+        _user_cache.pop(email)
+
+
 async def get_current_user(
-    credentials: HTTPAuthCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
 ) -> CurrentUser:
     """
     Get current authenticated user from JWT token and database.
     
     Validates token and fetches user from employees table.
+    Both steps are cached, so repeat requests normally skip the database.
     Can be used as a dependency in route handlers.
     
     Raises:
@@ -95,12 +176,10 @@ async def get_current_user(
             return user
     """
     # Decode and validate token
-    token_payload = decode_token(credentials.credentials)
+    token_payload = decode_token_cached(credentials.credentials)
     
-    # Lookup user in database by email
-    user = db.query(Employee).filter(
-        Employee.email == token_payload.email
-    ).first()
+    # Lookup user by email
+    user = await resolve_user(db, token_payload.email)
     
     if not user:
         raise AuthenticationError("User not found in system")
@@ -108,20 +187,12 @@ async def get_current_user(
     if user.status != "active":
         raise AuthenticationError("User account is not active")
     
-    # Return current user context
-    return CurrentUser(
-        employee_id=user.employee_id,
-        email=user.email,
-        display_name=user.display_name,
-        department_id=user.department_id,
-        role=user.role,
-        status=user.status,
-    )
+    return user
 
 
 async def get_current_user_optional(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Optional[CurrentUser]:
     """
     Optionally get current user. Returns None if not authenticated.
@@ -135,26 +206,51 @@ async def get_current_user_optional(
     token = auth_header.replace("Bearer ", "")
     
     try:
-        token_payload = decode_token(token)
-        user = db.query(Employee).filter(
-            Employee.email == token_payload.email
-        ).first()
+        token_payload = decode_token_cached(token)
+        user = await resolve_user(db, token_payload.email)
         
         if user and user.status == "active":
-            return CurrentUser(
-                employee_id=user.employee_id,
-                email=user.email,
-                display_name=user.display_name,
-                department_id=user.department_id,
-                role=user.role,
-                status=user.status,
-            )
+            return user
     except:
         pass
     
     return None
 
 
+# ============================================
+# CACHE INVALIDATION
+# ============================================
+
+_CACHED_FIELDS = ("email", "status", "department_id", "role", "display_name")
+
+
+def _changed_emails(employee) -> List[str]:
+    """Emails whose cached CurrentUser an employee update makes out of date"""
+    state = inspect(employee)
+    emails = set()
+    for field in _CACHED_FIELDS:
+        history = state.attrs[field].history
+        if history.has_changes():
+            emails.add(employee.email)
+            if field == "email":
+                emails.update(e for e in history.deleted if e)
+    return list(emails)
+
+
+def _invalidate_users(emails: Optional[list]):
+    if emails is None:
+        _user_cache.clear()
+    else:
+        invalidate_user(*set(emails))
+
+
+_hooks = CommitHooks("auth_invalidate_emails", _invalidate_users)
+_hooks.watch([Employee], events=("after_update",), items=_changed_emails)
+_hooks.watch([Employee], events=("after_delete",), items=lambda employee: [employee.email])
+# Bulk UPDATE/DELETE rows are unknown, so they drop every cached user
+_hooks.watch_bulk([Employee], when=lambda state: not state.is_insert)
+
+
 def require_role(*allowed_roles: str):
     """
     Dependency factory for role-based access control.
@@ -0,0 +1,434 @@
+"""
+Request instrumentation - per-route latency and database usage
+
+An ASGI middleware opens a stats record per request and SQLAlchemy cursor
+hooks add every statement's duration and row count to it. On completion the
+record is folded into per-route histograms and counters, rendered in
+Prometheus text format by render_metrics(). With SERVER_TIMING enabled the
+same numbers are sent back in a Server-Timing response header.
+
+Metrics are per process; with several uvicorn workers each exposes its own.
+
+N+1 detection (development and tests): with NPLUSONE_DETECT=log or raise,
+every request fingerprints its statements and flags any statement shape that
+runs more than NPLUSONE_THRESHOLD times, with the application stack that
+issued it. In raise mode the response is held back until the handler
+finishes and replaced by a 500 carrying the report when a shape repeated
+(event streams are passed through unchecked). Tests can wrap any block in track_queries():
+
+    with track_queries(threshold=3):
+        client.get("/api/leaderboard")      # raises NPlusOneError on a repeat
+
+or use the `no_n_plus_one` pytest fixture (conftest.py), which fails the test
+if any statement shape repeats more than NPLUSONE_THRESHOLD times.
+"""
+
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+
+try:
+    import greenlet
+except ImportError:  # only installed with the async drivers
+    greenlet = None
+from sqlalchemy.engine import Engine
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+# off | log | raise
+NPLUSONE_DETECT = os.getenv("NPLUSONE_DETECT", "off").lower()
+NPLUSONE_THRESHOLD = int(os.getenv("NPLUSONE_THRESHOLD", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+    """Database work done while serving one request"""
+
+    __slots__ = ("statements", "db_seconds", "rows")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Stats for the request being served, or None outside a request"""
+    return _current.get()
+
+
+# ============================================
+# METRICS REGISTRY
+# ============================================
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.responses: Dict[str, int] = {}
+
+
+class MetricsRegistry:
+    """Per (method, route) request metrics"""
+
+    def __init__(self):
+        self._routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self._lock = threading.Lock()
+
+    def record(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = RouteMetrics()
+            metrics.latency.observe(seconds)
+            metrics.statements.observe(stats.statements)
+            metrics.db_seconds += stats.db_seconds
+            metrics.rows += stats.rows
+            status_key = str(status)
+            metrics.responses[status_key] = metrics.responses.get(status_key, 0) + 1
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines: List[str] = []
+
+            def histogram(name: str, help_text: str, pick):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (method, route), metrics in routes:
+                    hist = pick(metrics)
+                    labels = _labels(method=method, route=route)
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets + (float("inf"),), hist.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(float(bound))
+                        lines.append(f"{name}_bucket{{{labels},le=\"{le}\"}} {cumulative}")
+                    lines.append(f"{name}_sum{{{labels}}} {hist.total}")
+                    lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+            def counter(name: str, help_text: str, pick):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (method, route), metrics in routes:
+                    lines.append(f"{name}{{{_labels(method=method, route=route)}}} {pick(metrics)}")
+
+            lines.append("# HELP http_requests_total Requests served, by route and status")
+            lines.append("# TYPE http_requests_total counter")
+            for (method, route), metrics in routes:
+                for status, count in sorted(metrics.responses.items()):
+                    lines.append(
+                        f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}"
+                    )
+            histogram("http_request_duration_seconds", "Request latency by route", lambda m: m.latency)
+            histogram("http_request_db_statements", "SQL statements per request by route", lambda m: m.statements)
+            counter("http_request_db_seconds_total", "Time spent in SQL statements by route", lambda m: m.db_seconds)
+            counter("http_request_db_rows_total", "Rows fetched or affected by SQL statements by route", lambda m: m.rows)
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+def _labels(**labels: str) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+
+registry = MetricsRegistry()
+
+
+def render_metrics() -> str:
+    return registry.render()
+
+
+# ============================================
+# N+1 DETECTION
+# ============================================
+
+class NPlusOneError(Exception):
+    """Raised when a statement shape repeats more than the threshold in one scope"""
+
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),                        # string literals
+    (re.compile(r"%\(\w+\)s|\$\d+|(?<!:):\w+|\b\d+(?:\.\d+)?\b"), "?"),  # params, numbers
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?)"),           # IN lists of any length
+    (re.compile(r"\s+"), " "),
+)
+
+
+def fingerprint(statement: str) -> str:
+    """Statement shape with literals, bind parameters and IN-list lengths erased"""
+    for pattern, replacement in _FINGERPRINT_RULES:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+def _application_stack() -> List[str]:
+    """Formatted frames from this codebase (not libraries, not this module)"""
+    frames = traceback.extract_stack()
+    # Async sessions run statements in a worker greenlet; the handler that
+    # awaited them is on the parent greenlet's (suspended) stack
+    current = greenlet.getcurrent() if greenlet is not None else None
+    while current is not None and current.parent is not None:
+        current = current.parent
+        if current.gr_frame is not None:
+            frames = traceback.extract_stack(current.gr_frame) + frames
+    frames = [
+        frame for frame in frames
+        if frame.filename.startswith(_BACKEND_DIR)
+        and "site-packages" not in frame.filename
+        and frame.filename != os.path.abspath(__file__)
+    ]
+    return traceback.format_list(frames)
+
+
+class QueryTracker:
+    """Counts statement fingerprints in one scope and records repeats over the threshold"""
+
+    def __init__(self, threshold: int = NPLUSONE_THRESHOLD, label: str = ""):
+        self.threshold = threshold
+        self.label = label
+        self.counts: Counter = Counter()
+        self.violations: List[Tuple[str, List[str]]] = []
+        self.enabled = True
+
+    def observe(self, statement: str):
+        if not self.enabled:
+            return
+        shape = fingerprint(statement)
+        self.counts[shape] += 1
+        if self.counts[shape] == self.threshold + 1:
+            stack = _application_stack()
+            self.violations.append((shape, stack))
+            logger.warning(
+                f"Possible N+1{' in ' + self.label if self.label else ''}: statement ran more than "
+                f"{self.threshold} times: {shape}\n{''.join(stack)}"
+            )
+
+    def report(self) -> str:
+        lines = [f"{len(self.violations)} repeated statement(s){' in ' + self.label if self.label else ''}:"]
+        for shape, stack in self.violations:
+            lines.append(f"  x{self.counts[shape]}: {shape}")
+            lines.extend("    " + line for line in "".join(stack).rstrip().splitlines())
+        return "\n".join(lines)
+
+
+_tracker: ContextVar[Optional[QueryTracker]] = ContextVar("query_tracker", default=None)
+
+
+@contextmanager
+def track_queries(
+    threshold: int = NPLUSONE_THRESHOLD,
+    raise_on_repeat: bool = True,
+    label: str = "",
+) -> Iterator[QueryTracker]:
+    """
+    Track statements executed inside the block (the test fixture hook).
+
+    Raises:
+        NPlusOneError: On exit, if raise_on_repeat and any shape repeated
+    """
+    tracker = QueryTracker(threshold, label)
+    token = _tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _tracker.reset(token)
+    if raise_on_repeat and tracker.violations:
+        raise NPlusOneError(tracker.report())
+
+
+# ============================================
+# SQLALCHEMY HOOKS
+# ============================================
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.observe(statement)
+    if _current.get() is not None:
+        conn.info.setdefault("instrumentation_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("instrumentation_started")
+    if stats is None or not started:
+        return
+    stats.db_seconds += time.perf_counter() - started.pop()
+    stats.statements += 1
+    # The async drivers' adapted cursors buffer the whole result on execute;
+    # psycopg2 reports SELECT row counts in rowcount; -1 means unknown
+    buffered = getattr(cursor, "_rows", None)
+    rows = len(buffered) if cursor.description is not None and buffered is not None else cursor.rowcount
+    if rows > 0:
+        stats.rows += rows
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    # here so the connection's list does not grow with every error
+    conn = context.connection
+    started = conn.info.get("instrumentation_started") if conn is not None else None
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.db_seconds += elapsed
+        stats.statements += 1
+
+
+# ============================================
+# ASGI MIDDLEWARE
+# ============================================
+
+class InstrumentationMiddleware:
+    """Records latency and SQL usage per route template (e.g. /api/tools/{tool_id}/access)"""
+
+    def __init__(
+        self,
+        app,
+        server_timing: bool = SERVER_TIMING,
+        detect_n_plus_one: str = NPLUSONE_DETECT,
+    ):
+        self.app = app
+        self.server_timing = server_timing
+        self.detect_n_plus_one = detect_n_plus_one
+        self._templates: Dict[object, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        tracker = tracker_token = None
+        if self.detect_n_plus_one in ("log", "raise"):
+            tracker = QueryTracker(label=f"{scope['method']} {scope['path']}")
+            tracker_token = _tracker.set(tracker)
+        # With detection off the context is left alone, so a tracker opened
+        # around the request (a test's track_queries() block) keeps counting
+        started = time.perf_counter()
+        status = 500
+        # Raise mode holds the response until the handler is done, so a
+        # violation can still turn it into a 500; None once passed through
+        held: Optional[List[dict]] = [] if tracker is not None and self.detect_n_plus_one == "raise" else None
+
+        async def send_wrapper(message):
+            nonlocal status, held
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if tracker is not None and _is_event_stream(message):
+                    # A stream repeats the same queries by design
+                    tracker.enabled = False
+                    held = None
+                if self.server_timing:
+                    elapsed = time.perf_counter() - started
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", _server_timing(stats, elapsed).encode("latin-1"))
+                    ]
+            if held is not None:
+                held.append(message)
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+            if held is not None and tracker.violations:
+                status = 500
+                held = [
+                    {
+                        "type": "http.response.start",
+                        "status": 500,
+                        "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+                    },
+                    {"type": "http.response.body", "body": tracker.report().encode("utf-8")},
+                ]
+            for message in held or ():
+                await send(message)
+        finally:
+            _current.reset(token)
+            if tracker_token is not None:
+                _tracker.reset(tracker_token)
+            registry.record(
+                scope["method"],
+                self._route_template(scope),
+                status,
+                time.perf_counter() - started,
+                stats,
+            )
+
+    def _route_template(self, scope) -> str:
+        # The router stores the matched endpoint in the (shared) scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        template = self._templates.get(endpoint)
+        if template is None:
+            app = scope.get("app")
+            for route in getattr(app, "routes", []):
+                if getattr(route, "endpoint", None) is endpoint:
+                    template = route.path
+                    break
+            template = self._templates[endpoint] = template or UNMATCHED_ROUTE
+        return template
+
+
+def _is_event_stream(message) -> bool:
+    return any(
+        name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+        for name, value in message.get("headers", [])
+    )
+
+
+def _server_timing(stats: RequestStats, elapsed: float) -> str:
+    return (
+        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.statements} queries", '
+        f"app;dur={elapsed * 1000:.1f}"
+    )
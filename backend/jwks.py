@@ -0,0 +1,121 @@
+"""
+JWKS key store for verifying DEWA SSO tokens signed with RS256/ES256
+
+Keys are parsed once into key objects and looked up by `kid` on the request
+path. A single background thread refreshes the key set on a schedule and when
+an unknown `kid` is seen, so request threads never wait on a key fetch.
+"""
+
+import json
+import logging
+import threading
+import time
+import urllib.request
+from typing import Dict, Optional, Tuple
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+
+class JWKSKeyStore:
+    """Cached, rotating set of public keys from a JWKS document"""
+
+    def __init__(
+        self,
+        source: str,
+        refresh_interval: float = 3600.0,
+        min_refresh_interval: float = 30.0,
+        fetch_timeout: float = 5.0,
+    ):
+        """
+        Args:
+            source: https:// or http:// URL, file:// URL or local file path
+            refresh_interval: Seconds between scheduled refreshes
+            min_refresh_interval: Floor between refreshes triggered by unknown kids
+            fetch_timeout: Seconds to wait for the JWKS endpoint
+        """
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.fetch_timeout = fetch_timeout
+        self._keys: Dict[str, Tuple[object, Optional[str]]] = {}
+        self._last_refresh = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def get_key(self, kid: Optional[str]) -> Optional[Tuple[object, Optional[str]]]:
+        """
+        Return (key object, algorithm) for a kid without blocking.
+
+        An unknown kid schedules a background refresh and returns None; the
+        caller should reject the token and the client retry after rotation.
+        """
+        entry = self._keys.get(kid)
+        if entry is None:
+            self.request_refresh()
+        return entry
+
+    def request_refresh(self):
+        """Ask the refresher thread to reload the key set"""
+        self._ensure_started()
+        self._wake.set()
+
+    def refresh(self):
+        """Fetch and parse the JWKS document, then swap the key map in"""
+        document = self._fetch()
+        keys = {}
+        for jwk in jwt.PyJWKSet.from_dict(document).keys:
+            if jwk.key_id:
+                keys[jwk.key_id] = (jwk.key, jwk.algorithm_name)
+        self._keys = keys
+        self._last_refresh = time.monotonic()
+        logger.info(f"Loaded {len(keys)} signing keys from JWKS")
+
+    def start(self):
+        """Load keys now (outside any request) and start the refresher thread"""
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Initial JWKS load failed: {e}")
+        self._ensure_started()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="jwks-refresh", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            woken = self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            if woken:
+                # Rate-limit refreshes triggered by unknown kids
+                wait = self._last_refresh + self.min_refresh_interval - time.monotonic()
+                if wait > 0 and self._stop.wait(wait):
+                    return
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"JWKS refresh failed, keeping previous keys: {e}")
+
+    def _fetch(self) -> dict:
+        if self.source.startswith(("http://", "https://")):
+            with urllib.request.urlopen(self.source, timeout=self.fetch_timeout) as response:
+                return json.load(response)
+        path = self.source[len("file://"):] if self.source.startswith("file://") else self.source
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
@@ -1,18 +1,53 @@
 """
 Test data loader - imports JSON test data into the database
 Maps test data format to database models
+
+Rows are built in chunks and written with set-based upserts: COPY into a
+staging table on PostgreSQL, executemany INSERT ... ON CONFLICT on SQLite.
+Lookup tables are read once into dicts instead of being queried per user.
 """
 
+import argparse
+import codecs
+import csv
+import io
 import json
 import os
+import time
 from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import Table, text
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine
+from database import SessionLocal, dialect_insert, engine
 from models import (
     Base, Department, Employee, AIAdoptionMetrics, AITool, 
     UserBadge, UserPoints, LearningResource, UserLearningProgress,
     GamificationBadge
 )
+from services.rollup_service import rebuild_rollups
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+TEST_DATA_DIR = "data"
+JSON_FILES = [
+    "users_testdata_sample.json",
+    "users_comprehensive_testdata_part1.json",
+    "users_comprehensive_testdata_part2.json",
+    "users_testdata_batch2.json",
+    "users_testdata.json",
+]
+
+# Users per chunk; each chunk is written and committed as one unit
+BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "1000"))
+
+# Progress of an interrupted load, removed once a load completes
+CHECKPOINT_FILE = os.getenv("LOAD_CHECKPOINT", os.path.join(TEST_DATA_DIR, ".load_checkpoint.json"))
+
+# Month the test data's "current" metrics belong to (January 2026)
+CURRENT_PERIOD = (1, 2026)
 
 # ============================================
 # STATIC DATA
@@ -92,215 +127,531 @@ def create_user_dict(test_user: dict) -> dict:
         "last_active": test_user.get("lastActiveDate", "2026-01-28"),
     }
 
+
+def trailing_periods(month: int, year: int, count: int) -> List[tuple]:
+    """Return `count` (month, year) pairs ending at the given month, oldest first"""
+    index = year * 12 + month - 1
+    return [
+        ((i % 12) + 1, i // 12)
+        for i in range(index - count + 1, index + 1)
+    ]
+
+
+RECORD_SEPARATORS = " \t\r\n,[]\ufeff"
+
+
+class JsonRecordStream:
+    """
+    Incrementally parse user records from a JSON file.
+    
+    Accepts a top-level JSON array or newline-delimited JSON. Only one read
+    buffer plus the record being decoded is held in memory, so peak usage
+    does not depend on file size.
+    """
+
+    READ_SIZE = 1 << 16
+
+    def __init__(self, path: str):
+        self.path = path
+        self.total_bytes = os.path.getsize(path)
+        self.bytes_read = 0
+
+    def __iter__(self) -> Iterator[dict]:
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer, pos, eof = "", 0, False
+        
+        with open(self.path, "rb") as f:
+            while True:
+                # Skip array brackets, separators and whitespace between records
+                while pos < len(buffer) and buffer[pos] in RECORD_SEPARATORS:
+                    pos += 1
+                
+                if pos < len(buffer):
+                    try:
+                        record, pos = decoder.raw_decode(buffer, pos)
+                    except json.JSONDecodeError:
+                        # Record continues past the buffer - unless there is no more input
+                        if eof:
+                            raise
+                    else:
+                        yield record
+                        continue
+                elif eof:
+                    return
+                
+                # Drop consumed text and append the next block of the file
+                block = f.read(self.READ_SIZE)
+                self.bytes_read += len(block)
+                eof = not block
+                buffer = buffer[pos:] + text_decoder.decode(block, final=eof)
+                pos = 0
+
+
+def skip_through(records: Iterator[dict], user_id: int) -> Iterator[dict]:
+    """
+    Advance past the record with the given userId (resume after a checkpoint).
+
+    Raises:
+        ValueError: If the stream ends without that record, e.g. because the
+            file was regenerated since the checkpoint was written
+    """
+    for record in records:
+        if record.get("userId") == user_id:
+            break
+    else:
+        raise ValueError(
+            f"Checkpointed userId {user_id} not found in the file; "
+            f"rerun with --restart to load it from the beginning"
+        )
+    yield from records
+
+
+def chunked(items: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    """Group an iterator into lists of at most `size` items"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class LoadCheckpoint:
+    """
+    Records progress after every committed chunk so an interrupted load can
+    continue: completed files plus the last committed userId of the current one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {"completed_files": [], "file": None, "last_user_id": None}
+
+    def load(self) -> "LoadCheckpoint":
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.state.update(json.load(f))
+        return self
+
+    def is_completed(self, file_name: str) -> bool:
+        return file_name in self.state["completed_files"]
+
+    def resume_point(self, file_name: str) -> Optional[int]:
+        if self.state["file"] == file_name:
+            return self.state["last_user_id"]
+        return None
+
+    def committed(self, file_name: str, last_user_id: int):
+        self.state["file"] = file_name
+        self.state["last_user_id"] = last_user_id
+        self._save()
+
+    def file_done(self, file_name: str):
+        self.state["completed_files"].append(file_name)
+        self.state["file"] = None
+        self.state["last_user_id"] = None
+        self._save()
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _save(self):
+        # Write-then-rename so a crash never leaves a truncated checkpoint
+        tmp_path = f"{self.path}.tmp"
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+
+# ============================================
+# BULK WRITER
+# ============================================
+
+class LoadStats:
+    """Rows written and time spent per table"""
+
+    def __init__(self):
+        self.tables: Dict[str, List[float]] = {}
+
+    def record(self, table: str, rows: int, seconds: float):
+        entry = self.tables.setdefault(table, [0, 0.0])
+        entry[0] += rows
+        entry[1] += seconds
+
+    def report(self):
+        for table, (rows, seconds) in self.tables.items():
+            rate = rows / seconds if seconds > 0 else float(rows)
+            print(f"  - {table}: {rows:,} rows in {seconds:.2f}s ({rate:,.0f} rows/s)")
+
+
+class BulkWriter:
+    """
+    Set-based upserts for one session.
+    
+    PostgreSQL: rows are COPYed into a temp staging table and merged with a
+    single INSERT ... SELECT ... ON CONFLICT. SQLite: one executemany
+    INSERT ... ON CONFLICT per chunk.
+    """
+
+    def __init__(self, db: Session, stats: LoadStats):
+        self.db = db
+        self.stats = stats
+        self.dialect = db.get_bind().dialect.name
+
+    def upsert(
+        self,
+        table: Table,
+        rows: List[dict],
+        conflict: Sequence[str],
+        update: Optional[Sequence[str]] = None,
+    ):
+        """Insert rows; on conflict update `update` columns, or skip if None"""
+        if not rows:
+            return
+        
+        # ON CONFLICT cannot touch the same row twice in one statement
+        unique = {tuple(row[c] for c in conflict): row for row in rows}
+        rows = list(unique.values())
+        
+        started = time.perf_counter()
+        if self.dialect == "postgresql":
+            self._copy_upsert(table, rows, conflict, update)
+        else:
+            self._executemany_upsert(table, rows, conflict, update)
+        self.stats.record(table.name, len(rows), time.perf_counter() - started)
+
+    def _executemany_upsert(self, table, rows, conflict, update):
+        stmt = dialect_insert(self.db)(table)
+        if update:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(conflict),
+                set_={c: stmt.excluded[c] for c in update},
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict))
+        self.db.execute(stmt, rows)
+
+    def _copy_upsert(self, table, rows, conflict, update):
+        columns = list(rows[0].keys())
+        column_list = ", ".join(columns)
+        staging = f"_load_{table.name}"
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[c] for c in columns])
+        buffer.seek(0)
+        
+        if update:
+            action = "DO UPDATE SET " + ", ".join(f"{c} = EXCLUDED.{c}" for c in update)
+        else:
+            action = "DO NOTHING"
+        
+        raw = self.db.connection().connection
+        with raw.cursor() as cur:
+            cur.execute(
+                f"CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DELETE ROWS AS "
+                f"SELECT {column_list} FROM {table.name} WITH NO DATA"
+            )
+            cur.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cur.execute(
+                f"INSERT INTO {table.name} ({column_list}) SELECT {column_list} FROM {staging} "
+                f"ON CONFLICT ({', '.join(conflict)}) {action}"
+            )
+            cur.execute(f"TRUNCATE {staging}")
+
+    def sync_sequences(self):
+        """Move SERIAL sequences past explicitly loaded ids (PostgreSQL only)"""
+        if self.dialect != "postgresql":
+            return
+        self.db.execute(text(
+            "SELECT setval(pg_get_serial_sequence('employees', 'employee_id'), "
+            "COALESCE(MAX(employee_id), 1)) FROM employees"
+        ))
+
+
+# ============================================
+# LOOKUP TABLES
+# ============================================
+
+def seed_lookup_tables(db: Session) -> dict:
+    """
+    Create missing departments, badges, tools and learning resources, then
+    return name -> id dicts used while building user rows.
+    """
+    def ensure(model, key_attr, wanted: dict, build):
+        existing = {name for (name,) in db.query(getattr(model, key_attr))}
+        for name, value in wanted.items():
+            if name not in existing:
+                db.add(build(name, value))
+                print(f"   ✓ {name}")
+        db.commit()
+    
+    print("\n1. Creating departments...")
+    ensure(Department, "name", DEPARTMENTS, lambda name, desc: Department(
+        name=name, description=desc, status="active",
+    ))
+    
+    print("\n2. Creating gamification badges...")
+    ensure(GamificationBadge, "name", BADGES_MAP, lambda name, desc: GamificationBadge(
+        name=name, description=desc, level=1,
+    ))
+    
+    print("\n3. Creating AI tools...")
+    ensure(AITool, "name", AI_TOOLS, lambda name, desc: AITool(
+        name=name, description=desc, category="Productivity",
+        is_active=True, requires_approval=False,
+    ))
+    
+    print("\n4. Creating learning resources...")
+    ensure(LearningResource, "title", {r["title"]: r for r in LEARNING_RESOURCES}, lambda title, r: LearningResource(
+        title=title, type=r["type"], provider=r["provider"],
+        difficulty_level=r["difficulty"], duration_minutes=r["duration"],
+        is_active=True,
+    ))
+    
+    return {
+        "departments": dict(db.query(Department.name, Department.department_id)),
+        "badges": dict(db.query(GamificationBadge.name, GamificationBadge.badge_id)),
+        "resources": [
+            rid for (rid,) in db.query(LearningResource.resource_id).order_by(LearningResource.resource_id)
+        ],
+    }
+
+
+def email_owners(db: Session, test_users: List[dict]) -> Dict[str, int]:
+    """Return email -> employee_id for the chunk's candidate emails already in use"""
+    emails = {create_user_dict(u)["email"] for u in test_users}
+    return dict(
+        db.query(Employee.email, Employee.employee_id).filter(Employee.email.in_(emails))
+    )
+
+
+# ============================================
+# ROW BUILDING
+# ============================================
+
+def build_rows(
+    test_users: List[dict],
+    lookups: dict,
+    owners: Dict[str, int],
+    rows: Dict[str, List[dict]],
+) -> int:
+    """
+    Append row dicts for a chunk of users to `rows`; returns users accepted.
+    
+    `owners` maps emails already taken to their employee_id (see email_owners).
+    """
+    now = datetime.utcnow()
+    awarded_on = datetime.now() - timedelta(days=30)
+    accepted = 0
+    
+    for test_user in test_users:
+        user_data = create_user_dict(test_user)
+        employee_id = user_data["employee_id"]
+        
+        department_id = lookups["departments"].get(user_data["department"])
+        if department_id is None:
+            print(f"      ✗ Department '{user_data['department']}' not found for {test_user['employeeName']}")
+            continue
+        
+        # Test data reuses names, so keep emails unique per employee
+        email = user_data["email"]
+        owner = owners.setdefault(email, employee_id)
+        if owner != employee_id:
+            local, domain = email.split("@")
+            email = f"{local}.{employee_id}@{domain}"
+        
+        rows["employees"].append({
+            "employee_id": employee_id,
+            "email": email,
+            "display_name": user_data["display_name"],
+            "department_id": department_id,
+            "role": user_data["role"],
+            "status": "active",
+            "hire_date": user_data["hire_date"],
+            "created_at": now,
+            "updated_at": now,
+        })
+        
+        # Historical months from the trend, ending at the current month.
+        # The trend's last point is the current month and is superseded by
+        # the current metrics row appended after it.
+        base_tasks = user_data["tasks_automated"]
+        trend = user_data.get("monthly_trend", [])
+        for (month, year), adoption_score in zip(trailing_periods(*CURRENT_PERIOD, len(trend)), trend):
+            rows["ai_adoption_metrics"].append({
+                "employee_id": employee_id,
+                "month": month,
+                "year": year,
+                "adoption_score": adoption_score,
+                "tasks_ai_assisted": max(1, int(base_tasks * (adoption_score / 100))),
+                "hours_saved": max(8, int((base_tasks * (adoption_score / 100)) * 8)),
+                "tools_explored": max(1, int(user_data["tools_used"] * (adoption_score / 100))),
+                "learning_hours": max(2, (user_data["learning_hours"] * (adoption_score / 100))),
+                "created_at": now,
+                "updated_at": now,
+            })
+        
+        current_month, current_year = CURRENT_PERIOD
+        rows["ai_adoption_metrics"].append({
+            "employee_id": employee_id,
+            "month": current_month,
+            "year": current_year,
+            "adoption_score": user_data["adoption_score"],
+            "tasks_ai_assisted": user_data["tasks_automated"],
+            "hours_saved": user_data["hours_saved"],
+            "tools_explored": user_data["tools_used"],
+            "learning_hours": user_data["learning_hours"],
+            "created_at": now,
+            "updated_at": now,
+        })
+        
+        for badge_name in user_data.get("badges", []):
+            badge_id = lookups["badges"].get(badge_name)
+            if badge_id is not None:
+                rows["user_badges"].append({
+                    "employee_id": employee_id,
+                    "badge_id": badge_id,
+                    "awarded_on": awarded_on,
+                    "created_at": now,
+                })
+        
+        rows["user_points"].append({
+            "employee_id": employee_id,
+            "total_points": user_data.get("leaderboard_points", 0),
+            "month_points": 0,
+            "rank": user_data.get("leaderboard_rank", 1),
+            "last_updated": now,
+        })
+        
+        resources = lookups["resources"]
+        for i, cert_name in enumerate(user_data.get("certifications", [])[:len(resources)]):
+            rows["user_learning_progress"].append({
+                "employee_id": employee_id,
+                "resource_id": resources[i],
+                "progress_percent": 100,
+                "status": "completed",
+                "completed_at": datetime.now() - timedelta(days=60 - i*10),
+                "created_at": now,
+                "updated_at": now,
+            })
+        
+        accepted += 1
+    
+    return accepted
+
+
+def write_rows(writer: BulkWriter, rows: Dict[str, List[dict]]):
+    """Upsert one chunk of rows, parents before children"""
+    writer.upsert(
+        Employee.__table__, rows["employees"], ["employee_id"],
+        update=["email", "display_name", "department_id", "role", "status", "hire_date", "updated_at"],
+    )
+    writer.upsert(
+        AIAdoptionMetrics.__table__, rows["ai_adoption_metrics"], ["employee_id", "month", "year"],
+        update=["adoption_score", "tasks_ai_assisted", "hours_saved", "tools_explored", "learning_hours", "updated_at"],
+    )
+    writer.upsert(UserBadge.__table__, rows["user_badges"], ["employee_id", "badge_id"])
+    writer.upsert(
+        UserPoints.__table__, rows["user_points"], ["employee_id"],
+        update=["total_points", "rank", "last_updated"],
+    )
+    writer.upsert(UserLearningProgress.__table__, rows["user_learning_progress"], ["employee_id", "resource_id"])
+
+
+def empty_rows() -> Dict[str, List[dict]]:
+    return {
+        "employees": [],
+        "ai_adoption_metrics": [],
+        "user_badges": [],
+        "user_points": [],
+        "user_learning_progress": [],
+    }
+
 # ============================================
 # MAIN LOADING FUNCTION
 # ============================================
 
-def load_test_data():
-    """Load test data from JSON files into the database"""
+def load_test_data(
+    paths: Optional[Sequence[str]] = None,
+    batch_size: int = BATCH_SIZE,
+    resume: bool = True,
+):
+    """
+    Load test data from JSON files into the database.
+    
+    Files are streamed record by record and written in chunks of
+    `batch_size` users. After each committed chunk the last userId is saved
+    to CHECKPOINT_FILE; with `resume` an interrupted load continues from it.
+    """
+    if paths is None:
+        paths = [os.path.join(TEST_DATA_DIR, name) for name in JSON_FILES]
     
     # Create tables
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
     
     db = SessionLocal()
+    stats = LoadStats()
+    started = time.perf_counter()
+    checkpoint = LoadCheckpoint(CHECKPOINT_FILE)
+    if resume:
+        checkpoint.load()
     
     try:
-        # Step 1: Create departments
-        print("\n1. Creating departments...")
-        for dept_name, dept_desc in DEPARTMENTS.items():
-            existing = db.query(Department).filter(Department.name == dept_name).first()
-            if not existing:
-                dept = Department(name=dept_name, description=dept_desc, status="active")
-                db.add(dept)
-                print(f"   ✓ {dept_name}")
-        db.commit()
-        
-        # Step 2: Create gamification badges
-        print("\n2. Creating gamification badges...")
-        for badge_name, badge_desc in BADGES_MAP.items():
-            existing = db.query(GamificationBadge).filter(GamificationBadge.name == badge_name).first()
-            if not existing:
-                badge = GamificationBadge(
-                    name=badge_name,
-                    description=badge_desc,
-                    level=1,
-                )
-                db.add(badge)
-                print(f"   ✓ {badge_name}")
-        db.commit()
+        lookups = seed_lookup_tables(db)
+        writer = BulkWriter(db, stats)
         
-        # Step 3: Create AI tools
-        print("\n3. Creating AI tools...")
-        for tool_name, tool_desc in AI_TOOLS.items():
-            existing = db.query(AITool).filter(AITool.name == tool_name).first()
-            if not existing:
-                tool = AITool(
-                    name=tool_name,
-                    description=tool_desc,
-                    category="Productivity",
-                    is_active=True,
-                    requires_approval=False,
-                )
-                db.add(tool)
-                print(f"   ✓ {tool_name}")
-        db.commit()
-        # Step 4: Create learning resources
-        print("\n4. Creating learning resources...")
-        for resource in LEARNING_RESOURCES:
-            existing = db.query(LearningResource).filter(
-                LearningResource.title == resource["title"]
-            ).first()
-            if not existing:
-                lr = LearningResource(
-                    title=resource["title"],
-                    type=resource["type"],
-                    provider=resource["provider"],
-                    difficulty_level=resource["difficulty"],
-                    duration_minutes=resource["duration"],
-                    is_active=True,
-                )
-                db.add(lr)
-                print(f"   ✓ {resource['title']}")
-        db.commit()
-        
-        # Step 5: Load test data from JSON files
+        # Step 5: Stream test data from JSON files in chunks
         print("\n5. Loading employees from test data...")
         
-        test_data_dir = "data"
-        json_files = [
-            "users_testdata_sample.json",
-            "users_comprehensive_testdata_part1.json",
-            "users_comprehensive_testdata_part2.json",
-            "users_testdata_batch2.json",
-            "users_testdata.json",
-        ]
-        
-        employees_created = 0
-        for json_file in json_files:
-            file_path = os.path.join(test_data_dir, json_file)
+        employees_loaded = 0
+        for file_path in paths:
+            file_name = os.path.basename(file_path)
             if not os.path.exists(file_path):
-                print(f"   ⚠ {json_file} not found, skipping...")
+                print(f"   ⚠ {file_name} not found, skipping...")
+                continue
+            if checkpoint.is_completed(file_name):
+                print(f"   ⊘ {file_name} already loaded, skipping...")
                 continue
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                test_users = json.load(f)
+            stream = JsonRecordStream(file_path)
+            records = iter(stream)
+            resume_after = checkpoint.resume_point(file_name)
+            if resume_after is not None:
+                print(f"\n   Resuming {file_name} after userId {resume_after}...")
+                records = skip_through(records, resume_after)
+            else:
+                print(f"\n   Processing {file_name} ({stream.total_bytes / 1_048_576:.1f} MB)...")
             
-            print(f"\n   Processing {json_file} ({len(test_users)} records)...")
+            for chunk in chunked(records, batch_size):
+                rows = empty_rows()
+                employees_loaded += build_rows(chunk, lookups, email_owners(db, chunk), rows)
+                write_rows(writer, rows)
+                db.commit()
+                checkpoint.committed(file_name, chunk[-1]["userId"])
+                progress = stream.bytes_read / stream.total_bytes if stream.total_bytes else 1
+                print(f"      ✓ {employees_loaded} employees loaded ({progress:.0%} of {file_name})")
             
-            for test_user in test_users:
-                # Check if employee exists
-                existing_emp = db.query(Employee).filter(
-                    Employee.employee_id == test_user["userId"]
-                ).first()
-                
-                if existing_emp:
-                    print(f"      ⊘ User {test_user['userId']} already exists, skipping...")
-                    continue
-                
-                user_data = create_user_dict(test_user)
-                
-                # Get department
-                dept = db.query(Department).filter(
-                    Department.name == user_data["department"]
-                ).first()
-                
-                if not dept:
-                    print(f"      ✗ Department '{user_data['department']}' not found for {test_user['employeeName']}")
-                    continue
-                
-                # Create employee
-                employee = Employee(
-                    employee_id=user_data["employee_id"],
-                    email=user_data["email"],
-                    display_name=user_data["display_name"],
-                    department_id=dept.department_id,
-                    role=user_data["role"],
-                    status="active",
-                    hire_date=user_data["hire_date"],
-                )
-                db.add(employee)
-                db.flush()  # Ensure employee is created before adding adoption metrics
-                
-                # Create adoption metrics for current month (January 2026)
-                adoption = AIAdoptionMetrics(
-                    employee_id=employee.employee_id,
-                    month=1,
-                    year=2026,
-                    adoption_score=user_data["adoption_score"],
-                    tasks_ai_assisted=user_data["tasks_automated"],
-                    hours_saved=user_data["hours_saved"],
-                    tools_explored=user_data["tools_used"],
-                    learning_hours=user_data["learning_hours"],
-                )
-                db.add(adoption)
-                
-                # Add historical metrics (6 months)
-                monthly_trend = user_data.get("monthly_trend", [])
-                if monthly_trend:
-                    base_tasks = user_data["tasks_automated"]
-                    for i, adoption_score in enumerate(monthly_trend):
-                        month = 8 + i  # August to January
-                        year = 2025 if month < 12 else 2026
-                        if month >= 12:
-                            month = month - 12
-                        
-                        historical = AIAdoptionMetrics(
-                            employee_id=employee.employee_id,
-                            month=month,
-                            year=year,
-                            adoption_score=adoption_score,
-                            tasks_ai_assisted=max(1, int(base_tasks * (adoption_score / 100))),
-                            hours_saved=max(8, int((base_tasks * (adoption_score / 100)) * 8)),
-                            tools_explored=max(1, int(user_data["tools_used"] * (adoption_score / 100))),
-                            learning_hours=max(2, (user_data["learning_hours"] * (adoption_score / 100))),
-                        )
-                        db.add(historical)
-                
-                # Add badges
-                for badge_name in user_data.get("badges", []):
-                    if badge_name in BADGES_MAP:
-                        badge_def = db.query(GamificationBadge).filter(
-                            GamificationBadge.name == badge_name
-                        ).first()
-                        if badge_def:
-                            user_badge = UserBadge(
-                                employee_id=employee.employee_id,
-                                badge_id=badge_def.badge_id,
-                                awarded_on=datetime.now() - timedelta(days=30),
-                            )
-                            db.add(user_badge)
-                
-                # Add points
-                points = UserPoints(
-                    employee_id=employee.employee_id,
-                    total_points=user_data.get("leaderboard_points", 0),
-                    rank=user_data.get("leaderboard_rank", 1),
-                    last_updated=datetime.now(),
-                )
-                db.add(points)
-                
-                # Add learning progress
-                learning_resources = db.query(LearningResource).all()
-                completed_count = len(user_data.get("certifications", []))
-                for i, cert_name in enumerate(user_data.get("certifications", [])):
-                    if i < len(learning_resources):
-                        progress = UserLearningProgress(
-                            employee_id=employee.employee_id,
-                            resource_id=learning_resources[i].resource_id,
-                            progress_percent=100,
-                            status="completed",
-                            completed_at=datetime.now() - timedelta(days=60 - i*10),
-                        )
-                        db.add(progress)
-                
-                employees_created += 1
-                if employees_created % 10 == 0:
-                    print(f"      ✓ {employees_created} employees created so far...")
-            
-            db.commit()
+            checkpoint.file_done(file_name)
+        
+        writer.sync_sequences()
+        db.commit()
         
-        print(f"\n✅ Successfully loaded {employees_created} employees!")
+        # Step 6: Rebuild department rollups for everything just loaded
+        print("\n6. Rebuilding department rollups...")
+        rollup_rows = rebuild_rollups(db)
+        db.commit()
+        print(f"   ✓ {rollup_rows} department/month rows")
+        
+        print(f"\n✅ Successfully loaded {employees_loaded} employees in {time.perf_counter() - started:.2f}s!")
+        print("\nThroughput:")
+        stats.report()
         print("\nSummary:")
         print(f"  - Departments: {db.query(Department).count()}")
         print(f"  - Employees: {db.query(Employee).count()}")
@@ -309,6 +660,8 @@ def load_test_data():
         print(f"  - Badges: {db.query(UserBadge).count()}")
         print(f"  - Learning Resources: {db.query(LearningResource).count()}")
         
+        checkpoint.clear()
+        
     except Exception as e:
         print(f"\n❌ Error loading test data: {str(e)}")
         import traceback
@@ -318,4 +671,10 @@ def load_test_data():
         db.close()
 
 if __name__ == "__main__":
-    load_test_data()
+    parser = argparse.ArgumentParser(description="Load JSON test data into the database")
+    parser.add_argument("files", nargs="*", help=f"JSON or NDJSON files (default: {TEST_DATA_DIR}/ test files)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="Ignore any saved checkpoint")
+    args = parser.parse_args()
+    
+    load_test_data(args.files or None, batch_size=args.batch_size, resume=not args.restart)
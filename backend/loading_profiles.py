@@ -0,0 +1,75 @@
+"""
+Relationship loading profiles
+
+Relationships in models.py lazy-load, so serializing `employee.department.name`
+for N rows costs N extra SELECTs. Each profile names the columns and relations
+an endpoint serializes and how to fetch them, so a handler loads exactly that
+in a fixed number of queries:
+
+    employee = await db.scalar(profile_query("profile").where(...))
+
+Profiles:
+    profile            Employee + department name                  1 query
+    department_roster  Department + active employees + their points 2 queries
+
+The leaderboard needs no profile: ranks come from the in-memory rank index and
+display fields from one column query per page (services/leaderboard_service.py).
+"""
+
+from typing import Dict, NamedTuple, Tuple
+
+from sqlalchemy import Select, select
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+from models import Department, Employee, UserPoints
+
+
+class LoadingProfile(NamedTuple):
+    entity: type
+    options: Tuple
+    description: str
+
+    def select(self) -> Select:
+        return select(self.entity).options(*self.options)
+
+
+LOADING_PROFILES: Dict[str, LoadingProfile] = {
+    "profile": LoadingProfile(
+        Employee,
+        (
+            load_only(
+                Employee.email, Employee.display_name, Employee.department_id, Employee.role,
+                Employee.status, Employee.hire_date, Employee.avatar_url,
+            ),
+            joinedload(Employee.department).load_only(Department.name),
+        ),
+        "Employee with department name (1 query)",
+    ),
+    "department_roster": LoadingProfile(
+        Department,
+        (
+            load_only(Department.name, Department.description, Department.manager_id),
+            selectinload(Department.employees.and_(Employee.status == "active")).options(
+                load_only(Employee.display_name, Employee.email, Employee.role, Employee.avatar_url),
+                joinedload(Employee.points).load_only(UserPoints.total_points, UserPoints.month_points),
+            ),
+        ),
+        "Department with active employees and their points (2 queries)",
+    ),
+}
+
+
+def profile_query(name: str) -> Select:
+    """SELECT of the profile's root entity with its loader options applied"""
+    try:
+        return LOADING_PROFILES[name].select()
+    except KeyError:
+        raise ValueError(f"Unknown loading profile: {name}")
+
+
+def profile_options(name: str) -> Tuple:
+    """Loader options of a profile, for statements built elsewhere"""
+    try:
+        return LOADING_PROFILES[name].options
+    except KeyError:
+        raise ValueError(f"Unknown loading profile: {name}")
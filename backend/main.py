@@ -3,17 +3,54 @@ Main FastAPI application for Smart Office AI Adoption Hub
 """
 
 import os
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from contextlib import asynccontextmanager
 import logging
-from sqlalchemy.orm import Session
-
-from database import get_db, init_db, engine
+from datetime import date
+from typing import Optional
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, SessionLocal, get_async_db, init_db, engine
+from dependencies import CurrentUser, jwks_store, require_role
+from instrumentation import InstrumentationMiddleware, render_metrics
+from loading_profiles import profile_query
 import models
-from schemas import ErrorResponse
+from schemas import (
+    ErrorResponse,
+    NotificationBroadcast,
+    NotificationIds,
+    NotificationsList,
+    PaginatedResponse,
+    PaginationParams,
+)
+from services.access_log_service import AccessLogQueueFull, access_logger
+from services.catalog_service import (
+    catalog_cache,
+    search_tools,
+    serialize_tool,
+    tool_categories,
+)
+from services.history_service import adoption_history
+from services.leaderboard_service import leaderboard
+from services.notification_service import (
+    broadcast,
+    mark_read,
+    notification_feed,
+    notification_stream,
+    unread_count,
+)
+from services.partition_service import ensure_partitions, partition_maintainer
+from services.rank_service import rank_index, rank_persister
+from services.reporting_service import ensure_views, view_refresher
+from services.rewards_service import rewards_engine
+from services.rollup_service import rebuild_rollups
+from services.scorecard_service import load_scorecard
+from services.tool_usage_service import usage_report
+from services.trends_service import monthly_trends
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -38,10 +75,48 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
     
+    # Make sure the partitioned log tables have partitions for coming months
+    try:
+        with SessionLocal() as db:
+            ensure_partitions(db)
+            db.commit()
+    except Exception as e:
+        logger.error(f"Log partition maintenance failed: {e}")
+    # ...and keep creating them, and retiring expired months, while running
+    partition_maintainer.start()
+    
+    # Reporting views, kept fresh in the background
+    try:
+        with SessionLocal() as db:
+            ensure_views(db)
+            db.commit()
+    except Exception as e:
+        logger.error(f"Reporting view setup failed: {e}")
+    view_refresher.start()
+    
+    # UserPoints.rank is written back from the in-memory rank index
+    rank_persister.start()
+    
+    # Load SSO signing keys before serving and keep them refreshed
+    if jwks_store is not None:
+        jwks_store.start()
+    
+    # Batched writer for tool access events, and badge/challenge evaluation
+    await access_logger.start()
+    await rewards_engine.start()
+    
     yield
     
     # Shutdown
     logger.info("Shutting down AI Adoption Hub API...")
+    # Flush buffered tool access events (which queue rewards) before the process exits
+    await access_logger.stop()
+    await rewards_engine.stop()
+    view_refresher.stop()
+    rank_persister.stop()
+    partition_maintainer.stop()
+    if jwks_store is not None:
+        jwks_store.stop()
 
 
 # ============================================
@@ -76,6 +151,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Trusted hosts
@@ -90,6 +166,9 @@ app.add_middleware(
     ]
 )
 
+# Per-route latency and SQL usage for /metrics (and Server-Timing if enabled)
+app.add_middleware(InstrumentationMiddleware)
+
 # ============================================
 # ROOT ENDPOINT
 # ============================================
@@ -107,11 +186,11 @@ async def root():
 
 
 @app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     """Health check endpoint - verify API and database connectivity"""
     try:
         # Test database connection
-        db.execute("SELECT 1")
+        await db.execute(text("SELECT 1"))
         db_status = "healthy"
     except Exception as e:
         logger.error(f"Database health check failed: {e}")
@@ -132,15 +211,21 @@ async def health_check(db: Session = Depends(get_db)):
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics - request latency and database usage per route"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # ============================================
 # AUTHENTICATION ENDPOINTS
 # ============================================
 
 @app.get("/api/me")
-async def get_current_user_profile(db: Session = Depends(get_db)):
+async def get_current_user_profile(db: AsyncSession = Depends(get_async_db)):
     """Get current authenticated user's profile - returns first employee for testing"""
     # For testing, return the first employee in the database
-    employee = db.query(models.Employee).first()
+    employee = await db.scalar(profile_query("profile").limit(1))
     
     if not employee:
         # Return mock user for frontend testing
@@ -174,9 +259,9 @@ async def get_current_user_profile(db: Session = Depends(get_db)):
 # ============================================
 
 @app.get("/api/me/scorecard")
-async def get_scorecard(db: Session = Depends(get_db)):
+async def get_scorecard(db: AsyncSession = Depends(get_async_db)):
     """Get current user's adoption scorecard"""
-    employee = db.query(models.Employee).first()
+    employee = await db.scalar(select(models.Employee).limit(1))
     
     if not employee:
         return {
@@ -197,23 +282,13 @@ async def get_scorecard(db: Session = Depends(get_db)):
     current_month = datetime.now().month
     current_year = datetime.now().year
     
-    current_metrics = db.query(models.AIAdoptionMetrics).filter(
-        models.AIAdoptionMetrics.employee_id == employee.employee_id,
-        models.AIAdoptionMetrics.month == current_month,
-        models.AIAdoptionMetrics.year == current_year,
-    ).first()
-    
-    previous_metrics = db.query(models.AIAdoptionMetrics).filter(
-        models.AIAdoptionMetrics.employee_id == employee.employee_id,
-        models.AIAdoptionMetrics.month == (current_month - 1 if current_month > 1 else 12),
-    ).first()
-    
-    # Get trends (last 6 months)
-    trends = db.query(models.AIAdoptionMetrics).filter(
-        models.AIAdoptionMetrics.employee_id == employee.employee_id,
-    ).order_by(models.AIAdoptionMetrics.year, models.AIAdoptionMetrics.month).all()
+    scorecard = await db.run_sync(
+        load_scorecard, employee.employee_id, employee.department_id, current_month, current_year
+    )
+    current_metrics = scorecard.current
+    previous_metrics = scorecard.previous
     
-    trend_scores = [m.adoption_score or 0 for m in trends[-6:]]
+    trend_scores = [m.adoption_score or 0 for m in scorecard.history]
     
     return {
         "employee_id": employee.employee_id,
@@ -230,77 +305,102 @@ async def get_scorecard(db: Session = Depends(get_db)):
 
 
 @app.get("/api/adoption-metrics/history")
-async def get_adoption_history(months: int = 12, db: Session = Depends(get_db)):
-    """Get adoption metrics history"""
-    employee = db.query(models.Employee).first()
+async def get_adoption_history(
+    months: int = 12,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    resolution: str = "monthly",
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get adoption metrics history, oldest first (monthly or quarterly)"""
+    employee = await db.scalar(select(models.Employee).limit(1))
     
     if not employee:
         return []
     
-    metrics = db.query(models.AIAdoptionMetrics).filter(
-        models.AIAdoptionMetrics.employee_id == employee.employee_id,
-    ).order_by(
-        models.AIAdoptionMetrics.year.desc(),
-        models.AIAdoptionMetrics.month.desc()
-    ).limit(months).all()
-    
-    return [
-        {
-            "month": m.month,
-            "year": m.year,
-            "adoption_score": m.adoption_score,
-            "tasks_ai_assisted": m.tasks_ai_assisted,
-            "hours_saved": float(m.hours_saved),
-            "tools_explored": m.tools_explored,
-            "learning_hours": float(m.learning_hours),
-        }
-        for m in metrics
-    ]
+    return await db.run_sync(
+        adoption_history, employee.employee_id, months, start=start, end=end, resolution=resolution
+    )
 
 
 @app.get("/api/departments/{dept_id}/overview")
-async def get_department_overview(dept_id: int, db: Session = Depends(get_db)):
+async def get_department_overview(dept_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get department adoption overview"""
-    dept = db.query(models.Department).filter(models.Department.department_id == dept_id).first()
+    from datetime import datetime
+    current_month = datetime.now().month
+    current_year = datetime.now().year
+    
+    row = (await db.execute(select(models.Department.name, models.DepartmentAdoptionAgg).outerjoin(
+        models.DepartmentAdoptionAgg,
+        (models.DepartmentAdoptionAgg.department_id == models.Department.department_id)
+        & (models.DepartmentAdoptionAgg.month == current_month)
+        & (models.DepartmentAdoptionAgg.year == current_year),
+    ).filter(models.Department.department_id == dept_id))).first()
     
-    if not dept:
+    if not row:
         return {"error": "Department not found"}
     
-    employees = db.query(models.Employee).filter(models.Employee.department_id == dept_id).all()
+    dept_name, agg = row
     
-    if not employees:
+    if not agg:
+        await db.run_sync(rebuild_rollups, dept_id, current_month, current_year)
+        await db.commit()
+        agg = await db.scalar(select(models.DepartmentAdoptionAgg).filter(
+            models.DepartmentAdoptionAgg.department_id == dept_id,
+            models.DepartmentAdoptionAgg.month == current_month,
+            models.DepartmentAdoptionAgg.year == current_year,
+        ))
+    
+    if not agg:
         return {
             "department_id": dept_id,
-            "department_name": dept.name,
+            "department_name": dept_name,
             "avg_score": 0,
             "participation_rate": 0,
             "total_hours_saved": 0,
             "total_employees": 0,
         }
     
-    # Get current month metrics
-    from datetime import datetime
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    
-    metrics = db.query(models.AIAdoptionMetrics).filter(
-        models.AIAdoptionMetrics.employee_id.in_([e.employee_id for e in employees]),
-        models.AIAdoptionMetrics.month == current_month,
-        models.AIAdoptionMetrics.year == current_year,
-    ).all()
+    return {
+        "department_id": dept_id,
+        "department_name": dept_name,
+        "avg_score": round(float(agg.avg_score or 0), 1),
+        "participation_rate": round(float(agg.participation_rate or 0), 1),
+        "total_hours_saved": float(agg.total_hours_saved or 0),
+        "total_employees": agg.total_employees or 0,
+        "active_users": agg.active_users or 0,
+    }
+
+
+@app.get("/api/departments/{dept_id}")
+async def get_department_roster(dept_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get department details and its active employees with points"""
+    department = await db.scalar(
+        profile_query("department_roster").filter(models.Department.department_id == dept_id)
+    )
     
-    avg_score = sum([m.adoption_score or 0 for m in metrics]) / len(metrics) if metrics else 0
-    total_hours = sum([m.hours_saved or 0 for m in metrics])
-    participation_rate = (len(metrics) / len(employees)) * 100 if employees else 0
+    if not department:
+        raise HTTPException(status_code=404, detail="Department not found")
     
+    employees = sorted(department.employees, key=lambda e: e.display_name)
     return {
-        "department_id": dept_id,
-        "department_name": dept.name,
-        "avg_score": round(avg_score, 1),
-        "participation_rate": round(participation_rate, 1),
-        "total_hours_saved": float(total_hours),
-        "total_employees": len(employees),
-        "active_users": len(metrics),
+        "department_id": department.department_id,
+        "name": department.name,
+        "description": department.description,
+        "manager_id": department.manager_id,
+        "employee_count": len(employees),
+        "employees": [
+            {
+                "employee_id": e.employee_id,
+                "display_name": e.display_name,
+                "email": e.email,
+                "role": e.role,
+                "avatar_url": e.avatar_url,
+                "total_points": e.points.total_points if e.points else 0,
+                "month_points": e.points.month_points if e.points else 0,
+            }
+            for e in employees
+        ],
     }
 
 
@@ -309,51 +409,58 @@ async def get_department_overview(dept_id: int, db: Session = Depends(get_db)):
 # ============================================
 
 @app.get("/api/tools/catalog")
-async def get_tools_catalog(db: Session = Depends(get_db)):
-    """Get AI tools catalog"""
-    tools = db.query(models.AITool).filter(models.AITool.is_active == True).all()
+async def get_tools_catalog(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Get AI tools catalog (cached, supports If-None-Match)"""
+    async def build():
+        tools = (await db.scalars(select(models.AITool).filter(models.AITool.is_active == True))).all()
+        return [serialize_tool(t) for t in tools]
     
-    return [
-        {
-            "tool_id": t.tool_id,
-            "name": t.name,
-            "description": t.description,
-            "category": t.category,
-            "icon_url": t.icon_url,
-            "sso_url": t.sso_url,
-            "requires_approval": t.requires_approval,
-        }
-        for t in tools
-    ]
+    cached = await catalog_cache.get("tools_catalog", build)
+    return cached.to_response(request)
 
 
 @app.get("/api/tools/categories")
-async def get_tool_categories(db: Session = Depends(get_db)):
-    """Get tool categories"""
-    tools = db.query(models.AITool).filter(models.AITool.is_active == True).all()
-    categories = list(set([t.category for t in tools]))
-    
-    return {"categories": categories}
+async def get_tool_categories(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Get tool categories (cached, supports If-None-Match)"""
+    async def build():
+        return {"categories": await db.run_sync(tool_categories)}
+    
+    cached = await catalog_cache.get("tool_categories", build)
+    return cached.to_response(request)
+
+
+@app.get("/api/tools", response_model=PaginatedResponse)
+async def search_tools_catalog(
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    page: PaginationParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Search active tools by category and name/description, one page at a time"""
+    try:
+        return await db.run_sync(search_tools, page, category=category, search=q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.post("/api/tools/{tool_id}/access")
-async def log_tool_access(tool_id: int, db: Session = Depends(get_db)):
-    """Log tool access"""
-    employee = db.query(models.Employee).first()
-    tool = db.query(models.AITool).filter(models.AITool.tool_id == tool_id).first()
+@app.post("/api/tools/{tool_id}/access", status_code=202)
+async def log_tool_access(tool_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Log tool access - buffered and written in batches"""
+    employee_id = await db.scalar(select(models.Employee.employee_id).limit(1))
     
-    if not employee or not tool:
+    if employee_id is None or not await access_logger.is_known_tool(tool_id):
         raise HTTPException(status_code=404, detail="Not found")
     
-    log = models.ToolAccessLog(
-        employee_id=employee.employee_id,
-        tool_id=tool_id,
-        action="access"
-    )
-    db.add(log)
-    db.commit()
+    try:
+        access_logger.enqueue(employee_id, tool_id)
+    except AccessLogQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Access log is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
     
-    return {"status": "logged"}
+    return {"status": "queued"}
 
 
 # ============================================
@@ -361,36 +468,39 @@ async def log_tool_access(tool_id: int, db: Session = Depends(get_db)):
 # ============================================
 
 @app.get("/api/learning/resources")
-async def get_learning_resources(db: Session = Depends(get_db)):
-    """Get learning resources"""
-    resources = db.query(models.LearningResource).filter(models.LearningResource.is_active == True).all()
+async def get_learning_resources(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Get learning resources (cached, supports If-None-Match)"""
+    async def build():
+        resources = (await db.scalars(select(models.LearningResource).filter(models.LearningResource.is_active == True))).all()
+        return [
+            {
+                "resource_id": r.resource_id,
+                "title": r.title,
+                "description": r.description,
+                "type": r.type,
+                "provider": r.provider,
+                "difficulty_level": r.difficulty_level,
+                "duration_minutes": r.duration_minutes,
+                "url": r.url,
+            }
+            for r in resources
+        ]
     
-    return [
-        {
-            "resource_id": r.resource_id,
-            "title": r.title,
-            "description": r.description,
-            "type": r.type,
-            "provider": r.provider,
-            "difficulty_level": r.difficulty_level,
-            "duration_minutes": r.duration_minutes,
-            "url": r.url,
-        }
-        for r in resources
-    ]
+    cached = await catalog_cache.get("learning_resources", build)
+    return cached.to_response(request)
 
 
 @app.get("/api/learning/progress")
-async def get_learning_progress(db: Session = Depends(get_db)):
+async def get_learning_progress(db: AsyncSession = Depends(get_async_db)):
     """Get learning progress"""
-    employee = db.query(models.Employee).first()
+    employee = await db.scalar(select(models.Employee).limit(1))
     
     if not employee:
         return []
     
-    progress = db.query(models.UserLearningProgress).filter(
+    progress = (await db.scalars(select(models.UserLearningProgress).filter(
         models.UserLearningProgress.employee_id == employee.employee_id,
-    ).all()
+    ))).all()
     
     return [
         {
@@ -404,17 +514,17 @@ async def get_learning_progress(db: Session = Depends(get_db)):
 
 
 @app.post("/api/learning/{resource_id}/progress")
-async def update_learning_progress(resource_id: int, data: dict, db: Session = Depends(get_db)):
+async def update_learning_progress(resource_id: int, data: dict, db: AsyncSession = Depends(get_async_db)):
     """Update learning progress"""
-    employee = db.query(models.Employee).first()
+    employee = await db.scalar(select(models.Employee).limit(1))
     
     if not employee:
         raise HTTPException(status_code=404, detail="User not found")
     
-    progress = db.query(models.UserLearningProgress).filter(
+    progress = await db.scalar(select(models.UserLearningProgress).filter(
         models.UserLearningProgress.employee_id == employee.employee_id,
         models.UserLearningProgress.resource_id == resource_id,
-    ).first()
+    ))
     
     if not progress:
         progress = models.UserLearningProgress(
@@ -428,7 +538,8 @@ async def update_learning_progress(resource_id: int, data: dict, db: Session = D
         progress.progress_percent = data.get("progress_percent", progress.progress_percent)
         progress.status = data.get("status", progress.status)
     
-    db.commit()
+    await db.commit()
+    rewards_engine.submit([employee.employee_id])
     
     return {"status": "updated"}
 
@@ -438,76 +549,87 @@ async def update_learning_progress(resource_id: int, data: dict, db: Session = D
 # ============================================
 
 @app.get("/api/badges")
-async def get_badges(db: Session = Depends(get_db)):
-    """Get badges"""
-    badges = db.query(models.GamificationBadge).all()
+async def get_badges(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Get badges (cached, supports If-None-Match)"""
+    async def build():
+        badges = (await db.scalars(select(models.GamificationBadge))).all()
+        return [
+            {
+                "badge_id": b.badge_id,
+                "name": b.name,
+                "description": b.description,
+                "icon_url": b.icon_url,
+                "level": b.level,
+            }
+            for b in badges
+        ]
     
-    return [
-        {
-            "badge_id": b.badge_id,
-            "name": b.name,
-            "description": b.description,
-            "icon_url": b.icon_url,
-            "level": b.level,
-        }
-        for b in badges
-    ]
+    cached = await catalog_cache.get("badges", build)
+    return cached.to_response(request)
 
 
 @app.get("/api/leaderboard")
-async def get_leaderboard(db: Session = Depends(get_db)):
-    """Get leaderboard"""
-    points = db.query(models.UserPoints).order_by(models.UserPoints.total_points.desc()).limit(100).all()
-    
-    leaderboard = []
-    for i, p in enumerate(points, 1):
-        employee = db.query(models.Employee).filter(models.Employee.employee_id == p.employee_id).first()
-        if employee:
-            leaderboard.append({
-                "rank": i,
-                "employee_id": employee.employee_id,
-                "display_name": employee.display_name,
-                "role": employee.role,
-                "department": employee.department.name if employee.department else None,
-                "points": p.total_points,
-            })
-    
-    return leaderboard
+async def get_leaderboard(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """Get leaderboard page from the in-memory rank index"""
+    return await leaderboard.page_async(db, max(skip, 0), min(max(limit, 1), 500))
+
+
+@app.get("/api/leaderboard/me")
+async def get_my_leaderboard_position(radius: int = 5, db: AsyncSession = Depends(get_async_db)):
+    """Get current user's rank plus neighbours on either side"""
+    employee = await db.scalar(select(models.Employee).limit(1))
+    
+    if not employee:
+        return {"rank": None, "total": 0, "neighbours": []}
+    
+    # Rank, total and neighbours all come from the same index
+    neighbours = await leaderboard.around_async(db, employee.employee_id, min(max(radius, 0), 50))
+    
+    return {
+        "rank": rank_index.rank(employee.employee_id),
+        "department_rank": rank_index.department_rank(employee.employee_id),
+        "total": len(rank_index),
+        "neighbours": neighbours,
+    }
 
 
 @app.get("/api/points")
-async def get_points(db: Session = Depends(get_db)):
-    """Get user points"""
-    employee = db.query(models.Employee).first()
+async def get_points(db: AsyncSession = Depends(get_async_db)):
+    """Get user points with live company and department ranks"""
+    employee = await db.scalar(select(models.Employee).limit(1))
     
     if not employee:
         return {"total_points": 0, "rank": 0}
     
-    points = db.query(models.UserPoints).filter(models.UserPoints.employee_id == employee.employee_id).first()
+    points = await db.scalar(select(models.UserPoints).filter(models.UserPoints.employee_id == employee.employee_id))
     
     if not points:
         return {"total_points": 0, "rank": 0}
     
+    ranks = await rank_index.ensure_loaded_async(db)
+    
     return {
         "employee_id": employee.employee_id,
         "total_points": points.total_points,
         "month_points": points.month_points,
-        "rank": points.rank,
+        "rank": ranks.rank(employee.employee_id),
+        "department_rank": ranks.department_rank(employee.employee_id),
+        "department_size": ranks.department_size(employee.employee_id),
     }
 
 
 @app.get("/api/challenges")
-async def get_challenges(db: Session = Depends(get_db)):
+async def get_challenges(db: AsyncSession = Depends(get_async_db)):
     """Get challenges"""
     from datetime import datetime
     current_month = datetime.now().month
     current_year = datetime.now().year
     
-    challenges = db.query(models.MonthlyChallenge).filter(
+    challenges = (await db.scalars(select(models.MonthlyChallenge).filter(
         models.MonthlyChallenge.month == current_month,
         models.MonthlyChallenge.year == current_year,
         models.MonthlyChallenge.status == "active"
-    ).all()
+    ))).all()
     
     return [
         {
@@ -525,16 +647,16 @@ async def get_challenges(db: Session = Depends(get_db)):
 # ============================================
 
 @app.get("/api/analytics/roi")
-async def get_roi_analytics(db: Session = Depends(get_db)):
+async def get_roi_analytics(db: AsyncSession = Depends(get_async_db)):
     """Get ROI analytics"""
     from datetime import datetime
     current_month = datetime.now().month
     current_year = datetime.now().year
     
-    metrics = db.query(models.AIAdoptionMetrics).filter(
+    metrics = (await db.scalars(select(models.AIAdoptionMetrics).filter(
         models.AIAdoptionMetrics.month == current_month,
         models.AIAdoptionMetrics.year == current_year,
-    ).all()
+    ))).all()
     
     total_hours_saved = sum([m.hours_saved or 0 for m in metrics])
     hourly_rate = 75  # AED per hour
@@ -550,84 +672,226 @@ async def get_roi_analytics(db: Session = Depends(get_db)):
 
 
 @app.get("/api/analytics/trends")
-async def get_trends_analytics(months: int = 6, db: Session = Depends(get_db)):
-    """Get trends analytics"""
-    from datetime import datetime
-    
-    # Get all adoption metrics
-    metrics = db.query(models.AIAdoptionMetrics).all()
-    
-    # Group by month
-    trends = {}
-    for m in metrics:
-        key = f"{m.year}-{m.month:02d}"
-        if key not in trends:
-            trends[key] = {"adoption": [], "hours": [], "tasks": [], "count": 0}
-        if m.adoption_score:
-            trends[key]["adoption"].append(m.adoption_score)
-        if m.hours_saved:
-            trends[key]["hours"].append(float(m.hours_saved))
-        if m.tasks_ai_assisted:
-            trends[key]["tasks"].append(m.tasks_ai_assisted)
-        trends[key]["count"] += 1
-    
-    # Calculate averages
-    result = []
-    for key in sorted(trends.keys())[-months:]:
-        avg_adoption = sum(trends[key]["adoption"]) / len(trends[key]["adoption"]) if trends[key]["adoption"] else 0
-        avg_hours = sum(trends[key]["hours"]) / len(trends[key]["hours"]) if trends[key]["hours"] else 0
-        avg_tasks = sum(trends[key]["tasks"]) / len(trends[key]["tasks"]) if trends[key]["tasks"] else 0
-        
-        result.append({
-            "month": key,
-            "avg_adoption_score": round(avg_adoption, 1),
-            "total_hours_saved": round(avg_hours * trends[key]["count"], 1),
-            "avg_tasks_automated": round(avg_tasks, 1),
-            "users_active": trends[key]["count"],
-        })
-    
-    return result
-
-
-@app.get("/api/notifications")
-async def get_notifications(db: Session = Depends(get_db)):
-    """Get notifications"""
-    employee = db.query(models.Employee).first()
-    
-    if not employee:
-        return []
-    
-    notifications = db.query(models.Notification).filter(
-        models.Notification.employee_id == employee.employee_id,
-    ).order_by(models.Notification.created_at.desc()).limit(50).all()
+async def get_trends_analytics(
+    months: int = 6,
+    department_id: Optional[int] = None,
+    role: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get trends analytics, optionally filtered by department and role"""
+    return await db.run_sync(monthly_trends, months, department_id=department_id, role=role)
+
+
+@app.get("/api/analytics/tools")
+async def get_tool_usage_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    department_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get per-tool and per-day usage from the daily counters (default: last 30 days)"""
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return await db.run_sync(usage_report, start, end, department_id=department_id)
+
+
+# ============================================
+# REPORTING ENDPOINTS (materialized views)
+# ============================================
+
+@app.get("/api/reports/departments")
+async def get_department_report(db: AsyncSession = Depends(get_async_db)):
+    """Department leaderboard for the current month"""
+    rows = (await db.scalars(
+        select(models.DepartmentLeaderboard).order_by(models.DepartmentLeaderboard.rank)
+    )).all()
     
     return [
         {
-            "id": n.id,
-            "type": n.type,
-            "title": n.title,
-            "message": n.message,
-            "is_read": n.is_read,
-            "created_at": n.created_at,
+            "rank": r.rank,
+            "department_id": r.department_id,
+            "department_name": r.department_name,
+            "avg_score": round(float(r.avg_score or 0), 1),
+            "participation_rate": round(float(r.participation_rate or 0), 1),
+            "active_users": r.active_users or 0,
+            "total_employees": r.total_employees or 0,
+            "total_hours_saved": float(r.total_hours_saved or 0),
         }
-        for n in notifications
+        for r in rows
     ]
 
 
+@app.get("/api/reports/scorecards", response_model=PaginatedResponse)
+async def get_scorecard_report(
+    department: Optional[str] = None,
+    page: PaginationParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Current month scorecards for active employees, highest score first"""
+    view = models.CurrentMonthScorecard
+    query = select(view)
+    if department:
+        query = query.where(view.department_name == department)
+    
+    total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    rows = (await db.scalars(
+        query.order_by(view.adoption_score.desc(), view.employee_id).offset(page.skip).limit(page.limit)
+    )).all()
+    
+    return PaginatedResponse(
+        total=total or 0,
+        skip=page.skip,
+        limit=page.limit,
+        items=[
+            {
+                "employee_id": r.employee_id,
+                "display_name": r.display_name,
+                "department_name": r.department_name,
+                "adoption_score": r.adoption_score,
+                "tasks_automated": r.tasks_automated,
+                "hours_saved": float(r.hours_saved or 0),
+                "tools_explored": r.tools_explored,
+            }
+            for r in rows
+        ],
+    )
+
+
+@app.get("/api/reports/users/{employee_id}/stats")
+async def get_user_stats_report(employee_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Points, badges, completed resources and tools used for one employee"""
+    stats = await db.get(models.UserStatsSummary, employee_id)
+    
+    if not stats:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    
+    return {
+        "employee_id": stats.employee_id,
+        "display_name": stats.display_name,
+        "total_points": stats.total_points,
+        "badge_count": stats.badge_count,
+        "resources_completed": stats.resources_completed,
+        "tools_used": stats.tools_used,
+    }
+
+
+# ============================================
+# NOTIFICATIONS ENDPOINTS
+# ============================================
+
+@app.get("/api/notifications", response_model=NotificationsList)
+async def get_notifications(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    unread_only: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get notifications, newest first; pass next_cursor to get older ones"""
+    employee = await db.scalar(select(models.Employee).limit(1))
+    
+    if not employee:
+        return {"unread": 0, "notifications": [], "next_cursor": None}
+    
+    try:
+        return await db.run_sync(
+            notification_feed, employee.employee_id, limit, cursor=cursor, unread_only=unread_only
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/notifications/stream")
+async def stream_notifications(request: Request):
+    """Server-sent events with new notifications and the unread count (replaces polling)"""
+    async with AsyncSessionLocal() as db:
+        employee_id = await db.scalar(select(models.Employee.employee_id).limit(1))
+    
+    if employee_id is None:
+        raise HTTPException(status_code=404, detail="No employee to stream notifications for")
+    
+    return StreamingResponse(
+        notification_stream(employee_id, request.headers.get("Last-Event-ID")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/notifications/unread-count")
+async def get_unread_count(db: AsyncSession = Depends(get_async_db)):
+    """Get unread notification count from the per-employee counter"""
+    employee = await db.scalar(select(models.Employee).limit(1))
+    
+    if not employee:
+        return {"unread": 0}
+    
+    return {"unread": await db.run_sync(unread_count, employee.employee_id)}
+
+
 @app.post("/api/notifications/{notif_id}/read")
-async def mark_notification_read(notif_id: int, db: Session = Depends(get_db)):
+async def mark_notification_read(notif_id: int, db: AsyncSession = Depends(get_async_db)):
     """Mark notification as read"""
-    notification = db.query(models.Notification).filter(models.Notification.id == notif_id).first()
+    employee_id = await db.scalar(
+        select(models.Notification.employee_id).filter(models.Notification.id == notif_id)
+    )
     
-    if not notification:
+    if employee_id is None:
         raise HTTPException(status_code=404, detail="Notification not found")
     
-    notification.is_read = True
-    db.commit()
+    await db.run_sync(mark_read, employee_id, [notif_id])
+    await db.commit()
     
     return {"status": "marked"}
 
 
+@app.post("/api/notifications/read")
+async def mark_notifications_read(body: NotificationIds, db: AsyncSession = Depends(get_async_db)):
+    """Mark the given notifications as read in one statement"""
+    employee = await db.scalar(select(models.Employee).limit(1))
+    
+    if not employee:
+        return {"status": "marked", "count": 0}
+    
+    marked = await db.run_sync(mark_read, employee.employee_id, body.ids)
+    await db.commit()
+    
+    return {"status": "marked", "count": marked}
+
+
+@app.post("/api/notifications/read-all")
+async def mark_all_notifications_read(db: AsyncSession = Depends(get_async_db)):
+    """Mark every unread notification as read in one statement"""
+    employee = await db.scalar(select(models.Employee).limit(1))
+    
+    if not employee:
+        return {"status": "marked", "count": 0}
+    
+    marked = await db.run_sync(mark_read, employee.employee_id)
+    await db.commit()
+    
+    return {"status": "marked", "count": marked}
+
+
+@app.post("/api/notifications/broadcast", status_code=201)
+async def broadcast_notification(
+    body: NotificationBroadcast,
+    user: CurrentUser = Depends(require_role("admin", "manager")),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Send a notification to all employees, a department or a role"""
+    created = await db.run_sync(
+        broadcast,
+        body.audience,
+        body.type,
+        body.title,
+        message=body.message,
+        data=body.data,
+        target=body.target,
+    )
+    await db.commit()
+    
+    return {"status": "sent", "audience": body.audience, "target": body.target, "created": created}
+
+
 # ============================================
 # AUTHENTICATION ENDPOINTS
 # ============================================
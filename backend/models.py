@@ -5,13 +5,35 @@ SQLAlchemy ORM models mapping to PostgreSQL schema
 
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, JSON, DECIMAL
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, Text, ForeignKey, JSON, DECIMAL, Index, UniqueConstraint, and_, func, literal_column, true
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
 
+class MonthlyPartitioned:
+    """
+    Mixin for append-only log tables range-partitioned by month on `timestamp`.
+
+    On PostgreSQL the table is partitioned (database/schema.sql) and partitions
+    are managed by services/partition_service.py. Queries go through the parent
+    table; bounding them with in_period() lets the planner skip other months.
+    The physical primary key is (id, timestamp); `id` alone is unique and is
+    what the ORM uses as identity.
+    """
+
+    @classmethod
+    def in_period(cls, start: Optional[datetime] = None, end: Optional[datetime] = None):
+        """Filter clause for start <= timestamp < end (either bound may be omitted)"""
+        clauses = []
+        if start is not None:
+            clauses.append(cls.timestamp >= start)
+        if end is not None:
+            clauses.append(cls.timestamp < end)
+        return and_(true(), *clauses)
+
+
 class Department(Base):
     """Organizational department entity"""
     __tablename__ = "departments"
@@ -56,6 +78,7 @@ class Employee(Base):
 class AIAdoptionMetrics(Base):
     """Monthly AI adoption metrics per employee"""
     __tablename__ = "ai_adoption_metrics"
+    __table_args__ = (UniqueConstraint("employee_id", "month", "year"),)
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("employees.employee_id", ondelete="CASCADE"), nullable=False, index=True)
@@ -77,6 +100,7 @@ class AIAdoptionMetrics(Base):
 class DepartmentAdoptionAgg(Base):
     """Aggregated adoption metrics per department"""
     __tablename__ = "department_adoption_agg"
+    __table_args__ = (UniqueConstraint("department_id", "month", "year"),)
 
     id = Column(Integer, primary_key=True, index=True)
     department_id = Column(Integer, ForeignKey("departments.department_id", ondelete="CASCADE"), nullable=False, index=True)
@@ -87,6 +111,7 @@ class DepartmentAdoptionAgg(Base):
     total_hours_saved = Column(DECIMAL(12, 2), nullable=True)
     total_employees = Column(Integer, nullable=True)
     active_users = Column(Integer, nullable=True)
+    score_total = Column(Integer, default=0)  # Running sum so avg_score can be maintained incrementally
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -114,7 +139,7 @@ class AITool(Base):
     access_logs = relationship("ToolAccessLog", back_populates="tool", cascade="all, delete-orphan")
 
 
-class ToolAccessLog(Base):
+class ToolAccessLog(MonthlyPartitioned, Base):
     """Access logs for AI tools - audit trail"""
     __tablename__ = "tool_access_logs"
 
@@ -122,13 +147,45 @@ class ToolAccessLog(Base):
     employee_id = Column(Integer, ForeignKey("employees.employee_id", ondelete="CASCADE"), nullable=False, index=True)
     tool_id = Column(Integer, ForeignKey("ai_tools.tool_id", ondelete="CASCADE"), nullable=False)
     action = Column(String(50), nullable=False)
-    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
 
     # Relationships
     employee = relationship("Employee", back_populates="tool_access")
     tool = relationship("AITool", back_populates="access_logs")
 
 
+class ToolUsageDaily(Base):
+    """
+    Daily tool access counters per department, maintained from access events.
+    Employees without a department are counted under department_id NULL.
+    """
+    __tablename__ = "tool_usage_daily"
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False, index=True)
+    tool_id = Column(Integer, ForeignKey("ai_tools.tool_id", ondelete="CASCADE"), nullable=False)
+    department_id = Column(Integer, ForeignKey("departments.department_id", ondelete="CASCADE"), nullable=True)
+    access_count = Column(Integer, nullable=False, default=0)
+    distinct_users = Column(Integer, nullable=False, default=0)
+
+    # NULLs are distinct in a plain UNIQUE, so the unassigned bucket is keyed as department 0
+    __table_args__ = (
+        Index("ux_tool_usage_daily_key", "day", "tool_id", func.coalesce(department_id, literal_column("0")), unique=True),
+    )
+
+
+class ToolUsageUserDaily(Base):
+    """One row per employee per tool per day used - backs distinct-user counts"""
+    __tablename__ = "tool_usage_user_daily"
+    __table_args__ = (UniqueConstraint("day", "tool_id", "employee_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False, index=True)
+    tool_id = Column(Integer, ForeignKey("ai_tools.tool_id", ondelete="CASCADE"), nullable=False)
+    employee_id = Column(Integer, ForeignKey("employees.employee_id", ondelete="CASCADE"), nullable=False)
+    department_id = Column(Integer, ForeignKey("departments.department_id", ondelete="CASCADE"), nullable=True)
+
+
 class LearningResource(Base):
     """Learning content - courses, videos, guides"""
     __tablename__ = "learning_resources"
@@ -155,6 +212,7 @@ class LearningResource(Base):
 class UserLearningProgress(Base):
     """User's progress on learning resources"""
     __tablename__ = "user_learning_progress"
+    __table_args__ = (UniqueConstraint("employee_id", "resource_id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("employees.employee_id", ondelete="CASCADE"), nullable=False, index=True)
@@ -191,6 +249,7 @@ class GamificationBadge(Base):
 class UserBadge(Base):
     """Badges earned by users"""
     __tablename__ = "user_badges"
+    __table_args__ = (UniqueConstraint("employee_id", "badge_id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("employees.employee_id", ondelete="CASCADE"), nullable=False, index=True)
@@ -211,6 +270,7 @@ class UserPoints(Base):
     employee_id = Column(Integer, ForeignKey("employees.employee_id", ondelete="CASCADE"), unique=True, nullable=False)
     total_points = Column(Integer, default=0)
     month_points = Column(Integer, default=0)
+    rank = Column(Integer, nullable=True)
     last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
@@ -238,6 +298,7 @@ class MonthlyChallenge(Base):
 class UserChallengeProgress(Base):
     """User's progress on monthly challenges"""
     __tablename__ = "user_challenge_progress"
+    __table_args__ = (UniqueConstraint("employee_id", "challenge_id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("employees.employee_id", ondelete="CASCADE"), nullable=False)
@@ -251,9 +312,53 @@ class UserChallengeProgress(Base):
     challenge = relationship("MonthlyChallenge", back_populates="user_progress")
 
 
+class MonthlyPointsLedger(Base):
+    """
+    Points awarded per employee per month not yet closed. Lets the month-close
+    job keep points awarded after a month ended out of that month's history.
+    """
+    __tablename__ = "monthly_points_ledger"
+    __table_args__ = (UniqueConstraint("employee_id", "year", "month"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.employee_id", ondelete="CASCADE"), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    points = Column(Integer, nullable=False, default=0)
+
+
+class MonthlyPointsHistory(Base):
+    """Month points archived by the month-close job"""
+    __tablename__ = "monthly_points_history"
+    __table_args__ = (UniqueConstraint("employee_id", "year", "month"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.employee_id", ondelete="CASCADE"), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    points = Column(Integer, nullable=False, default=0)
+    total_points = Column(Integer, nullable=False, default=0)
+    month_rank = Column(Integer, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class MonthClose(Base):
+    """One row per closed month; its key makes the month-close job idempotent"""
+    __tablename__ = "month_closes"
+
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    employees_archived = Column(Integer, nullable=True)
+    challenges_completed = Column(Integer, nullable=True)
+    points_awarded = Column(Integer, nullable=True)
+
+
 class Notification(Base):
     """User notifications"""
     __tablename__ = "notifications"
+    __table_args__ = (Index("idx_notifications_feed", "employee_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("employees.employee_id", ondelete="CASCADE"), nullable=False, index=True)
@@ -269,7 +374,16 @@ class Notification(Base):
     employee = relationship("Employee", back_populates="notifications")
 
 
-class AuditLog(Base):
+class NotificationCounter(Base):
+    """Unread notification count per employee, maintained with every insert and read"""
+    __tablename__ = "notification_counters"
+
+    employee_id = Column(Integer, ForeignKey("employees.employee_id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class AuditLog(MonthlyPartitioned, Base):
     """Audit trail for compliance and security"""
     __tablename__ = "audit_logs"
 
@@ -281,4 +395,56 @@ class AuditLog(Base):
     details = Column(JSON, nullable=True)
     ip_address = Column(String(45), nullable=True)
     user_agent = Column(String(500), nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+# ============================================
+# REPORTING READ MODELS
+# ============================================
+
+# Materialized views (plain views outside PostgreSQL), created and refreshed by
+# services/reporting_service.py. They live on their own metadata so
+# Base.metadata.create_all() never tries to create them as tables.
+ReportingBase = declarative_base()
+
+
+class CurrentMonthScorecard(ReportingBase):
+    """Read model for v_current_month_scorecard"""
+    __tablename__ = "v_current_month_scorecard"
+
+    employee_id = Column(Integer, primary_key=True)
+    display_name = Column(String(255))
+    email = Column(String(255))
+    department_name = Column(String(255))
+    adoption_score = Column(Integer)
+    tasks_automated = Column(Integer)
+    hours_saved = Column(DECIMAL(10, 2))
+    tools_explored = Column(Integer)
+    month = Column(Integer)
+    year = Column(Integer)
+
+
+class DepartmentLeaderboard(ReportingBase):
+    """Read model for v_department_leaderboard"""
+    __tablename__ = "v_department_leaderboard"
+
+    department_id = Column(Integer, primary_key=True)
+    department_name = Column(String(255))
+    avg_score = Column(DECIMAL(5, 2))
+    active_users = Column(Integer)
+    total_employees = Column(Integer)
+    participation_rate = Column(DECIMAL(5, 2))
+    total_hours_saved = Column(DECIMAL(12, 2))
+    rank = Column(Integer)
+
+
+class UserStatsSummary(ReportingBase):
+    """Read model for v_user_stats_summary"""
+    __tablename__ = "v_user_stats_summary"
+
+    employee_id = Column(Integer, primary_key=True)
+    display_name = Column(String(255))
+    total_points = Column(Integer)
+    badge_count = Column(Integer)
+    resources_completed = Column(Integer)
+    tools_used = Column(Integer)
@@ -3,14 +3,23 @@ Router for AI Adoption metrics and personal scorecard
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from datetime import date, datetime
+from typing import List, Optional
 import models
 import schemas
-from database import get_db
+from database import get_async_db
 from dependencies import get_current_user, CurrentUser
+from services.history_service import adoption_history
+from services.rollup_service import (
+    EMPTY_CONTRIBUTION,
+    apply_metric_change,
+    metric_contribution,
+    rebuild_rollups,
+)
+from services.rewards_service import rewards_engine
+from services.scorecard_service import load_scorecard
 
 router = APIRouter()
 
@@ -18,7 +27,7 @@ router = APIRouter()
 @router.get("/me/scorecard", response_model=schemas.PersonalScorecard)
 async def get_personal_scorecard(
     user: CurrentUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get current user's personal AI adoption scorecard.
@@ -34,41 +43,14 @@ async def get_personal_scorecard(
     current_month = current_date.month
     current_year = current_date.year
     
-    # Get current month metrics
-    current_metrics = db.query(models.AIAdoptionMetrics).filter(
-        models.AIAdoptionMetrics.employee_id == user.employee_id,
-        models.AIAdoptionMetrics.month == current_month,
-        models.AIAdoptionMetrics.year == current_year,
-    ).first()
-    
-    # Get previous month metrics
-    prev_month = current_month - 1 if current_month > 1 else 12
-    prev_year = current_year if current_month > 1 else current_year - 1
-    
-    prev_metrics = db.query(models.AIAdoptionMetrics).filter(
-        models.AIAdoptionMetrics.employee_id == user.employee_id,
-        models.AIAdoptionMetrics.month == prev_month,
-        models.AIAdoptionMetrics.year == prev_year,
-    ).first()
-    
-    # Get last 6 months for trends
-    trends_data = db.query(models.AIAdoptionMetrics).filter(
-        models.AIAdoptionMetrics.employee_id == user.employee_id,
-    ).order_by(
-        models.AIAdoptionMetrics.year,
-        models.AIAdoptionMetrics.month
-    ).all()[-6:]
-    
-    # Get department average
-    dept_avg = db.query(
-        func.avg(models.AIAdoptionMetrics.adoption_score)
-    ).join(
-        models.Employee
-    ).filter(
-        models.Employee.department_id == user.department_id,
-        models.AIAdoptionMetrics.month == current_month,
-        models.AIAdoptionMetrics.year == current_year,
-    ).scalar()
+    # Current/previous month, recent history and department average in one query
+    scorecard = await db.run_sync(
+        load_scorecard, user.employee_id, user.department_id, current_month, current_year
+    )
+    current_metrics = scorecard.current
+    prev_metrics = scorecard.previous
+    trends_data = scorecard.history
+    dept_avg = scorecard.department_avg
     
     # Build response
     current_score = current_metrics.adoption_score if current_metrics else 0
@@ -112,7 +94,7 @@ async def get_personal_scorecard(
 async def get_department_overview(
     department_id: int,
     user: CurrentUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get department AI adoption overview.
@@ -127,55 +109,47 @@ async def get_department_overview(
             detail="Access denied to this department"
         )
     
-    dept = db.query(models.Department).filter(
+    current_date = datetime.utcnow()
+    
+    # Department and its current month rollup in one primary-key lookup
+    row = (await db.execute(select(models.Department.name, models.DepartmentAdoptionAgg).outerjoin(
+        models.DepartmentAdoptionAgg,
+        (models.DepartmentAdoptionAgg.department_id == models.Department.department_id)
+        & (models.DepartmentAdoptionAgg.month == current_date.month)
+        & (models.DepartmentAdoptionAgg.year == current_date.year),
+    ).filter(
         models.Department.department_id == department_id
-    ).first()
+    ))).first()
     
-    if not dept:
+    if not row:
         raise HTTPException(status_code=404, detail="Department not found")
     
-    current_date = datetime.utcnow()
+    dept_name, dept_agg = row
     
-    # Get current month aggregated metrics
-    dept_agg = db.query(models.DepartmentAdoptionAgg).filter(
-        models.DepartmentAdoptionAgg.department_id == department_id,
-        models.DepartmentAdoptionAgg.month == current_date.month,
-        models.DepartmentAdoptionAgg.year == current_date.year,
-    ).first()
+    if not dept_agg:
+        # Backfill the rollup once; later requests hit the stored row
+        await db.run_sync(rebuild_rollups, department_id, current_date.month, current_date.year)
+        await db.commit()
+        dept_agg = await db.scalar(select(models.DepartmentAdoptionAgg).filter(
+            models.DepartmentAdoptionAgg.department_id == department_id,
+            models.DepartmentAdoptionAgg.month == current_date.month,
+            models.DepartmentAdoptionAgg.year == current_date.year,
+        ))
     
     if not dept_agg:
-        # Calculate on-the-fly if not pre-aggregated
-        metrics = db.query(models.AIAdoptionMetrics).join(
-            models.Employee
-        ).filter(
-            models.Employee.department_id == department_id,
-            models.AIAdoptionMetrics.month == current_date.month,
-            models.AIAdoptionMetrics.year == current_date.year,
-        ).all()
-        
-        active_count = len([m for m in metrics if m.adoption_score is not None])
-        total_count = db.query(models.Employee).filter(
-            models.Employee.department_id == department_id,
-            models.Employee.status == "active"
-        ).count()
-        
-        avg_score = sum([m.adoption_score for m in metrics if m.adoption_score]) / active_count if active_count > 0 else 0
-        total_hours = sum([m.hours_saved for m in metrics if m.hours_saved]) if metrics else 0
-        participation = (active_count / total_count * 100) if total_count > 0 else 0
-        
         return schemas.DepartmentOverview(
             department_id=department_id,
-            department_name=dept.name,
-            avg_score=float(avg_score),
-            participation_rate=float(participation),
-            total_hours_saved=float(total_hours),
-            total_employees=total_count,
-            active_users=active_count,
+            department_name=dept_name,
+            avg_score=0.0,
+            participation_rate=0.0,
+            total_hours_saved=0.0,
+            total_employees=0,
+            active_users=0,
         )
     
     return schemas.DepartmentOverview(
         department_id=department_id,
-        department_name=dept.name,
+        department_name=dept_name,
         avg_score=float(dept_agg.avg_score or 0),
         participation_rate=float(dept_agg.participation_rate or 0),
         total_hours_saved=float(dept_agg.total_hours_saved or 0),
@@ -188,7 +162,7 @@ async def get_department_overview(
 async def create_adoption_metric(
     metric: schemas.AdoptionMetricBase,
     user: CurrentUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create or update adoption metrics for current user.
@@ -198,21 +172,27 @@ async def create_adoption_metric(
     current_date = datetime.utcnow()
     
     # Find existing metric
-    existing = db.query(models.AIAdoptionMetrics).filter(
+    existing = await db.scalar(select(models.AIAdoptionMetrics).filter(
         models.AIAdoptionMetrics.employee_id == user.employee_id,
         models.AIAdoptionMetrics.month == current_date.month,
         models.AIAdoptionMetrics.year == current_date.year,
-    ).first()
+    ).limit(1))
     
     if existing:
         # Update existing
+        before = metric_contribution(existing)
         existing.adoption_score = metric.adoption_score
         existing.tasks_ai_assisted = metric.tasks_ai_assisted
         existing.hours_saved = metric.hours_saved
         existing.tools_explored = metric.tools_explored
         existing.learning_hours = metric.learning_hours
-        db.commit()
-        db.refresh(existing)
+        await db.run_sync(
+            apply_metric_change, user.department_id, existing.month, existing.year,
+            before, metric_contribution(existing),
+        )
+        await db.commit()
+        rewards_engine.submit([user.employee_id])
+        await db.refresh(existing)
         return existing
     else:
         # Create new
@@ -227,40 +207,38 @@ async def create_adoption_metric(
             learning_hours=metric.learning_hours,
         )
         db.add(new_metric)
-        db.commit()
-        db.refresh(new_metric)
+        await db.run_sync(
+            apply_metric_change, user.department_id, new_metric.month, new_metric.year,
+            EMPTY_CONTRIBUTION, metric_contribution(new_metric),
+        )
+        await db.commit()
+        rewards_engine.submit([user.employee_id])
+        await db.refresh(new_metric)
         return new_metric
 
 
 @router.get("/adoption-metrics/history")
 async def get_adoption_history(
     months: int = 12,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    resolution: str = "monthly",
     user: CurrentUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get user's adoption metrics history for specified number of months.
+    
+    Optionally limited to a start/end date range and downsampled to
+    quarterly resolution. Data is returned oldest first.
     """
-    metrics = db.query(models.AIAdoptionMetrics).filter(
-        models.AIAdoptionMetrics.employee_id == user.employee_id,
-    ).order_by(
-        models.AIAdoptionMetrics.year,
-        models.AIAdoptionMetrics.month
-    ).all()[-months:]
+    data = await db.run_sync(
+        adoption_history, user.employee_id, months, start=start, end=end, resolution=resolution
+    )
     
     return {
         "employee_id": user.employee_id,
         "months": months,
-        "data": [
-            {
-                "month": m.month,
-                "year": m.year,
-                "adoption_score": m.adoption_score,
-                "tasks_ai_assisted": m.tasks_ai_assisted,
-                "hours_saved": float(m.hours_saved),
-                "tools_explored": m.tools_explored,
-                "learning_hours": float(m.learning_hours),
-            }
-            for m in metrics
-        ]
+        "resolution": resolution,
+        "data": data,
     }
@@ -286,6 +286,7 @@ class NotificationBase(BaseModel):
 class NotificationResponse(NotificationBase):
     """Full notification"""
     id: int
+    data: Optional[dict] = None
     is_read: bool
     created_at: datetime
     read_at: Optional[datetime] = None
@@ -295,10 +296,22 @@ class NotificationResponse(NotificationBase):
 
 
 class NotificationsList(BaseModel):
-    """Notifications list response"""
-    total: int
+    """One page of notifications, newest first"""
     unread: int
     notifications: List[NotificationResponse]
+    next_cursor: Optional[str] = None
+
+
+class NotificationBroadcast(NotificationBase):
+    """Broadcast one notification to every active employee in an audience"""
+    audience: str = "all"  # all, department, role
+    target: Optional[str] = None  # department_id or role name
+    data: Optional[dict] = None
+
+
+class NotificationIds(BaseModel):
+    """Notification IDs to mark read"""
+    ids: List[int] = Field(..., max_length=1000)
 
 
 # ============================================
@@ -363,9 +376,10 @@ class ErrorResponse(BaseModel):
 # ============================================
 
 class PaginationParams(BaseModel):
-    """Pagination parameters"""
+    """Pagination parameters - pass `cursor` (from next_cursor) for keyset paging"""
     skip: int = Field(0, ge=0)
     limit: int = Field(10, ge=1, le=100)
+    cursor: Optional[str] = None
 
 
 class PaginatedResponse(BaseModel):
@@ -374,3 +388,4 @@ class PaginatedResponse(BaseModel):
     skip: int
     limit: int
     items: List[dict]
+    next_cursor: Optional[str] = None
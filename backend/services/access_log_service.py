@@ -0,0 +1,190 @@
+"""
+Tool access logging - click events buffered in memory and written in batches
+
+Requests enqueue an event and return; a background task drains the queue and
+writes each batch with one multi-row INSERT (plus the daily usage counter
+updates) once `batch_size` events are waiting or `flush_interval` seconds
+have passed, then hands the batch's employees to the rewards engine. The
+queue is bounded: when it is full, enqueue() fails fast so the endpoint can
+answer 503 instead of letting memory grow. stop() flushes whatever is left
+and is awaited in the app lifespan.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import FrozenSet, List, Optional
+
+from sqlalchemy import insert, select
+
+import models
+from database import AsyncSessionLocal
+from services.catalog_service import catalog_cache
+from services.rewards_service import rewards_engine
+from services.tool_usage_service import record_usage
+
+logger = logging.getLogger(__name__)
+
+ACCESS_LOG_QUEUE_SIZE = int(os.getenv("ACCESS_LOG_QUEUE_SIZE", "10000"))
+ACCESS_LOG_BATCH_SIZE = int(os.getenv("ACCESS_LOG_BATCH_SIZE", "500"))
+ACCESS_LOG_FLUSH_SECONDS = float(os.getenv("ACCESS_LOG_FLUSH_SECONDS", "1.0"))
+
+# Tool IDs are re-read at least this often, and after any catalog write
+TOOL_SET_MAX_AGE_SECONDS = 60.0
+
+
+class AccessLogQueueFull(Exception):
+    """Raised by enqueue() when the buffer is at capacity"""
+
+
+class ToolAccessLogger:
+    """Bounded buffer of tool access events with a batching writer task"""
+
+    def __init__(
+        self,
+        max_queue: int = ACCESS_LOG_QUEUE_SIZE,
+        batch_size: int = ACCESS_LOG_BATCH_SIZE,
+        flush_interval: float = ACCESS_LOG_FLUSH_SECONDS,
+    ):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._tool_ids: FrozenSet[int] = frozenset()
+        self._tools_loaded_at = 0.0
+        self._tools_generation = -1
+        self.written = 0
+        self.rejected = 0
+        self.failed = 0
+
+    # ----------------------------------------
+    # Request path
+    # ----------------------------------------
+
+    async def is_known_tool(self, tool_id: int) -> bool:
+        """Check a tool ID against the cached set of active tools"""
+        if (
+            self._tools_generation != catalog_cache.generation
+            or time.monotonic() - self._tools_loaded_at >= TOOL_SET_MAX_AGE_SECONDS
+        ):
+            await self._load_tool_ids()
+        return tool_id in self._tool_ids
+
+    def enqueue(self, employee_id: int, tool_id: int, action: str = "access"):
+        """
+        Buffer one event without waiting on the database.
+
+        Raises:
+            AccessLogQueueFull: If the buffer is full (caller should shed load)
+        """
+        if self._queue is None:
+            raise RuntimeError("Tool access logger is not running")
+        try:
+            self._queue.put_nowait({
+                "employee_id": employee_id,
+                "tool_id": tool_id,
+                "action": action,
+                "timestamp": datetime.utcnow(),
+            })
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise AccessLogQueueFull()
+        if self._queue.qsize() >= self.batch_size - 1:
+            self._batch_ready.set()
+
+    # ----------------------------------------
+    # Lifecycle
+    # ----------------------------------------
+
+    async def start(self):
+        """Create the queue and start the writer task (call from lifespan)"""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._batch_ready = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="tool-access-log-writer")
+
+    async def stop(self):
+        """Stop the writer and flush every buffered event"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        while not self._queue.empty():
+            await self._write(self._take(self.batch_size))
+        self._queue = None
+        logger.info(
+            f"Tool access logger stopped: {self.written} written, "
+            f"{self.rejected} rejected, {self.failed} failed"
+        )
+
+    # ----------------------------------------
+    # Writer
+    # ----------------------------------------
+
+    async def _run(self):
+        batch: List[dict] = []
+        writing: Optional[asyncio.Future] = None
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                if self._queue.qsize() + 1 < self.batch_size:
+                    # Wait for a full batch, but no longer than flush_interval
+                    self._batch_ready.clear()
+                    try:
+                        await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                batch.extend(self._take(self.batch_size - 1))
+                writing = asyncio.ensure_future(self._write(batch))
+                batch = []
+                # Shielded so shutdown cannot cut a batch off mid-write
+                await asyncio.shield(writing)
+        except asyncio.CancelledError:
+            if writing is not None and not writing.done():
+                await writing
+            await self._write(batch)
+            raise
+
+    def _take(self, limit: int) -> List[dict]:
+        events = []
+        while len(events) < limit and not self._queue.empty():
+            events.append(self._queue.get_nowait())
+        return events
+
+    async def _write(self, batch: List[dict]):
+        if not batch:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(models.ToolAccessLog).values(batch))
+                # Daily usage counters move in the same transaction as the logs
+                await db.run_sync(record_usage, batch)
+                await db.commit()
+            self.written += len(batch)
+            rewards_engine.submit(e["employee_id"] for e in batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Dropped {len(batch)} tool access events: {e}")
+
+    async def _load_tool_ids(self):
+        generation = catalog_cache.generation
+        async with AsyncSessionLocal() as db:
+            tool_ids = await db.scalars(
+                select(models.AITool.tool_id).where(models.AITool.is_active == True)
+            )
+            self._tool_ids = frozenset(tool_ids)
+        self._tools_generation = generation
+        self._tools_loaded_at = time.monotonic()
+
+
+access_logger = ToolAccessLogger()
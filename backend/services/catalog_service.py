@@ -0,0 +1,214 @@
+"""
+Catalog service - tool catalog queries and a response cache for catalog endpoints
+
+Tool search filters, searches and pages in SQL, using keyset pagination on
+(name, tool_id) so deep pages cost the same as the first one.
+
+Tools, categories, learning resources and badges only change through admin
+writes, so each endpoint's body is serialized once, served from memory with a
+strong ETag, and answered with 304 when the client already has it. Writes to
+AITool, LearningResource or GamificationBadge committed through the ORM clear
+the cache.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+import models
+from cache import CommitHooks
+from schemas import PaginatedResponse, PaginationParams
+
+# Safety net for writes made by other processes, as for the leaderboard
+CATALOG_MAX_AGE_SECONDS = float(os.getenv("CATALOG_CACHE_TTL", "600"))
+
+Tool = models.AITool
+
+CATALOG_MODELS = (Tool, models.LearningResource, models.GamificationBadge)
+
+
+# ============================================
+# CATALOG QUERIES
+# ============================================
+
+def serialize_tool(tool: Tool) -> dict:
+    return {
+        "tool_id": tool.tool_id,
+        "name": tool.name,
+        "description": tool.description,
+        "category": tool.category,
+        "icon_url": tool.icon_url,
+        "sso_url": tool.sso_url,
+        "requires_approval": tool.requires_approval,
+    }
+
+
+def tool_categories(db: Session) -> List[str]:
+    """Distinct categories of active tools, resolved by the database"""
+    return list(db.scalars(
+        select(Tool.category).distinct().where(Tool.is_active == True).order_by(Tool.category)
+    ))
+
+
+def encode_cursor(tool: Tool) -> str:
+    raw = json.dumps([tool.name, tool.tool_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Return the (name, tool_id) a cursor points after; ValueError if malformed"""
+    try:
+        name, tool_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(name, str) or not isinstance(tool_id, int):
+        raise ValueError("Invalid cursor")
+    return name, tool_id
+
+
+def search_tools(
+    db: Session,
+    page: PaginationParams,
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+) -> PaginatedResponse:
+    """
+    Return one page of active tools ordered by name.
+
+    `search` matches name or description case-insensitively. With a cursor
+    the page starts after it (keyset); otherwise `skip` is used as an offset.
+    Raises ValueError for a malformed cursor.
+    """
+    filters = [Tool.is_active == True]
+    if category:
+        filters.append(Tool.category == category)
+    if search:
+        filters.append(or_(
+            Tool.name.icontains(search, autoescape=True),
+            Tool.description.icontains(search, autoescape=True),
+        ))
+
+    total = db.scalar(select(func.count(Tool.tool_id)).where(*filters))
+
+    query = select(Tool).where(*filters).order_by(Tool.name, Tool.tool_id)
+    if page.cursor:
+        after_name, after_id = decode_cursor(page.cursor)
+        query = query.where(or_(
+            Tool.name > after_name,
+            and_(Tool.name == after_name, Tool.tool_id > after_id),
+        ))
+    elif page.skip:
+        query = query.offset(page.skip)
+
+    # One extra row tells us whether another page exists
+    tools = list(db.scalars(query.limit(page.limit + 1)))
+    has_more = len(tools) > page.limit
+    tools = tools[:page.limit]
+
+    return PaginatedResponse(
+        total=total or 0,
+        skip=page.skip,
+        limit=page.limit,
+        items=[serialize_tool(t) for t in tools],
+        next_cursor=encode_cursor(tools[-1]) if has_more else None,
+    )
+
+
+# ============================================
+# RESPONSE CACHE
+# ============================================
+
+class CachedResponse:
+    """A serialized JSON body and its ETag"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.built_at = time.monotonic()
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True if an If-None-Match header names this body's ETag"""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or self.etag in tags
+
+    def to_response(self, request: Request) -> Response:
+        # no-cache: browsers may store the body but must revalidate each time
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if self.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
+
+
+class CatalogCache:
+    """Per-endpoint response bodies, rebuilt at most once per change"""
+
+    def __init__(self, max_age: float = CATALOG_MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self._entries: Dict[str, CachedResponse] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Bumped on every invalidation, for caches derived from catalog rows"""
+        return self._generation
+
+    def invalidate(self):
+        """Drop every cached body; the next read of each endpoint rebuilds it"""
+        self._generation += 1
+        self._entries = {}
+
+    def _fresh(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.built_at < self.max_age:
+            return entry
+        return None
+
+    async def get(self, key: str, build: Callable[[], Awaitable[Any]]) -> CachedResponse:
+        """Return the cached body for `key`, awaiting `build()` to create it"""
+        entry = self._fresh(key)
+        if entry is not None:
+            return entry
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._fresh(key)
+            if entry is not None:
+                return entry
+            generation = self._generation
+            body = json.dumps(
+                jsonable_encoder(await build()),
+                ensure_ascii=False,
+                allow_nan=False,
+                separators=(",", ":"),
+            ).encode("utf-8")
+            entry = CachedResponse(body)
+            # A write committed while we were building makes this body stale
+            if generation == self._generation:
+                self._entries[key] = entry
+            return entry
+
+
+catalog_cache = CatalogCache()
+
+
+# ============================================
+# INVALIDATION HOOKS
+# ============================================
+
+# Cached bodies are dropped once a transaction that wrote a catalog table commits
+_hooks = CommitHooks("catalog_dirty", lambda items: catalog_cache.invalidate())
+_hooks.watch(CATALOG_MODELS)
+_hooks.watch_bulk(CATALOG_MODELS)
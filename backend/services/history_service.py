@@ -0,0 +1,122 @@
+"""
+Adoption history - bounded, index-ordered metrics history per employee
+
+History is read newest-first along the (employee_id, year, month) index with
+the LIMIT applied in SQL, then returned oldest-first for charts. Date ranges
+are row-value comparisons on (year, month) so they stay index range scans.
+Quarterly resolution is aggregated in the database over a window of whole
+quarters, so at most `periods` rows ever leave the database.
+"""
+
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session
+
+import models
+
+Metric = models.AIAdoptionMetrics
+
+RESOLUTIONS = ("monthly", "quarterly")
+MAX_PERIODS = 120
+
+
+def _quarter_start(day: date, quarters_back: int = 0) -> date:
+    index = day.year * 4 + (day.month - 1) // 3 - quarters_back
+    return date(index // 4, (index % 4) * 3 + 1, 1)
+
+
+def adoption_history(
+    db: Session,
+    employee_id: int,
+    periods: int = 12,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    resolution: str = "monthly",
+) -> List[dict]:
+    """
+    Latest `periods` months (or quarters) of metrics, oldest first.
+
+    `start` and `end` are inclusive and compared by month. Monthly history
+    returns the latest rows that exist; quarterly history covers the
+    `periods` calendar quarters ending with `end` (default: this quarter)
+    unless `start` is given.
+
+    Raises:
+        ValueError: On an unknown resolution or start after end
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    if start and end and (start.year, start.month) > (end.year, end.month):
+        raise ValueError("start must not be after end")
+    periods = min(max(periods, 1), MAX_PERIODS)
+
+    if resolution == "quarterly":
+        end = end or datetime.utcnow().date()
+        start = start or _quarter_start(end, periods - 1)
+
+    scope = [Metric.employee_id == employee_id]
+    if start is not None:
+        scope.append(tuple_(Metric.year, Metric.month) >= (start.year, start.month))
+    if end is not None:
+        scope.append(tuple_(Metric.year, Metric.month) <= (end.year, end.month))
+
+    if resolution == "monthly":
+        rows = db.execute(
+            select(
+                Metric.month,
+                Metric.year,
+                Metric.adoption_score,
+                Metric.tasks_ai_assisted,
+                Metric.hours_saved,
+                Metric.tools_explored,
+                Metric.learning_hours,
+            )
+            .where(*scope)
+            .order_by(Metric.year.desc(), Metric.month.desc())
+            .limit(periods)
+        ).all()
+        return [
+            {
+                "month": r.month,
+                "year": r.year,
+                "adoption_score": r.adoption_score,
+                "tasks_ai_assisted": r.tasks_ai_assisted,
+                "hours_saved": float(r.hours_saved or 0),
+                "tools_explored": r.tools_explored,
+                "learning_hours": float(r.learning_hours or 0),
+            }
+            for r in reversed(rows)
+        ]
+
+    quarter = ((Metric.month - 1) // 3 + 1).label("quarter")
+    rows = db.execute(
+        select(
+            Metric.year,
+            quarter,
+            func.count().label("months"),
+            func.avg(Metric.adoption_score).label("adoption_score"),
+            func.sum(Metric.tasks_ai_assisted).label("tasks_ai_assisted"),
+            func.sum(Metric.hours_saved).label("hours_saved"),
+            func.max(Metric.tools_explored).label("tools_explored"),
+            func.sum(Metric.learning_hours).label("learning_hours"),
+        )
+        .where(*scope)
+        .group_by(Metric.year, quarter)
+        .order_by(Metric.year.desc(), quarter.desc())
+        .limit(periods)
+    ).all()
+    return [
+        {
+            "quarter": int(r.quarter),
+            "year": r.year,
+            "months": r.months,
+            "adoption_score": round(float(r.adoption_score), 1) if r.adoption_score is not None else None,
+            "tasks_ai_assisted": int(r.tasks_ai_assisted or 0),
+            "hours_saved": float(r.hours_saved or 0),
+            "tools_explored": r.tools_explored,
+            "learning_hours": float(r.learning_hours or 0),
+        }
+        for r in reversed(rows)
+    ]
@@ -0,0 +1,112 @@
+"""
+Leaderboard engine - ranked pages of UserPoints served from memory
+
+Ranks, pages and an employee's neighbours all come from the rank index
+(services/rank_service.py), which moves one employee per points write
+instead of re-sorting everyone. This module only adds the display fields:
+employee profiles (name, role, department name) are cached per employee,
+fetched for the ids a page needs with one query, and dropped when a
+transaction that changed them commits. Points writes never touch them.
+"""
+
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from cache import CommitHooks
+from services.rank_service import RankIndex, rank_index
+
+# Safety net for writes made by other processes (e.g. load_testdata.py or a
+# second uvicorn worker) which the in-process event hooks cannot observe.
+PROFILE_MAX_AGE_SECONDS = float(os.getenv("LEADERBOARD_PROFILE_TTL", "300"))
+
+Profile = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+class LeaderboardService:
+    """Leaderboard rows from the rank index, joined to cached profiles"""
+
+    def __init__(self, index: RankIndex = rank_index, max_age: float = PROFILE_MAX_AGE_SECONDS):
+        self.index = index
+        self.max_age = max_age
+        self._profiles: Dict[int, Profile] = {}
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Drop cached profiles; the next read fetches them again"""
+        self._profiles = {}
+        self._loaded_at = time.monotonic()
+
+    async def page_async(self, db: AsyncSession, skip: int = 0, limit: int = 100) -> List[dict]:
+        """Return a slice of the ranked list"""
+        await self.index.ensure_loaded_async(db)
+        return await self._entries_async(db, self.index.page(skip, limit))
+
+    async def around_async(self, db: AsyncSession, employee_id: int, radius: int = 5) -> List[dict]:
+        """Return an employee's entry plus `radius` neighbours on each side"""
+        await self.index.ensure_loaded_async(db)
+        return await self._entries_async(db, self.index.around(employee_id, radius))
+
+    async def _entries_async(self, db: AsyncSession, ranked: List[Tuple[int, int, int]]) -> List[dict]:
+        if time.monotonic() - self._loaded_at >= self.max_age:
+            self.invalidate()
+        # An invalidation while the query runs replaces the dict, not this one
+        profiles = self._profiles
+        missing = [employee_id for _, employee_id, _ in ranked if employee_id not in profiles]
+        if missing:
+            for employee_id, *profile in (await db.execute(self._profile_query(missing))).all():
+                profiles[employee_id] = tuple(profile)
+
+        entries = []
+        for rank, employee_id, points in ranked:
+            display_name, role, department_name = profiles.get(employee_id, (None, None, None))
+            entries.append({
+                "rank": rank,
+                "employee_id": employee_id,
+                "display_name": display_name,
+                "role": role,
+                "department": department_name,
+                "points": points,
+            })
+        return entries
+
+    @staticmethod
+    def _profile_query(employee_ids: List[int]):
+        """Display fields for the given employees as one joined query"""
+        return select(
+            models.Employee.employee_id,
+            models.Employee.display_name,
+            models.Employee.role,
+            models.Department.name,
+        ).outerjoin(
+            models.Department,
+            models.Department.department_id == models.Employee.department_id,
+        ).where(models.Employee.employee_id.in_(employee_ids))
+
+
+leaderboard = LeaderboardService()
+
+
+# ============================================
+# INVALIDATION HOOKS
+# ============================================
+
+def _profile_changed(employee) -> Optional[list]:
+    # Logins and other employee updates leave the cached profiles alone
+    state = inspect(employee).attrs
+    changed = any(state[name].history.has_changes() for name in ("display_name", "role", "department_id"))
+    return None if changed else []
+
+
+# Profiles are dropped once a transaction that renamed or moved someone commits
+_hooks = CommitHooks("leaderboard_profiles_dirty", lambda items: leaderboard.invalidate())
+_hooks.watch([models.Employee], events=("after_update",), items=_profile_changed)
+_hooks.watch([models.Department], events=("after_update", "after_delete"))
+_hooks.watch_bulk(
+    [models.Employee, models.Department],
+    when=lambda state: not state.is_insert,
+)
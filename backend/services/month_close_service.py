@@ -0,0 +1,268 @@
+"""
+Month close - archive month points, settle challenges and reset counters
+
+Closing a month is a fixed handful of set-based statements in one
+transaction, whatever the head count:
+
+    1. claim the month in month_closes (the idempotency key)
+    2. complete challenge progress that reached 100% but was never marked
+    3. award those challenges' reward points (INSERT ... SELECT upsert)
+    4. archive every month_points into monthly_points_history, with month rank
+    5. reset user_points.month_points to the points of later months
+    6. mark the month's challenges completed (anyone finished) or expired
+
+month_points is a single running counter, so months are closed strictly in
+order, each only once it has ended. Points the rewards engine awards are
+also recorded per month in monthly_points_ledger; those of months after the
+one being closed are subtracted from its history and carried over into the
+new month_points, so a late close does not move them into the closed month.
+Points written without a ledger row count toward the oldest open month.
+
+A month that is already in month_closes is skipped, and concurrent runs
+serialize on its primary key, so the job is safe to re-run.
+
+Usage:
+    python -m services.month_close_service                        # close the next month due
+    python -m services.month_close_service --year 2026 --month 9  # must be that same month
+"""
+
+import argparse
+import logging
+from datetime import date, datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import DateTime, case, delete, func, literal, select, true, update
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+from services.notification_service import notify_many
+
+logger = logging.getLogger(__name__)
+
+Points = models.UserPoints
+History = models.MonthlyPointsHistory
+Challenge = models.MonthlyChallenge
+Progress = models.UserChallengeProgress
+Ledger = models.MonthlyPointsLedger
+
+
+def previous_month(today: Optional[date] = None) -> Tuple[int, int]:
+    """(year, month) before the one containing `today`"""
+    today = today or datetime.utcnow().date()
+    return (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+
+
+def last_closed_month(db: Session) -> Optional[Tuple[int, int]]:
+    """(year, month) of the latest closed month, or None before the first close"""
+    row = db.execute(
+        select(models.MonthClose.year, models.MonthClose.month)
+        .order_by(models.MonthClose.year.desc(), models.MonthClose.month.desc())
+        .limit(1)
+    ).first()
+    return tuple(row) if row else None
+
+
+def next_month_to_close(db: Session, today: Optional[date] = None) -> Tuple[int, int]:
+    """The month after the last closed one (last month if none was closed yet)"""
+    last = last_closed_month(db)
+    if last is None:
+        return previous_month(today)
+    year, month = last
+    return (year, month + 1) if month < 12 else (year + 1, 1)
+
+
+def close_month(db: Session, year: int, month: int) -> Optional[dict]:
+    """
+    Close (year, month). Does not commit; the caller commits once.
+
+    Returns a summary, or None if the month was already closed.
+
+    Raises:
+        ValueError: On an invalid month, one that has not ended yet, or one
+            that is not the month after the last closed month
+    """
+    if not 1 <= month <= 12:
+        raise ValueError("month must be between 1 and 12")
+    today = datetime.utcnow().date()
+    if (year, month) >= (today.year, today.month):
+        raise ValueError("only months that have ended can be closed")
+    if db.get(models.MonthClose, (year, month)) is not None:
+        return None
+    last = last_closed_month(db)
+    if last is not None:
+        expected = (last[0], last[1] + 1) if last[1] < 12 else (last[0] + 1, 1)
+        if (year, month) != expected:
+            raise ValueError(
+                f"months close in order: the next month to close is {expected[0]}-{expected[1]:02d}"
+            )
+
+    insert_ = dialect_insert(db)
+    now = datetime.utcnow()
+
+    claimed = db.execute(
+        insert_(models.MonthClose)
+        .values(year=year, month=month, started_at=now)
+        .on_conflict_do_nothing(index_elements=["year", "month"])
+        .returning(models.MonthClose.year)
+    ).first()
+    if claimed is None:
+        return None
+
+    month_challenges = select(Challenge.challenge_id).where(
+        Challenge.year == year,
+        Challenge.month == month,
+        Challenge.status == "active",
+    )
+
+    # Progress that reached 100% without the engine marking it (e.g. written
+    # directly, or evaluated under an older rule) completes at close.
+    # completed_at == now identifies this run's completions below.
+    completed = db.execute(
+        update(Progress)
+        .where(
+            Progress.challenge_id.in_(month_challenges),
+            Progress.completed == False,
+            Progress.progress_percent >= 100,
+        )
+        .values(completed=True, completed_at=now)
+        .returning(Progress.employee_id, Progress.challenge_id),
+        execution_options={"synchronize_session": False},
+    ).all()
+
+    points_awarded = 0
+    if completed:
+        reward = func.sum(Challenge.reward_points)
+        stmt = insert_(Points).from_select(
+            ["employee_id", "total_points", "month_points", "last_updated"],
+            select(Progress.employee_id, reward, reward, literal(now, DateTime))
+            .join(Challenge, Challenge.challenge_id == Progress.challenge_id)
+            .where(Progress.challenge_id.in_(month_challenges), Progress.completed_at == now)
+            .group_by(Progress.employee_id),
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["employee_id"],
+            set_={
+                "total_points": Points.total_points + stmt.excluded.total_points,
+                "month_points": Points.month_points + stmt.excluded.month_points,
+                "last_updated": now,
+            },
+        ))
+        rewards = {
+            challenge_id: (title, reward_points or 0)
+            for challenge_id, title, reward_points in db.execute(
+                select(Challenge.challenge_id, Challenge.title, Challenge.reward_points)
+                .where(Challenge.challenge_id.in_({challenge_id for _, challenge_id in completed}))
+            )
+        }
+        points_awarded = sum(rewards[challenge_id][1] for _, challenge_id in completed)
+        notify_many(db, [
+            {
+                "employee_id": employee_id,
+                "type": "challenge",
+                "title": f"Challenge completed: {rewards[challenge_id][0]}",
+                "data": {"challenge_id": challenge_id, "points": rewards[challenge_id][1]},
+            }
+            for employee_id, challenge_id in completed
+        ])
+
+    # Points already awarded in later months stay out of this month's history
+    month_key = year * 12 + month
+    later_points = func.coalesce(
+        select(func.sum(Ledger.points))
+        .where(Ledger.employee_id == Points.employee_id, Ledger.year * 12 + Ledger.month > month_key)
+        .scalar_subquery(),
+        0,
+    )
+    closed_points = func.coalesce(Points.month_points, 0) - later_points
+
+    archived = db.execute(
+        insert_(History).from_select(
+            ["employee_id", "year", "month", "points", "total_points", "month_rank", "archived_at"],
+            select(
+                Points.employee_id,
+                literal(year),
+                literal(month),
+                closed_points,
+                func.coalesce(Points.total_points, 0) - later_points,
+                func.rank().over(order_by=closed_points.desc()),
+                literal(now, DateTime),
+            # The WHERE also keeps SQLite from parsing ON CONFLICT as a join constraint
+            ).where(true()),
+        ).on_conflict_do_nothing(index_elements=["employee_id", "year", "month"])
+    ).rowcount
+
+    db.execute(
+        update(Points)
+        .where(func.coalesce(Points.month_points, 0) != later_points)
+        .values(month_points=later_points),
+        execution_options={"synchronize_session": False},
+    )
+    db.execute(
+        delete(Ledger).where(Ledger.year * 12 + Ledger.month <= month_key),
+        execution_options={"synchronize_session": False},
+    )
+
+    finished = select(Progress.id).where(
+        Progress.challenge_id == Challenge.challenge_id,
+        Progress.completed == True,
+    ).exists()
+    statuses = db.execute(
+        update(Challenge)
+        .where(Challenge.year == year, Challenge.month == month, Challenge.status == "active")
+        .values(status=case((finished, "completed"), else_="expired"))
+        .returning(Challenge.status),
+        execution_options={"synchronize_session": False},
+    ).scalars().all()
+
+    summary = {
+        "year": year,
+        "month": month,
+        "employees_archived": archived,
+        "challenges_completed": len(completed),
+        "points_awarded": points_awarded,
+        "challenges_closed": len(statuses),
+        "challenges_expired": statuses.count("expired"),
+    }
+    db.execute(
+        update(models.MonthClose)
+        .where(models.MonthClose.year == year, models.MonthClose.month == month)
+        .values(
+            finished_at=datetime.utcnow(),
+            employees_archived=archived,
+            challenges_completed=len(completed),
+            points_awarded=points_awarded,
+        ),
+        execution_options={"synchronize_session": False},
+    )
+    logger.info(f"Closed {year}-{month:02d}: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Close a gamification month")
+    parser.add_argument("--year", type=int, default=None, help="Default: the month after the last closed one")
+    parser.add_argument("--month", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.year is None or args.month is None:
+            args.year, args.month = next_month_to_close(db)
+        try:
+            summary = close_month(db, args.year, args.month)
+        except ValueError as e:
+            parser.error(f"cannot close {args.year}-{args.month:02d}: {e}")
+        db.commit()
+        if summary is None:
+            print(f"{args.year}-{args.month:02d} is already closed")
+        else:
+            print(
+                f"Closed {args.year}-{args.month:02d}: {summary['employees_archived']} employees archived, "
+                f"{summary['challenges_completed']} challenge completions ({summary['points_awarded']} points), "
+                f"{summary['challenges_expired']}/{summary['challenges_closed']} challenges expired"
+            )
+    finally:
+        db.close()
@@ -0,0 +1,498 @@
+"""
+Notification fan-out - broadcast to an audience and keep unread counts
+
+A broadcast never loops over employees in Python: each chunk of the audience
+(keyset over employee_id) is one INSERT ... SELECT into notifications plus one
+upsert that adds 1 to every recipient's notification_counters row, all in the
+caller's transaction. Marking notifications read is a single UPDATE whose row
+count is subtracted from the counter, so the unread badge is a primary-key
+lookup instead of a COUNT over the notifications table.
+
+The feed is keyset-paginated on (created_at, id), newest first. Clients
+stay current over server-sent events instead of polling: committed inserts
+wake the subscribers of an in-process hub, and each stream then re-reads a
+short overlap window before its newest event and sends the ids it has not
+sent yet. Streams on other workers are not woken and catch up at the next
+heartbeat instead.
+
+Usage:
+    python -m services.notification_service        # rebuild every unread counter
+"""
+
+import asyncio
+import base64
+import binascii
+import json
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import (
+    JSON, Boolean, DateTime, String, Text, case, func, insert, literal, select, tuple_, update,
+)
+from sqlalchemy.orm import Session
+
+import models
+from cache import CommitHooks
+from database import dialect_insert
+
+E = models.Employee
+N = models.Notification
+UnreadCounter = models.NotificationCounter
+
+AUDIENCES = ("all", "department", "role")
+NOTIFICATION_CHUNK_SIZE = int(os.getenv("NOTIFICATION_CHUNK_SIZE", "5000"))
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = float(os.getenv("NOTIFICATION_STREAM_HEARTBEAT_SECONDS", "20"))
+# How far back each stream read looks for rows that committed after newer-stamped ones
+NOTIFICATION_STREAM_OVERLAP_SECONDS = float(os.getenv("NOTIFICATION_STREAM_OVERLAP_SECONDS", "60"))
+
+# Most rows a single stream event batch or feed page carries
+MAX_FEED_PAGE = 100
+
+
+def audience_filter(audience: str, target=None) -> list:
+    """
+    WHERE clauses on employees selecting an audience of active employees.
+
+    Raises:
+        ValueError: On an unknown audience or a missing department/role target
+    """
+    if audience not in AUDIENCES:
+        raise ValueError(f"audience must be one of {', '.join(AUDIENCES)}")
+    clauses = [E.status == "active"]
+    if audience == "department":
+        if target is None:
+            raise ValueError("department audience needs a department_id target")
+        clauses.append(E.department_id == int(target))
+    elif audience == "role":
+        if not target:
+            raise ValueError("role audience needs a role target")
+        clauses.append(E.role == str(target))
+    return clauses
+
+
+def _add_unread(db: Session, recipients: list):
+    """+1 unread for each employee matching the `recipients` WHERE clauses"""
+    now = datetime.utcnow()
+    stmt = dialect_insert(db)(UnreadCounter).from_select(
+        ["employee_id", "unread_count", "updated_at"],
+        # The WHERE also keeps SQLite from parsing ON CONFLICT as a join constraint
+        select(E.employee_id, literal(1), literal(now, DateTime)).where(*recipients),
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["employee_id"],
+        set_={"unread_count": UnreadCounter.unread_count + 1, "updated_at": now},
+    ))
+
+
+def broadcast(
+    db: Session,
+    audience: str,
+    type: str,
+    title: str,
+    message: Optional[str] = None,
+    data: Optional[dict] = None,
+    target=None,
+    chunk_size: int = NOTIFICATION_CHUNK_SIZE,
+) -> int:
+    """
+    Create one notification per employee in the audience. Does not commit.
+
+    `target` is the department_id or role for those audiences. Returns the
+    number of notifications created.
+    """
+    scope = audience_filter(audience, target)
+    now = datetime.utcnow()
+    columns = {
+        "type": literal(type, String),
+        "title": literal(title, String),
+        "message": literal(message, Text),
+        "is_read": literal(False, Boolean),
+        "created_at": literal(now, DateTime),
+    }
+    if data is not None:
+        columns["data_json"] = literal(data, JSON)
+
+    created = 0
+    after = None
+    while True:
+        # Chunk = the next chunk_size audience members by employee_id
+        recipients = list(scope)
+        if after is not None:
+            recipients.append(E.employee_id > after)
+        last = db.scalar(
+            select(E.employee_id).where(*recipients)
+            .order_by(E.employee_id).offset(chunk_size - 1).limit(1)
+        )
+        if last is not None:
+            recipients.append(E.employee_id <= last)
+
+        result = db.execute(insert(N).from_select(
+            ["employee_id", *columns],
+            select(E.employee_id, *columns.values()).where(*recipients),
+        ))
+        if result.rowcount:
+            _add_unread(db, recipients)
+            created += result.rowcount
+        if last is None:
+            return created
+        after = last
+
+
+def notify(
+    db: Session,
+    employee_id: int,
+    type: str,
+    title: str,
+    message: Optional[str] = None,
+    data: Optional[dict] = None,
+) -> models.Notification:
+    """Create one notification and bump its recipient's unread count. Does not commit."""
+    notification = N(
+        employee_id=employee_id,
+        type=type,
+        title=title,
+        message=message,
+        data_json=data,
+        is_read=False,
+        created_at=datetime.utcnow(),
+    )
+    db.add(notification)
+    db.flush()
+    _add_unread(db, [E.employee_id == employee_id])
+    return notification
+
+
+def notify_many(db: Session, notifications: List[dict]) -> int:
+    """
+    Create notifications (employee_id, type, title, optional message and data)
+    with one multi-row INSERT and one counter upsert. Does not commit.
+    """
+    if not notifications:
+        return 0
+    now = datetime.utcnow()
+    per_employee = Counter(n["employee_id"] for n in notifications)
+    # Only these recipients' streams need waking, not every stream
+    _publish_hooks.record(db, per_employee)
+    db.execute(insert(N).values([
+        {
+            "employee_id": n["employee_id"],
+            "type": n["type"],
+            "title": n["title"],
+            "message": n.get("message"),
+            "data_json": n.get("data"),
+            "is_read": False,
+            "created_at": now,
+        }
+        for n in notifications
+    ]), execution_options={_RECIPIENTS_KNOWN: True})
+
+    stmt = dialect_insert(db)(UnreadCounter).values([
+        {"employee_id": employee_id, "unread_count": count, "updated_at": now}
+        for employee_id, count in sorted(per_employee.items())
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["employee_id"],
+        set_={"unread_count": UnreadCounter.unread_count + stmt.excluded.unread_count, "updated_at": now},
+    ))
+    return len(notifications)
+
+
+def mark_read(db: Session, employee_id: int, ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Mark an employee's notifications read - all unread ones, or only `ids`.
+
+    One UPDATE for the notifications and one for the counter; rows that were
+    already read are not counted twice. Does not commit. Returns the number
+    of notifications that changed.
+    """
+    stmt = (
+        update(N)
+        .where(N.employee_id == employee_id, N.is_read == False)
+        .values(is_read=True, read_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return 0
+        stmt = stmt.where(N.id.in_(ids))
+
+    marked = db.execute(stmt).rowcount
+    if marked:
+        db.execute(
+            update(UnreadCounter)
+            .where(UnreadCounter.employee_id == employee_id)
+            .values(
+                unread_count=case((UnreadCounter.unread_count > marked, UnreadCounter.unread_count - marked), else_=0),
+                updated_at=datetime.utcnow(),
+            )
+        )
+    return marked
+
+
+def unread_count(db: Session, employee_id: int) -> int:
+    """Unread notifications for an employee, from the counter"""
+    return db.scalar(select(UnreadCounter.unread_count).where(UnreadCounter.employee_id == employee_id)) or 0
+
+
+def rebuild_counters(db: Session) -> int:
+    """Recount every employee's unread notifications from the table. Does not commit."""
+    db.execute(UnreadCounter.__table__.delete())
+    result = db.execute(insert(UnreadCounter).from_select(
+        ["employee_id", "unread_count", "updated_at"],
+        select(N.employee_id, func.count(), literal(datetime.utcnow(), DateTime))
+        .where(N.is_read == False)
+        .group_by(N.employee_id),
+    ))
+    return result.rowcount
+
+
+# ============================================
+# FEED
+# ============================================
+
+FeedKey = Tuple[datetime, int]
+
+
+def encode_cursor(created_at: datetime, notification_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), notification_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> FeedKey:
+    """Return the (created_at, id) a cursor points at; ValueError if malformed"""
+    try:
+        created_at, notification_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        created_at = datetime.fromisoformat(created_at)
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(notification_id, int):
+        raise ValueError("Invalid cursor")
+    return created_at, notification_id
+
+
+def serialize_notification(n: models.Notification) -> dict:
+    return {
+        "id": n.id,
+        "type": n.type,
+        "title": n.title,
+        "message": n.message,
+        "data": n.data_json,
+        "is_read": n.is_read,
+        "created_at": n.created_at,
+        "read_at": n.read_at,
+    }
+
+
+def notification_feed(
+    db: Session,
+    employee_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    unread_only: bool = False,
+) -> dict:
+    """
+    One page of an employee's notifications, newest first.
+
+    Pages continue after `cursor` along the (employee_id, created_at, id)
+    index; `next_cursor` is None on the last page. Raises ValueError for a
+    malformed cursor.
+    """
+    limit = min(max(limit, 1), MAX_FEED_PAGE)
+    query = select(N).where(N.employee_id == employee_id)
+    if unread_only:
+        query = query.where(N.is_read == False)
+    if cursor:
+        query = query.where(tuple_(N.created_at, N.id) < decode_cursor(cursor))
+
+    rows = list(db.scalars(query.order_by(N.created_at.desc(), N.id.desc()).limit(limit + 1)))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "unread": unread_count(db, employee_id),
+        "notifications": [serialize_notification(n) for n in rows],
+        "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+    }
+
+
+def notifications_after(db: Session, employee_id: int, after: Optional[FeedKey]) -> List[models.Notification]:
+    """Notifications newer than `after`, oldest first (the latest one if `after` is None)"""
+    query = select(N).where(N.employee_id == employee_id)
+    if after is None:
+        return list(db.scalars(query.order_by(N.created_at.desc(), N.id.desc()).limit(1)))
+    return list(db.scalars(
+        query.where(tuple_(N.created_at, N.id) > after)
+        .order_by(N.created_at, N.id)
+        .limit(MAX_FEED_PAGE)
+    ))
+
+
+# ============================================
+# PUB/SUB AND SERVER-SENT EVENTS
+# ============================================
+
+class NotificationHub:
+    """In-process wake-ups for notification streams, safe to publish from any thread"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, employee_id: int) -> asyncio.Event:
+        """Register the calling stream (must run on its event loop)"""
+        wakeup = asyncio.Event()
+        with self._lock:
+            self._subscribers.setdefault(employee_id, set()).add((asyncio.get_running_loop(), wakeup))
+        return wakeup
+
+    def unsubscribe(self, employee_id: int, wakeup: asyncio.Event):
+        with self._lock:
+            streams = self._subscribers.get(employee_id, set())
+            streams = {entry for entry in streams if entry[1] is not wakeup}
+            if streams:
+                self._subscribers[employee_id] = streams
+            else:
+                self._subscribers.pop(employee_id, None)
+
+    def publish(self, employee_ids: Optional[Iterable[int]] = None):
+        """Wake the streams of `employee_ids`, or every stream if None"""
+        with self._lock:
+            if employee_ids is None:
+                targets = [entry for streams in self._subscribers.values() for entry in streams]
+            else:
+                targets = [entry for eid in set(employee_ids) for entry in self._subscribers.get(eid, ())]
+        for loop, wakeup in targets:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(wakeup.set)
+
+    @property
+    def connections(self) -> int:
+        with self._lock:
+            return sum(len(streams) for streams in self._subscribers.values())
+
+
+notification_hub = NotificationHub()
+
+
+def _sse(event_name: str, data, event_id: Optional[str] = None) -> str:
+    payload = json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":"))
+    lines = [f"id: {event_id}"] if event_id else []
+    lines += [f"event: {event_name}", f"data: {payload}"]
+    return "\n".join(lines) + "\n\n"
+
+
+async def notification_stream(
+    employee_id: int,
+    last_event_id: Optional[str] = None,
+    heartbeat: float = NOTIFICATION_STREAM_HEARTBEAT_SECONDS,
+    overlap: float = NOTIFICATION_STREAM_OVERLAP_SECONDS,
+) -> AsyncIterator[str]:
+    """
+    Server-sent events for one employee: a `notification` event per new row
+    (id = feed cursor of the newest row sent), then an `unread` event with
+    the count.
+
+    created_at is stamped before commit, so a row can become visible after
+    a newer-stamped one was already sent. Each read therefore starts
+    `overlap` seconds before the newest row sent and skips ids it already
+    delivered; only a transaction open longer than that can be missed.
+    A reconnecting client's Last-Event-ID resumes from that window too, so
+    rows just before it may be sent again (clients dedupe on id).
+
+    A session is opened per wake-up and closed before anything is sent, so
+    idle or slow clients hold no connection. Stops when the response is
+    cancelled on disconnect.
+    """
+    from database import AsyncSessionLocal
+
+    window = timedelta(seconds=overlap)
+    # Delivered ids still inside the overlap window -> created_at
+    sent: Dict[int, datetime] = {}
+
+    async def read_new(db) -> List[models.Notification]:
+        """Rows from the overlap window on that were not sent yet, oldest first"""
+        new = []
+        key = (after[0] - window, 0) if after is not None else (datetime.min, 0)
+        while True:
+            rows = await db.run_sync(notifications_after, employee_id, key)
+            for n in rows:
+                key = (n.created_at, n.id)
+                if n.id not in sent:
+                    sent[n.id] = n.created_at
+                    new.append(n)
+            if len(rows) < MAX_FEED_PAGE:
+                return new
+
+    wakeup = notification_hub.subscribe(employee_id)
+    try:
+        after = None
+        if last_event_id:
+            try:
+                after = decode_cursor(last_event_id)
+            except ValueError:
+                pass
+        if after is None:
+            async with AsyncSessionLocal() as db:
+                latest = await db.run_sync(notifications_after, employee_id, None)
+                if latest:
+                    after = (latest[0].created_at, latest[0].id)
+                    # A new stream starts at the latest row; mark the window as sent
+                    await read_new(db)
+
+        yield f"retry: {int(heartbeat * 1000)}\n\n"
+        while True:
+            events = []
+            async with AsyncSessionLocal() as db:
+                # Cleared before reading so a commit during the read wakes us again
+                wakeup.clear()
+                for n in await read_new(db):
+                    if after is None or (n.created_at, n.id) > after:
+                        after = (n.created_at, n.id)
+                    events.append(_sse("notification", serialize_notification(n), encode_cursor(*after)))
+                if events:
+                    events.append(_sse("unread", {"unread": await db.run_sync(unread_count, employee_id)}))
+            if after is not None:
+                horizon = after[0] - window
+                for notification_id in [i for i, created_at in sent.items() if created_at < horizon]:
+                    del sent[notification_id]
+            for message in events:
+                yield message
+
+            try:
+                await asyncio.wait_for(wakeup.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+    finally:
+        notification_hub.unsubscribe(employee_id, wakeup)
+
+
+# ============================================
+# PUBLISH HOOKS
+# ============================================
+
+# Execution option on bulk INSERTs whose recipients were recorded with _publish_hooks
+_RECIPIENTS_KNOWN = "notification_recipients_known"
+
+# Committed notifications wake their recipients' streams; a bulk INSERT
+# (broadcast) wakes every stream and each finds its own rows
+_publish_hooks = CommitHooks("notifications_published", lambda ids: notification_hub.publish(ids))
+_publish_hooks.watch([N], events=("after_insert",), items=lambda n: [n.employee_id])
+_publish_hooks.watch_bulk(
+    [N], when=lambda state: state.is_insert and not state.execution_options.get(_RECIPIENTS_KNOWN)
+)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rebuilt = rebuild_counters(db)
+        db.commit()
+        print(f"Rebuilt unread counters for {rebuilt} employees")
+    finally:
+        db.close()
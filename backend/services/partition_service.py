@@ -0,0 +1,268 @@
+"""
+Partition maintenance for the monthly-partitioned log tables
+
+tool_access_logs and audit_logs are range-partitioned by month on PostgreSQL
+(database/schema.sql). This module keeps partitions created ahead of time and
+applies retention by detaching whole months, which either drops them or moves
+them to an archive schema - no row-by-row DELETE, no index bloat, no vacuum.
+Rows that landed in a table's DEFAULT partition (written before their month's
+partition existed) are deleted, or moved to the archive schema, by timestamp.
+On other databases retention falls back to a DELETE by timestamp.
+
+PartitionMaintainer runs both on a schedule inside the API process, so a
+long-running server never reaches a month without a partition.
+
+Usage:
+    python -m services.partition_service                     # create upcoming partitions
+    python -m services.partition_service --retention         # also apply retention
+    python -m services.partition_service --retention --archive-schema log_archive
+"""
+
+import argparse
+import logging
+import os
+import re
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, text
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_MODELS = (models.ToolAccessLog, models.AuditLog)
+
+# Months kept online per table; audit history is kept longer for compliance
+RETENTION_MONTHS: Dict[str, int] = {
+    "tool_access_logs": int(os.getenv("TOOL_ACCESS_LOG_RETENTION_MONTHS", "13")),
+    "audit_logs": int(os.getenv("AUDIT_LOG_RETENTION_MONTHS", "84")),
+}
+
+MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("PARTITION_MAINTENANCE_SECONDS", "3600"))
+# Background retention; the CLI applies it only with --retention
+RETENTION_ENABLED = os.getenv("LOG_RETENTION_ENABLED", "true").lower() in ("1", "true", "yes")
+ARCHIVE_SCHEMA = os.getenv("LOG_ARCHIVE_SCHEMA") or None
+
+# pg advisory lock key so only one worker maintains partitions at a time
+_MAINTENANCE_LOCK_KEY = 7_160_014
+
+
+def add_months(day: date, months: int) -> date:
+    """First day of the month `months` after the month containing `day`"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _is_partitioned(db: Session, table: str) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(db.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"),
+        {"table": table},
+    ).scalar())
+
+
+def monthly_partitions(db: Session, table: str) -> List[Tuple[date, str]]:
+    """Return (month start, partition name) for each monthly partition, oldest first"""
+    pattern = re.compile(rf"^{re.escape(table)}_y(\d{{4}})m(\d{{2}})$")
+    names = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {"table": table}).scalars()
+
+    partitions = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def ensure_partitions(
+    db: Session,
+    months_ahead: int = MONTHS_AHEAD,
+    as_of: Optional[date] = None,
+) -> List[str]:
+    """
+    Create partitions for the current month and `months_ahead` after it.
+
+    Existing partitions are left alone. Does not commit. Returns the names of
+    the partitions that now cover the window. No-op unless the table is
+    partitioned (PostgreSQL with database/schema.sql applied).
+    """
+    as_of = as_of or datetime.utcnow().date()
+    ensured = []
+    for model in PARTITIONED_MODELS:
+        table = model.__tablename__
+        if not _is_partitioned(db, table):
+            continue
+        for offset in range(months_ahead + 1):
+            ensured.append(db.execute(
+                text("SELECT create_monthly_partition(:table, :month_start)"),
+                {"table": table, "month_start": add_months(as_of, offset)},
+            ).scalar())
+    return ensured
+
+
+def apply_retention(
+    db: Session,
+    archive_schema: Optional[str] = None,
+    as_of: Optional[date] = None,
+    dry_run: bool = False,
+) -> Dict[str, List[str]]:
+    """
+    Remove months older than each table's retention window.
+
+    Partitioned tables detach whole monthly partitions, then drop them or,
+    with `archive_schema`, move them there for offline export. Other
+    databases delete expired rows. Does not commit. Returns the partitions
+    (or a row-count note) affected per table.
+    """
+    if archive_schema and not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", archive_schema):
+        raise ValueError(f"Invalid archive schema name: {archive_schema!r}")
+    as_of = as_of or datetime.utcnow().date()
+    affected: Dict[str, List[str]] = {}
+
+    if archive_schema and not dry_run:
+        db.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"'))
+
+    for model in PARTITIONED_MODELS:
+        table = model.__tablename__
+        cutoff = add_months(as_of, -RETENTION_MONTHS[table])
+
+        if not _is_partitioned(db, table):
+            if dry_run:
+                affected[table] = [f"rows before {cutoff}"]
+                continue
+            result = db.execute(
+                delete(model)
+                .where(model.in_period(end=datetime.combine(cutoff, datetime.min.time())))
+                .execution_options(synchronize_session=False)
+            )
+            affected[table] = [f"{result.rowcount} rows before {cutoff}"]
+            continue
+
+        expired = [name for month, name in monthly_partitions(db, table) if month < cutoff]
+        affected[table] = list(expired)
+        default = f"{table}_default"
+        has_default = db.execute(text("SELECT to_regclass(:name)"), {"name": default}).scalar() is not None
+        if has_default:
+            affected[table].append(f"{default} rows before {cutoff}")
+        if dry_run:
+            continue
+        if has_default:
+            _retire_default_rows(db, default, cutoff, archive_schema)
+        for name in expired:
+            db.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+            if archive_schema:
+                db.execute(text(f'ALTER TABLE "{name}" SET SCHEMA "{archive_schema}"'))
+            else:
+                db.execute(text(f'DROP TABLE "{name}"'))
+        if expired:
+            logger.info(f"{table}: retired {len(expired)} partitions before {cutoff}")
+
+    return affected
+
+
+def _retire_default_rows(db: Session, default: str, cutoff: date, archive_schema: Optional[str]):
+    """Delete (or move to the archive schema) DEFAULT-partition rows before cutoff"""
+    expired = {"cutoff": datetime.combine(cutoff, datetime.min.time())}
+    if archive_schema:
+        archive = f"{default}_expired"
+        db.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{archive_schema}"."{archive}" (LIKE "{default}" INCLUDING DEFAULTS)'
+        ))
+        result = db.execute(text(
+            f'WITH moved AS (DELETE FROM "{default}" WHERE "timestamp" < :cutoff RETURNING *) '
+            f'INSERT INTO "{archive_schema}"."{archive}" SELECT * FROM moved'
+        ), expired)
+    else:
+        result = db.execute(text(f'DELETE FROM "{default}" WHERE "timestamp" < :cutoff'), expired)
+    if result.rowcount:
+        logger.info(f"{default}: retired {result.rowcount} rows before {cutoff}")
+
+
+def maintain_partitions(
+    db: Session,
+    retention: bool = RETENTION_ENABLED,
+    archive_schema: Optional[str] = ARCHIVE_SCHEMA,
+) -> bool:
+    """
+    Create upcoming partitions and, with `retention`, retire expired months.
+    Commits.
+
+    Returns False if another worker holds the maintenance lock, True otherwise.
+    """
+    if db.get_bind().dialect.name == "postgresql" and not db.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _MAINTENANCE_LOCK_KEY}
+    ).scalar():
+        return False
+    ensure_partitions(db)
+    if retention:
+        apply_retention(db, archive_schema)
+    db.commit()
+    return True
+
+
+class PartitionMaintainer:
+    """Daemon thread that runs maintain_partitions() every `interval` seconds"""
+
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="partition-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self):
+        from database import SessionLocal
+
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                maintain_partitions(db)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Log partition maintenance failed: {e}")
+            finally:
+                db.close()
+
+
+partition_maintainer = PartitionMaintainer()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain monthly log partitions")
+    parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+    parser.add_argument("--retention", action="store_true", help="Also retire expired months")
+    parser.add_argument("--archive-schema", default=None, help="Move expired partitions here instead of dropping")
+    parser.add_argument("--dry-run", action="store_true", help="Report expired months without changing anything")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        created = ensure_partitions(db, args.months_ahead) if not args.dry_run else []
+        print(f"Partitions in place: {len(created)}")
+        if args.retention:
+            for table, names in apply_retention(db, args.archive_schema, dry_run=args.dry_run).items():
+                print(f"{table}: {', '.join(names) if names else 'nothing expired'}")
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,408 @@
+"""
+Rank index - live leaderboard ranks maintained incrementally in memory
+
+Every population (all employees, and each department) keeps its members in
+leaderboard order in a bucketed sorted list. An employee's rank is one plus
+the number of people with strictly more points, found by bisection; moving
+an employee when their points change is a delete and an insert into one
+small bucket. Memory is proportional to the number of employees, not to the
+point values. Ties share a rank ("1224" ranking). Leaderboard pages and an
+employee's neighbours are read from the same order, so ranks and lists
+always agree.
+
+The index is built from user_points with one query, then updated from the
+point totals that committed sessions wrote. Bulk statements whose new totals
+are unknown (load_testdata.py, month close) trigger a rebuild instead, and
+the whole index is rebuilt every RANK_RELOAD_SECONDS as a safety net for
+writes made by other processes. UserPoints.rank is written back from the
+index in the background, changed rows only.
+
+Writers that know the new totals can keep the index incremental:
+
+    rows = db.execute(upsert.returning(UserPoints.employee_id, UserPoints.total_points),
+                      execution_options={RANK_TRACKED: True}).all()
+    record_points(db, rows)
+
+Usage:
+    python -m services.rank_service              # rebuild and persist ranks once
+"""
+
+import asyncio
+import bisect
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import models
+from cache import CommitHooks
+
+logger = logging.getLogger(__name__)
+
+RANK_RELOAD_SECONDS = float(os.getenv("RANK_RELOAD_SECONDS", "300"))
+RANK_PERSIST_SECONDS = float(os.getenv("RANK_PERSIST_SECONDS", "60"))
+
+# Execution option marking a bulk user_points write whose totals were recorded
+RANK_TRACKED = "rank_tracked"
+
+# pg advisory lock key so only one worker persists ranks at a time
+_PERSIST_LOCK_KEY = 7_160_024
+
+P = models.UserPoints
+E = models.Employee
+
+
+# ============================================
+# ORDER STATISTICS
+# ============================================
+
+class PointsRanking:
+    """
+    Members of one population in leaderboard order (most points first, then
+    employee_id), kept as a list of sorted buckets of at most 2 * load keys.
+
+    Memory is O(members) whatever the point values; moving a member costs
+    O(log N + load) and finding a position O(log N + N / load).
+    """
+
+    def __init__(self, members: Iterable[Tuple[int, int]] = (), load: int = 1000):
+        self.load = load
+        keys = sorted((-points, employee_id) for employee_id, points in members)
+        self._buckets: List[List[Tuple[int, int]]] = [keys[i:i + load] for i in range(0, len(keys), load)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self.count = len(keys)
+
+    def add(self, employee_id: int, points: int):
+        key = (-points, employee_id)
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self.count += 1
+            return
+        i = min(bisect.bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[i]
+        bisect.insort(bucket, key)
+        self._maxes[i] = bucket[-1]
+        if len(bucket) > 2 * self.load:
+            self._buckets[i:i + 1] = [bucket[:self.load], bucket[self.load:]]
+            self._maxes[i:i + 1] = [bucket[self.load - 1], bucket[-1]]
+        self.count += 1
+
+    def remove(self, employee_id: int, points: int):
+        key = (-points, employee_id)
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._buckets):
+            return
+        bucket = self._buckets[i]
+        j = bisect.bisect_left(bucket, key)
+        if j == len(bucket) or bucket[j] != key:
+            return
+        del bucket[j]
+        if bucket:
+            self._maxes[i] = bucket[-1]
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
+        self.count -= 1
+
+    def _position(self, key: Tuple[int, ...]) -> int:
+        """Number of members ordered before `key`"""
+        i = bisect.bisect_left(self._maxes, key)
+        before = sum(len(bucket) for bucket in self._buckets[:i])
+        if i < len(self._buckets):
+            before += bisect.bisect_left(self._buckets[i], key)
+        return before
+
+    def rank(self, points: int) -> int:
+        """1 + number of members with more than `points`"""
+        return 1 + self._position((-points,))
+
+    def position(self, employee_id: int, points: int) -> int:
+        """0-based place of a member in leaderboard order"""
+        return self._position((-points, employee_id))
+
+    def ranked(self, start: int = 0, stop: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        """(rank, employee_id, points) for places start..stop-1"""
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return []
+        i, offset = 0, start
+        while offset >= len(self._buckets[i]):
+            offset -= len(self._buckets[i])
+            i += 1
+        keys: List[Tuple[int, int]] = []
+        while len(keys) < stop - start:
+            keys.extend(self._buckets[i][offset:offset + stop - start - len(keys)])
+            i, offset = i + 1, 0
+
+        # Ties share a rank ("1224")
+        rows = []
+        rank, previous = self.rank(-keys[0][0]), -keys[0][0]
+        for place, (negated, employee_id) in enumerate(keys, start + 1):
+            if -negated != previous:
+                rank, previous = place, -negated
+            rows.append((rank, employee_id, -negated))
+        return rows
+
+
+# ============================================
+# RANK INDEX
+# ============================================
+
+class RankIndex:
+    """Global and per-department rankings of every employee with points"""
+
+    def __init__(self, max_age: float = RANK_RELOAD_SECONDS):
+        self.max_age = max_age
+        self._points: Dict[int, int] = {}
+        self._departments: Dict[int, Optional[int]] = {}
+        self._global = PointsRanking()
+        self._by_department: Dict[Optional[int], PointsRanking] = {}
+        self._built_at = 0.0
+        self._stale = True
+        self._changes = 0
+        self._lock = threading.RLock()
+        self._async_lock: Optional[asyncio.Lock] = None
+
+    def invalidate(self):
+        """Mark the index stale; the next read rebuilds it"""
+        self._changes += 1
+        self._stale = True
+
+    def is_fresh(self) -> bool:
+        return not self._stale and time.monotonic() - self._built_at < self.max_age
+
+    @staticmethod
+    def _query():
+        return select(P.employee_id, P.total_points, E.department_id).join(
+            E, E.employee_id == P.employee_id
+        )
+
+    def _build(self, rows: Iterable[Tuple[int, Optional[int], Optional[int]]], changes: int):
+        points: Dict[int, int] = {}
+        departments: Dict[int, Optional[int]] = {}
+        members: Dict[Optional[int], List[Tuple[int, int]]] = {}
+        for employee_id, total_points, department_id in rows:
+            total = total_points or 0
+            points[employee_id] = total
+            departments[employee_id] = department_id
+            members.setdefault(department_id, []).append((employee_id, total))
+
+        with self._lock:
+            self._points = points
+            self._departments = departments
+            self._global = PointsRanking(points.items())
+            self._by_department = {d: PointsRanking(m) for d, m in members.items()}
+            self._built_at = time.monotonic()
+            # Updates committed while the rows were read are not in them
+            self._stale = self._changes != changes
+
+    def ensure_loaded(self, db: Session) -> "RankIndex":
+        """Rebuild from the database if stale or older than max_age"""
+        if not self.is_fresh():
+            changes = self._changes
+            self._build(db.execute(self._query()).all(), changes)
+        return self
+
+    async def ensure_loaded_async(self, db: AsyncSession) -> "RankIndex":
+        """Async variant of ensure_loaded; one rebuild per change across requests"""
+        if self.is_fresh():
+            return self
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if not self.is_fresh():
+                changes = self._changes
+                self._build((await db.execute(self._query())).all(), changes)
+        return self
+
+    def update(self, employee_id: int, total_points: int):
+        """Move an employee to a new point total"""
+        total = total_points or 0
+        with self._lock:
+            self._changes += 1
+            if employee_id not in self._departments:
+                # Department unknown until the next rebuild; ranked globally meanwhile
+                self._stale = True
+            old = self._points.get(employee_id)
+            if old == total:
+                return
+            department = self._by_department.get(self._departments.get(employee_id))
+            if old is not None:
+                self._global.remove(employee_id, old)
+                if department is not None:
+                    department.remove(employee_id, old)
+            self._global.add(employee_id, total)
+            if department is not None:
+                department.add(employee_id, total)
+            self._points[employee_id] = total
+
+    def rank(self, employee_id: int) -> Optional[int]:
+        """Company-wide rank, or None if the employee has no points row"""
+        with self._lock:
+            points = self._points.get(employee_id)
+            return self._global.rank(points) if points is not None else None
+
+    def department_rank(self, employee_id: int) -> Optional[int]:
+        """Rank within the employee's department"""
+        with self._lock:
+            points = self._points.get(employee_id)
+            department = self._by_department.get(self._departments.get(employee_id))
+            if points is None or department is None:
+                return None
+            return department.rank(points)
+
+    def department_size(self, employee_id: int) -> int:
+        with self._lock:
+            department = self._by_department.get(self._departments.get(employee_id))
+            return department.count if department is not None else 0
+
+    def __len__(self) -> int:
+        return self._global.count
+
+    def page(self, skip: int = 0, limit: int = 100) -> List[Tuple[int, int, int]]:
+        """(rank, employee_id, points) for a slice of the company-wide leaderboard"""
+        with self._lock:
+            return self._global.ranked(skip, skip + limit)
+
+    def around(self, employee_id: int, radius: int = 5) -> List[Tuple[int, int, int]]:
+        """An employee's leaderboard row plus `radius` neighbours on each side"""
+        with self._lock:
+            points = self._points.get(employee_id)
+            if points is None:
+                return []
+            position = self._global.position(employee_id, points)
+            return self._global.ranked(max(0, position - radius), position + radius + 1)
+
+    def ranks(self) -> Dict[int, int]:
+        """Company-wide rank of every employee"""
+        with self._lock:
+            return {employee_id: rank for rank, employee_id, _ in self._global.ranked()}
+
+
+rank_index = RankIndex()
+
+
+# ============================================
+# PERSISTENCE
+# ============================================
+
+def persist_ranks(db: Session, index: RankIndex = rank_index) -> int:
+    """
+    Write index ranks to UserPoints.rank where they changed.
+
+    Returns the number of rows updated (0 if another worker holds the lock).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _PERSIST_LOCK_KEY}).scalar():
+            return 0
+
+    index.ensure_loaded(db)
+    ranks = index.ranks()
+    stored = dict(db.execute(select(P.employee_id, P.rank)).all())
+    changed = [
+        {"b_employee_id": employee_id, "b_rank": rank}
+        for employee_id, rank in ranks.items()
+        if employee_id in stored and stored[employee_id] != rank
+    ]
+    if changed:
+        # Core executemany: bypasses the ORM hooks, rank is not an input to the index
+        table = P.__table__
+        db.connection().execute(
+            table.update()
+            .where(table.c.employee_id == bindparam("b_employee_id"))
+            .values(rank=bindparam("b_rank")),
+            changed,
+        )
+    db.commit()
+    return len(changed)
+
+
+class RankPersister:
+    """Daemon thread that persists ranks every `interval` seconds"""
+
+    def __init__(self, interval: float = RANK_PERSIST_SECONDS):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rank-persist", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self):
+        from database import SessionLocal
+
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                persist_ranks(db)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Rank persistence failed: {e}")
+            finally:
+                db.close()
+
+
+rank_persister = RankPersister()
+
+
+# ============================================
+# INDEX MAINTENANCE HOOKS
+# ============================================
+
+def _apply_points(updates: Optional[list]):
+    """Apply committed (employee_id, total_points) pairs, or rebuild if None"""
+    if updates is None:
+        rank_index.invalidate()
+        return
+    for employee_id, total_points in updates:
+        rank_index.update(employee_id, total_points)
+
+
+_hooks = CommitHooks("rank_updates", _apply_points)
+
+
+def record_points(db: Session, rows: Iterable[Tuple[int, int]]):
+    """Queue (employee_id, total_points) pairs to apply to the index on commit"""
+    _hooks.record(db, rows)
+
+
+def _department_changed(employee) -> Optional[list]:
+    # A department move reloads the index; other employee updates do not touch it
+    return None if inspect(employee).attrs.department_id.history.has_changes() else []
+
+
+_hooks.watch([P], events=("after_insert", "after_update"), items=lambda p: [(p.employee_id, p.total_points)])
+_hooks.watch([P, E], events=("after_delete",))
+_hooks.watch([E], events=("after_update",), items=_department_changed)
+# Bulk writes rebuild the index unless their totals were recorded with record_points()
+_hooks.watch_bulk(
+    [P, E],
+    when=lambda state: not (
+        (state.bind_mapper.class_ is P and state.execution_options.get(RANK_TRACKED))
+        or (state.bind_mapper.class_ is E and state.is_insert)
+    ),
+)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Updated {persist_ranks(db)} ranks for {len(rank_index)} employees")
+    finally:
+        db.close()
@@ -0,0 +1,230 @@
+"""
+Reporting views - materialized scorecard, leaderboard and user stats
+
+The reporting views are defined here once and created on startup when
+missing: as materialized views with unique indexes on PostgreSQL (matching
+database/schema.sql), and as plain views elsewhere. A background refresher
+runs REFRESH MATERIALIZED VIEW CONCURRENTLY on a schedule, so readers never
+block and reporting queries never touch the raw log tables.
+
+Usage:
+    python -m services.reporting_service            # create missing views and refresh
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import Integer, and_, case, cast, extract, func, select, text
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL_SECONDS = float(os.getenv("REPORTING_REFRESH_SECONDS", "300"))
+
+# pg advisory lock key so only one worker refreshes at a time
+_REFRESH_LOCK_KEY = 7_160_016
+
+E = models.Employee
+D = models.Department
+M = models.AIAdoptionMetrics
+
+
+# ============================================
+# VIEW DEFINITIONS
+# ============================================
+
+def _current_month_scorecard():
+    month_now = cast(extract("month", func.current_date()), Integer)
+    year_now = cast(extract("year", func.current_date()), Integer)
+    return select(
+        E.employee_id,
+        E.display_name,
+        E.email,
+        D.name.label("department_name"),
+        func.coalesce(M.adoption_score, 0).label("adoption_score"),
+        func.coalesce(M.tasks_ai_assisted, 0).label("tasks_automated"),
+        func.coalesce(M.hours_saved, 0).label("hours_saved"),
+        func.coalesce(M.tools_explored, 0).label("tools_explored"),
+        month_now.label("month"),
+        year_now.label("year"),
+    ).select_from(E).outerjoin(
+        D, D.department_id == E.department_id
+    ).outerjoin(
+        M, and_(M.employee_id == E.employee_id, M.month == month_now, M.year == year_now)
+    ).where(E.status == "active")
+
+
+def _department_leaderboard():
+    month_now = cast(extract("month", func.current_date()), Integer)
+    year_now = cast(extract("year", func.current_date()), Integer)
+    avg_score = func.coalesce(func.avg(M.adoption_score), 0)
+    active_users = func.count(case((M.adoption_score.isnot(None), M.employee_id)).distinct())
+    total_employees = func.count(E.employee_id.distinct())
+    return select(
+        D.department_id,
+        D.name.label("department_name"),
+        avg_score.label("avg_score"),
+        active_users.label("active_users"),
+        total_employees.label("total_employees"),
+        func.round(100.0 * active_users / func.nullif(total_employees, 0), 2).label("participation_rate"),
+        func.coalesce(func.sum(M.hours_saved), 0).label("total_hours_saved"),
+        func.row_number().over(order_by=avg_score.desc()).label("rank"),
+    ).select_from(D).outerjoin(
+        E, and_(E.department_id == D.department_id, E.status == "active")
+    ).outerjoin(
+        M, and_(M.employee_id == E.employee_id, M.month == month_now, M.year == year_now)
+    ).group_by(D.department_id, D.name)
+
+
+def _user_stats_summary():
+    # One pre-grouped subquery per dimension instead of joining them all
+    # against each other; tools come from the daily usage table, not the logs
+    badges = select(
+        models.UserBadge.employee_id,
+        func.count(models.UserBadge.badge_id.distinct()).label("n"),
+    ).group_by(models.UserBadge.employee_id).subquery("badges")
+    completed = select(
+        models.UserLearningProgress.employee_id,
+        func.count(models.UserLearningProgress.resource_id.distinct()).label("n"),
+    ).where(
+        models.UserLearningProgress.status == "completed"
+    ).group_by(models.UserLearningProgress.employee_id).subquery("completed")
+    tools = select(
+        models.ToolUsageUserDaily.employee_id,
+        func.count(models.ToolUsageUserDaily.tool_id.distinct()).label("n"),
+    ).group_by(models.ToolUsageUserDaily.employee_id).subquery("tools")
+
+    return select(
+        E.employee_id,
+        E.display_name,
+        func.coalesce(models.UserPoints.total_points, 0).label("total_points"),
+        func.coalesce(badges.c.n, 0).label("badge_count"),
+        func.coalesce(completed.c.n, 0).label("resources_completed"),
+        func.coalesce(tools.c.n, 0).label("tools_used"),
+    ).select_from(E).outerjoin(
+        models.UserPoints, models.UserPoints.employee_id == E.employee_id
+    ).outerjoin(
+        badges, badges.c.employee_id == E.employee_id
+    ).outerjoin(
+        completed, completed.c.employee_id == E.employee_id
+    ).outerjoin(
+        tools, tools.c.employee_id == E.employee_id
+    ).where(E.status == "active")
+
+
+# view name -> (definition, unique key column required by CONCURRENTLY)
+REPORTING_VIEWS: Dict[str, tuple] = {
+    models.CurrentMonthScorecard.__tablename__: (_current_month_scorecard, "employee_id"),
+    models.DepartmentLeaderboard.__tablename__: (_department_leaderboard, "department_id"),
+    models.UserStatsSummary.__tablename__: (_user_stats_summary, "employee_id"),
+}
+
+
+# ============================================
+# CREATE / REFRESH
+# ============================================
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def ensure_views(db: Session) -> int:
+    """
+    Create any missing reporting views. Does not commit.
+
+    On PostgreSQL a plain view left over from an older schema is replaced by
+    the materialized version. Returns the number of views created.
+    """
+    dialect = db.get_bind().dialect
+    created = 0
+    for name, (definition, key) in REPORTING_VIEWS.items():
+        body = definition().compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+        if _is_postgres(db):
+            if db.execute(text("SELECT 1 FROM pg_matviews WHERE matviewname = :name"), {"name": name}).scalar():
+                continue
+            db.execute(text(f'DROP VIEW IF EXISTS "{name}"'))
+            db.connection().exec_driver_sql(f'CREATE MATERIALIZED VIEW "{name}" AS {body}')
+            db.execute(text(f'CREATE UNIQUE INDEX "ux_{name}_{key}" ON "{name}" ("{key}")'))
+        else:
+            exists = db.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = :name"), {"name": name}
+            ).scalar()
+            if exists:
+                continue
+            db.connection().exec_driver_sql(f'CREATE VIEW "{name}" AS {body}')
+        created += 1
+    return created
+
+
+def refresh_views(db: Session) -> bool:
+    """
+    Refresh every materialized view without blocking readers. Commits.
+
+    Returns False if another worker holds the refresh lock (or the database
+    has no materialized views), True after a refresh.
+    """
+    if not _is_postgres(db):
+        return False
+    if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _REFRESH_LOCK_KEY}).scalar():
+        return False
+    for name in REPORTING_VIEWS:
+        populated = db.execute(
+            text("SELECT ispopulated FROM pg_matviews WHERE matviewname = :name"), {"name": name}
+        ).scalar()
+        # CONCURRENTLY needs a populated view; the first refresh cannot use it
+        concurrently = "CONCURRENTLY " if populated else ""
+        db.execute(text(f'REFRESH MATERIALIZED VIEW {concurrently}"{name}"'))
+    db.commit()
+    return True
+
+
+class ViewRefresher:
+    """Daemon thread that refreshes the reporting views every `interval` seconds"""
+
+    def __init__(self, interval: float = REFRESH_INTERVAL_SECONDS):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="reporting-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self):
+        from database import SessionLocal
+
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                refresh_views(db)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Reporting view refresh failed: {e}")
+            finally:
+                db.close()
+
+
+view_refresher = ViewRefresher()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Created {ensure_views(db)} reporting views")
+        db.commit()
+        print("Refreshed" if refresh_views(db) else "Nothing to refresh")
+    finally:
+        db.close()
@@ -0,0 +1,527 @@
+"""
+Rewards engine - badges, challenge progress and points from activity events
+
+Badge and challenge criteria are compiled once into Python predicates (and
+progress functions), and re-compiled only when the catalog changes. Events -
+an adoption metric saved, learning progress updated, tools accessed - only
+submit the employee; the engine batches the affected employees, loads just
+the facts the rules reference with a few grouped queries, evaluates them and
+writes all awards in a handful of multi-row statements. Nothing recomputes
+the whole population on a schedule.
+
+Criteria (GamificationBadge.criteria_json, MonthlyChallenge.criteria_json):
+
+    {"fact": "adoption_score", "op": ">=", "value": 80}
+    {"all": [<criteria>, ...]}      {"any": [<criteria>, ...]}
+
+A badge may also set "points" (default: level * BADGE_POINTS_PER_LEVEL).
+Badges without criteria are never awarded automatically.
+
+Facts: this month's metrics (adoption_score, tasks_ai_assisted, hours_saved,
+tools_explored, learning_hours), tools_used (distinct tools accessed this
+month) and resources_completed (all time).
+
+Usage:
+    python -m services.rewards_service           # evaluate every active employee (backfill)
+"""
+
+import asyncio
+import logging
+import operator
+import os
+import time
+from collections import Counter
+from datetime import date, datetime
+from typing import Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+from services.catalog_service import catalog_cache
+from services.notification_service import notify_many
+from services.rank_service import RANK_TRACKED, record_points
+
+logger = logging.getLogger(__name__)
+
+REWARDS_BATCH_SIZE = int(os.getenv("REWARDS_BATCH_SIZE", "500"))
+REWARDS_FLUSH_SECONDS = float(os.getenv("REWARDS_FLUSH_SECONDS", "2.0"))
+# Failed batches are retried on later flushes this many times before dropping
+REWARDS_MAX_RETRIES = int(os.getenv("REWARDS_MAX_RETRIES", "3"))
+BADGE_POINTS_PER_LEVEL = 100
+
+# Rules are re-read at least this often (challenges), and after any catalog write (badges)
+RULES_MAX_AGE_SECONDS = 60.0
+
+Metric = models.AIAdoptionMetrics
+ChallengeProgress = models.UserChallengeProgress
+
+METRIC_FACTS = ("adoption_score", "tasks_ai_assisted", "hours_saved", "tools_explored", "learning_hours")
+FACTS = frozenset(METRIC_FACTS + ("tools_used", "resources_completed"))
+
+OPERATORS = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+
+# ============================================
+# CRITERIA COMPILER
+# ============================================
+
+class CompiledCriteria(NamedTuple):
+    facts: FrozenSet[str]
+    test: Callable[[dict], bool]
+    progress: Callable[[dict], float]  # 0.0 - 1.0
+
+
+def compile_criteria(criteria) -> CompiledCriteria:
+    """Compile a criteria document; ValueError if it is malformed"""
+    if not isinstance(criteria, dict):
+        raise ValueError("Criteria must be an object")
+
+    for key, combine, aggregate in (("all", all, min), ("any", any, max)):
+        if key in criteria:
+            parts = [compile_criteria(c) for c in criteria[key] or ()]
+            if not parts:
+                raise ValueError(f"'{key}' needs at least one condition")
+            return CompiledCriteria(
+                frozenset().union(*(p.facts for p in parts)),
+                lambda facts: combine(p.test(facts) for p in parts),
+                lambda facts: aggregate(p.progress(facts) for p in parts),
+            )
+
+    fact, op, target = criteria.get("fact"), criteria.get("op", ">="), criteria.get("value")
+    if fact not in FACTS:
+        raise ValueError(f"Unknown fact: {fact!r}")
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown operator: {op!r}")
+    if isinstance(target, bool) or not isinstance(target, (int, float)):
+        raise ValueError(f"Value for {fact} must be a number")
+
+    compare = OPERATORS[op]
+
+    def test(facts: dict) -> bool:
+        return compare(facts.get(fact, 0), target)
+
+    if op in (">=", ">") and target > 0:
+        def progress(facts: dict) -> float:
+            return 1.0 if test(facts) else min(facts.get(fact, 0) / target, 0.99)
+    else:
+        def progress(facts: dict) -> float:
+            return 1.0 if test(facts) else 0.0
+
+    return CompiledCriteria(frozenset([fact]), test, progress)
+
+
+class BadgeRule(NamedTuple):
+    badge_id: int
+    name: str
+    points: int
+    criteria: CompiledCriteria
+
+
+class ChallengeRule(NamedTuple):
+    challenge_id: int
+    title: str
+    reward_points: int
+    criteria: CompiledCriteria
+
+
+class RuleSet(NamedTuple):
+    month: int
+    year: int
+    badges: List[BadgeRule]
+    challenges: List[ChallengeRule]
+    facts: FrozenSet[str]
+
+
+def _badge_points(badge: models.GamificationBadge) -> int:
+    points = badge.criteria_json.get("points", (badge.level or 1) * BADGE_POINTS_PER_LEVEL)
+    if isinstance(points, bool) or not isinstance(points, int) or points < 0:
+        raise ValueError(f"Points must be a non-negative integer, got {points!r}")
+    return points
+
+
+def load_rules(db: Session, as_of: Optional[date] = None) -> RuleSet:
+    """Compile all badge criteria and the active challenges of as_of's month"""
+    as_of = as_of or datetime.utcnow().date()
+    badges, challenges = [], []
+
+    for badge in db.scalars(select(models.GamificationBadge).where(models.GamificationBadge.criteria_json.isnot(None))):
+        try:
+            criteria = compile_criteria(badge.criteria_json)
+            points = _badge_points(badge)
+        except ValueError as e:
+            logger.warning(f"Skipping badge {badge.name!r}: {e}")
+            continue
+        badges.append(BadgeRule(badge.badge_id, badge.name, points, criteria))
+
+    for challenge in db.scalars(select(models.MonthlyChallenge).where(
+        models.MonthlyChallenge.month == as_of.month,
+        models.MonthlyChallenge.year == as_of.year,
+        models.MonthlyChallenge.status == "active",
+        models.MonthlyChallenge.criteria_json.isnot(None),
+    )):
+        try:
+            criteria = compile_criteria(challenge.criteria_json)
+        except ValueError as e:
+            logger.warning(f"Skipping challenge {challenge.title!r}: {e}")
+            continue
+        challenges.append(ChallengeRule(
+            challenge.challenge_id, challenge.title, challenge.reward_points or 0, criteria
+        ))
+
+    facts = frozenset().union(*(r.criteria.facts for r in badges + challenges))
+    return RuleSet(as_of.month, as_of.year, badges, challenges, facts)
+
+
+# ============================================
+# FACTS
+# ============================================
+
+def load_facts(db: Session, employee_ids: List[int], rules: RuleSet) -> Dict[int, dict]:
+    """Per-employee values of the facts the rules use (missing facts count as 0)"""
+    facts: Dict[int, dict] = {eid: {} for eid in employee_ids}
+
+    metric_facts = [name for name in METRIC_FACTS if name in rules.facts]
+    if metric_facts:
+        rows = db.execute(
+            select(Metric.employee_id, *(getattr(Metric, name) for name in metric_facts))
+            .where(Metric.employee_id.in_(employee_ids), Metric.month == rules.month, Metric.year == rules.year)
+        )
+        for employee_id, *values in rows:
+            facts[employee_id].update(
+                (name, float(value or 0)) for name, value in zip(metric_facts, values)
+            )
+
+    if "tools_used" in rules.facts:
+        month_start = date(rules.year, rules.month, 1)
+        next_month = date(rules.year + rules.month // 12, rules.month % 12 + 1, 1)
+        UserDaily = models.ToolUsageUserDaily
+        for employee_id, count in db.execute(
+            select(UserDaily.employee_id, func.count(UserDaily.tool_id.distinct()))
+            .where(
+                UserDaily.employee_id.in_(employee_ids),
+                UserDaily.day >= month_start,
+                UserDaily.day < next_month,
+            )
+            .group_by(UserDaily.employee_id)
+        ):
+            facts[employee_id]["tools_used"] = count
+
+    if "resources_completed" in rules.facts:
+        Progress = models.UserLearningProgress
+        for employee_id, count in db.execute(
+            select(Progress.employee_id, func.count())
+            .where(Progress.employee_id.in_(employee_ids), Progress.status == "completed")
+            .group_by(Progress.employee_id)
+        ):
+            facts[employee_id]["resources_completed"] = count
+
+    return facts
+
+
+# ============================================
+# EVALUATION
+# ============================================
+
+def evaluate(db: Session, employee_ids: Iterable[int], rules: Optional[RuleSet] = None) -> dict:
+    """
+    Award badges, update challenge progress and add points for employees.
+
+    Idempotent: badges are awarded and challenges pay out once, even if
+    evaluations race. Does not commit. Returns counts of what changed.
+    """
+    employee_ids = sorted(set(employee_ids))
+    rules = rules or load_rules(db)
+    summary = {"employees": len(employee_ids), "badges": 0, "challenges_completed": 0, "points": 0}
+    if not employee_ids or not (rules.badges or rules.challenges):
+        return summary
+
+    facts = load_facts(db, employee_ids, rules)
+    now = datetime.utcnow()
+    insert_ = dialect_insert(db)
+
+    earned = set(db.execute(
+        select(models.UserBadge.employee_id, models.UserBadge.badge_id).where(
+            models.UserBadge.employee_id.in_(employee_ids),
+            models.UserBadge.badge_id.in_([r.badge_id for r in rules.badges]),
+        )
+    ).all()) if rules.badges else set()
+    progress_now = {
+        (employee_id, challenge_id): (percent, completed)
+        for employee_id, challenge_id, percent, completed in db.execute(
+            select(
+                ChallengeProgress.employee_id,
+                ChallengeProgress.challenge_id,
+                ChallengeProgress.progress_percent,
+                ChallengeProgress.completed,
+            ).where(
+                ChallengeProgress.employee_id.in_(employee_ids),
+                ChallengeProgress.challenge_id.in_([r.challenge_id for r in rules.challenges]),
+            )
+        )
+    } if rules.challenges else {}
+
+    badge_rows, progress_rows = [], []
+    for employee_id in employee_ids:
+        employee_facts = facts[employee_id]
+        for rule in rules.badges:
+            if (employee_id, rule.badge_id) not in earned and rule.criteria.test(employee_facts):
+                badge_rows.append({
+                    "employee_id": employee_id, "badge_id": rule.badge_id, "awarded_on": now, "created_at": now,
+                })
+        for rule in rules.challenges:
+            previous = progress_now.get((employee_id, rule.challenge_id))
+            if previous and previous[1]:
+                continue
+            completed = rule.criteria.test(employee_facts)
+            percent = 100 if completed else int(rule.criteria.progress(employee_facts) * 100)
+            if previous and previous[0] == percent:
+                continue
+            progress_rows.append({
+                "employee_id": employee_id,
+                "challenge_id": rule.challenge_id,
+                "progress_percent": percent,
+                "completed": completed,
+                "completed_at": now if completed else None,
+                "created_at": now,
+            })
+
+    points = Counter()
+    notifications = []
+
+    if badge_rows:
+        badges_by_id = {r.badge_id: r for r in rules.badges}
+        new_badges = db.execute(
+            insert_(models.UserBadge).values(badge_rows)
+            .on_conflict_do_nothing(index_elements=["employee_id", "badge_id"])
+            .returning(models.UserBadge.employee_id, models.UserBadge.badge_id)
+        ).all()
+        for employee_id, badge_id in new_badges:
+            rule = badges_by_id[badge_id]
+            points[employee_id] += rule.points
+            notifications.append({
+                "employee_id": employee_id,
+                "type": "badge",
+                "title": f"Badge earned: {rule.name}",
+                "data": {"badge_id": badge_id, "points": rule.points},
+            })
+        summary["badges"] = len(new_badges)
+
+    if progress_rows:
+        challenges_by_id = {r.challenge_id: r for r in rules.challenges}
+        stmt = insert_(ChallengeProgress).values(progress_rows)
+        # Rows already completed are never touched again, so a completion pays out once
+        changed = db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["employee_id", "challenge_id"],
+                set_={
+                    "progress_percent": stmt.excluded.progress_percent,
+                    "completed": stmt.excluded.completed,
+                    "completed_at": stmt.excluded.completed_at,
+                },
+                where=ChallengeProgress.completed == False,
+            ).returning(ChallengeProgress.employee_id, ChallengeProgress.challenge_id, ChallengeProgress.completed)
+        ).all()
+        for employee_id, challenge_id, completed in changed:
+            if not completed:
+                continue
+            rule = challenges_by_id[challenge_id]
+            points[employee_id] += rule.reward_points
+            notifications.append({
+                "employee_id": employee_id,
+                "type": "challenge",
+                "title": f"Challenge completed: {rule.title}",
+                "data": {"challenge_id": challenge_id, "points": rule.reward_points},
+            })
+            summary["challenges_completed"] += 1
+
+    if points:
+        stmt = insert_(models.UserPoints).values([
+            {"employee_id": employee_id, "total_points": awarded, "month_points": awarded, "last_updated": now}
+            for employee_id, awarded in sorted(points.items())
+        ])
+        totals = db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["employee_id"],
+                set_={
+                    "total_points": models.UserPoints.total_points + stmt.excluded.total_points,
+                    "month_points": models.UserPoints.month_points + stmt.excluded.month_points,
+                    "last_updated": now,
+                },
+            ).returning(models.UserPoints.employee_id, models.UserPoints.total_points),
+            execution_options={RANK_TRACKED: True},
+        ).all()
+        # New totals move the rank index incrementally once committed
+        record_points(db, totals)
+        # Attributed to the rules' month so a month close leaves them out of earlier months
+        ledger = insert_(models.MonthlyPointsLedger).values([
+            {"employee_id": employee_id, "year": rules.year, "month": rules.month, "points": awarded}
+            for employee_id, awarded in sorted(points.items())
+        ])
+        db.execute(ledger.on_conflict_do_update(
+            index_elements=["employee_id", "year", "month"],
+            set_={"points": models.MonthlyPointsLedger.points + ledger.excluded.points},
+        ))
+        summary["points"] = sum(points.values())
+
+    notify_many(db, notifications)
+    return summary
+
+
+# ============================================
+# ENGINE
+# ============================================
+
+class RewardsEngine:
+    """Collects employees touched by events and evaluates them in batches"""
+
+    def __init__(
+        self,
+        batch_size: int = REWARDS_BATCH_SIZE,
+        flush_interval: float = REWARDS_FLUSH_SECONDS,
+        max_retries: int = REWARDS_MAX_RETRIES,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._pending: Set[int] = set()
+        # Employees from failed batches, re-queued at the next flush cycle
+        self._retry: Set[int] = set()
+        self._attempts: Dict[int, int] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._rules: Optional[RuleSet] = None
+        self._rules_loaded_at = 0.0
+        self._rules_generation = -1
+        self.evaluated = 0
+        self.failed = 0
+
+    def submit(self, employee_ids: Iterable[int]):
+        """Queue employees for evaluation (duplicates collapse until the next batch)"""
+        self._pending.update(employee_ids)
+        if self._wakeup is not None and len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self):
+        """Start the evaluation task (call from lifespan)"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="rewards-engine")
+
+    async def stop(self):
+        """Stop the task and evaluate everyone still pending"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while self._requeue_retries():
+            await self._flush()
+        self._wakeup = None
+        logger.info(f"Rewards engine stopped: {self.evaluated} evaluated, {self.failed} failed")
+
+    async def _run(self):
+        flushing: Optional[asyncio.Future] = None
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                self._requeue_retries()
+                while self._pending:
+                    flushing = asyncio.ensure_future(self._flush())
+                    # Shielded so shutdown cannot cut a batch off mid-write
+                    await asyncio.shield(flushing)
+        except asyncio.CancelledError:
+            if flushing is not None and not flushing.done():
+                await flushing
+            raise
+
+    async def _flush(self):
+        from database import AsyncSessionLocal
+
+        batch = sorted(self._pending)[:self.batch_size]
+        self._pending.difference_update(batch)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(self._evaluate, batch)
+                await db.commit()
+            self.evaluated += len(batch)
+            for employee_id in batch:
+                self._attempts.pop(employee_id, None)
+        except Exception as e:
+            dropped = 0
+            for employee_id in batch:
+                attempts = self._attempts.get(employee_id, 0) + 1
+                if attempts > self.max_retries:
+                    self._attempts.pop(employee_id, None)
+                    dropped += 1
+                else:
+                    self._attempts[employee_id] = attempts
+                    self._retry.add(employee_id)
+            self.failed += dropped
+            logger.error(
+                f"Rewards evaluation failed for {len(batch)} employees "
+                f"({len(batch) - dropped} will be retried): {e}"
+            )
+
+    def _requeue_retries(self) -> bool:
+        """Move failed employees back into the pending set; True if any are pending"""
+        self._pending |= self._retry
+        self._retry.clear()
+        return bool(self._pending)
+
+    def _evaluate(self, db: Session, employee_ids: List[int]):
+        today = datetime.utcnow().date()
+        if (
+            self._rules is None
+            or self._rules_generation != catalog_cache.generation
+            or (self._rules.month, self._rules.year) != (today.month, today.year)
+            or time.monotonic() - self._rules_loaded_at >= RULES_MAX_AGE_SECONDS
+        ):
+            generation = catalog_cache.generation
+            self._rules = load_rules(db, today)
+            self._rules_generation = generation
+            self._rules_loaded_at = time.monotonic()
+        evaluate(db, employee_ids, self._rules)
+
+
+rewards_engine = RewardsEngine()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rules = load_rules(db)
+        print(f"Rules: {len(rules.badges)} badges, {len(rules.challenges)} challenges")
+        employee_ids = list(db.scalars(
+            select(models.Employee.employee_id)
+            .where(models.Employee.status == "active")
+            .order_by(models.Employee.employee_id)
+        ))
+        totals = Counter()
+        for start in range(0, len(employee_ids), REWARDS_BATCH_SIZE):
+            totals.update(evaluate(db, employee_ids[start:start + REWARDS_BATCH_SIZE], rules))
+            db.commit()
+        print(
+            f"Evaluated {totals['employees']} employees: {totals['badges']} badges, "
+            f"{totals['challenges_completed']} challenges completed, {totals['points']} points"
+        )
+    finally:
+        db.close()
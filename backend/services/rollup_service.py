@@ -0,0 +1,226 @@
+"""
+Department rollup pipeline - keeps DepartmentAdoptionAgg current
+
+Individual metric writes are applied as deltas to the matching
+(department, month, year) aggregate row. Bulk loads and backfills use
+rebuild_rollups(), which recomputes the aggregates with grouped queries.
+
+Usage:
+    python -m services.rollup_service                  # rebuild everything
+    python -m services.rollup_service --department 3   # rebuild one department
+"""
+
+import argparse
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+Agg = models.DepartmentAdoptionAgg
+Metric = models.AIAdoptionMetrics
+
+# (scored_users, score_total, hours_saved) contributed by one metrics row
+Contribution = Tuple[int, int, float]
+
+EMPTY_CONTRIBUTION: Contribution = (0, 0, 0.0)
+
+
+def metric_contribution(metric: Optional[Metric]) -> Contribution:
+    """Return what a metrics row contributes to its department aggregate"""
+    if metric is None:
+        return EMPTY_CONTRIBUTION
+    scored = metric.adoption_score is not None
+    return (
+        1 if scored else 0,
+        metric.adoption_score if scored else 0,
+        float(metric.hours_saved or 0),
+    )
+
+
+def _active_employee_count(department_id: int):
+    """Scalar subquery counting the department's active employees"""
+    return (
+        select(func.count(models.Employee.employee_id))
+        .where(
+            models.Employee.department_id == department_id,
+            models.Employee.status == "active",
+        )
+        .scalar_subquery()
+    )
+
+
+def apply_metric_change(
+    db: Session,
+    department_id: int,
+    month: int,
+    year: int,
+    before: Contribution,
+    after: Contribution,
+):
+    """
+    Apply the difference between two contributions to an aggregate row.
+
+    Runs as a single UPDATE with the arithmetic done in SQL so concurrent
+    writers do not lose increments; total_employees is re-counted in the
+    same statement. If the month has no row yet, it is built with
+    rebuild_rollups() from all of the department's metrics (including this
+    change, which is flushed first) rather than from the delta alone.
+    Does not commit; the caller's transaction owns the change.
+    """
+    d_users = after[0] - before[0]
+    d_score = after[1] - before[1]
+    d_hours = after[2] - before[2]
+    if department_id is None or not (d_users or d_score or d_hours):
+        return
+
+    new_users = func.coalesce(Agg.active_users, 0) + d_users
+    new_score = func.coalesce(Agg.score_total, 0) + d_score
+    headcount = _active_employee_count(department_id)
+    result = db.execute(
+        update(Agg)
+        .where(
+            Agg.department_id == department_id,
+            Agg.month == month,
+            Agg.year == year,
+        )
+        .values(
+            active_users=new_users,
+            score_total=new_score,
+            total_hours_saved=func.coalesce(Agg.total_hours_saved, 0) + d_hours,
+            total_employees=headcount,
+            avg_score=case((new_users > 0, new_score * 1.0 / new_users), else_=0),
+            participation_rate=case(
+                (headcount > 0, new_users * 100.0 / headcount),
+                else_=0,
+            ),
+            updated_at=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        return
+
+    # No row yet: the delta alone would be a partial total, so aggregate
+    # the whole month (this change included) instead
+    db.flush()
+    try:
+        with db.begin_nested():
+            rebuild_rollups(db, department_id, month, year)
+    except IntegrityError:
+        # Another writer created the row first - apply as an update instead
+        apply_metric_change(db, department_id, month, year, before, after)
+
+
+def _build_row(
+    department_id: int,
+    month: int,
+    year: int,
+    active_users: int,
+    score_total: int,
+    total_hours: float,
+    total_employees: int,
+) -> Agg:
+    return Agg(
+        department_id=department_id,
+        month=month,
+        year=year,
+        active_users=active_users,
+        score_total=score_total,
+        total_hours_saved=total_hours,
+        total_employees=total_employees,
+        avg_score=round(score_total / active_users, 2) if active_users else 0,
+        participation_rate=round(active_users * 100 / total_employees, 2) if total_employees else 0,
+    )
+
+
+def rebuild_rollups(
+    db: Session,
+    department_id: Optional[int] = None,
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+) -> int:
+    """
+    Recompute aggregate rows from ai_adoption_metrics with grouped queries.
+
+    Scope can be narrowed to one department and/or one month. Existing rows
+    in scope are replaced. Does not commit. Returns the number of rows written.
+    """
+    grouped = db.query(
+        models.Employee.department_id,
+        Metric.month,
+        Metric.year,
+        func.count(Metric.adoption_score),
+        func.coalesce(func.sum(Metric.adoption_score), 0),
+        func.coalesce(func.sum(Metric.hours_saved), 0),
+    ).join(
+        models.Employee, models.Employee.employee_id == Metric.employee_id
+    )
+    headcount = db.query(
+        models.Employee.department_id,
+        func.count(models.Employee.employee_id),
+    ).filter(models.Employee.status == "active")
+    existing = db.query(Agg)
+
+    if department_id is not None:
+        grouped = grouped.filter(models.Employee.department_id == department_id)
+        headcount = headcount.filter(models.Employee.department_id == department_id)
+        existing = existing.filter(Agg.department_id == department_id)
+    if month is not None:
+        grouped = grouped.filter(Metric.month == month)
+        existing = existing.filter(Agg.month == month)
+    if year is not None:
+        grouped = grouped.filter(Metric.year == year)
+        existing = existing.filter(Agg.year == year)
+
+    totals = dict(headcount.group_by(models.Employee.department_id).all())
+    groups = grouped.group_by(
+        models.Employee.department_id, Metric.month, Metric.year
+    ).all()
+
+    rows = [
+        _build_row(
+            dept_id, m, y,
+            active_users=scored,
+            score_total=int(score_sum),
+            total_hours=float(hours),
+            total_employees=totals.get(dept_id, 0),
+        )
+        for dept_id, m, y, scored, score_sum, hours in groups
+    ]
+
+    if month is not None and year is not None:
+        # Store empty rows too so departments without metrics this month
+        # are still served by a lookup rather than re-aggregated each time
+        covered = {row.department_id for row in rows}
+        rows.extend(
+            _build_row(dept_id, month, year, 0, 0, 0.0, headcount_total)
+            for dept_id, headcount_total in totals.items()
+            if dept_id not in covered
+        )
+
+    existing.delete(synchronize_session=False)
+    db.add_all(rows)
+    db.flush()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild department adoption rollups")
+    parser.add_argument("--department", type=int, default=None)
+    parser.add_argument("--month", type=int, default=None)
+    parser.add_argument("--year", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        written = rebuild_rollups(db, args.department, args.month, args.year)
+        db.commit()
+        print(f"Rebuilt {written} department rollup rows")
+    finally:
+        db.close()
@@ -0,0 +1,82 @@
+"""
+Scorecard engine - everything a personal scorecard needs in one round trip
+
+The current and previous month, the recent history used for the trend chart
+and the department average come back from a single query: the member's
+latest metrics rows (LIMIT-ed in SQL) each carry the department average as a
+scalar subquery, read from the precomputed rollup when it exists.
+"""
+
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session, aliased
+
+import models
+
+Agg = models.DepartmentAdoptionAgg
+Metric = models.AIAdoptionMetrics
+
+
+class ScorecardData(NamedTuple):
+    current: Optional[Metric]
+    previous: Optional[Metric]
+    history: List[Metric]  # chronological, oldest first
+    department_avg: Optional[float]
+
+
+def previous_period(month: int, year: int):
+    return (month - 1, year) if month > 1 else (12, year - 1)
+
+
+def load_scorecard(
+    db: Session,
+    employee_id: int,
+    department_id: Optional[int],
+    month: int,
+    year: int,
+    history: int = 6,
+) -> ScorecardData:
+    """
+    Load scorecard inputs for one employee as of (month, year).
+
+    Rows dated after the requested month are ignored. The department average
+    comes from DepartmentAdoptionAgg and falls back to averaging the month's
+    metrics when the rollup row has not been built yet.
+    """
+    peer = aliased(Metric)
+    live_avg = (
+        select(func.avg(peer.adoption_score))
+        .join(models.Employee, models.Employee.employee_id == peer.employee_id)
+        .where(
+            models.Employee.department_id == department_id,
+            peer.month == month,
+            peer.year == year,
+        )
+        .scalar_subquery()
+    )
+    rollup_avg = (
+        select(Agg.avg_score)
+        .where(Agg.department_id == department_id, Agg.month == month, Agg.year == year)
+        .scalar_subquery()
+    )
+
+    rows = db.execute(
+        select(Metric, func.coalesce(rollup_avg, live_avg))
+        .where(
+            Metric.employee_id == employee_id,
+            tuple_(Metric.year, Metric.month) <= (year, month),
+        )
+        .order_by(Metric.year.desc(), Metric.month.desc())
+        # Always reach back far enough to see the previous month
+        .limit(max(history, 2))
+    ).all()
+
+    by_period = {(m.month, m.year): m for m, _ in rows}
+    department_avg = rows[0][1] if rows else None
+    return ScorecardData(
+        current=by_period.get((month, year)),
+        previous=by_period.get(previous_period(month, year)),
+        history=[m for m, _ in reversed(rows[:history])],
+        department_avg=float(department_avg) if department_avg is not None else None,
+    )
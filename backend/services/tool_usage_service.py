@@ -0,0 +1,240 @@
+"""
+Tool usage analytics - daily per-tool, per-department counters
+
+Access events are folded into tool_usage_daily in the same transaction that
+writes them to tool_access_logs. Distinct users are counted exactly: the
+first access by an employee to a tool on a day inserts a row into
+tool_usage_user_daily, and only those inserts bump the counter. Employees
+without a department are counted under department_id NULL. Reports read
+these small tables instead of scanning the logs. rebuild_usage() recomputes
+the counters from the logs for backfills.
+
+Usage:
+    python -m services.tool_usage_service                          # rebuild everything
+    python -m services.tool_usage_service --start 2026-01-01 --end 2026-01-31
+"""
+
+import argparse
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import Date, delete, func, insert, literal_column, select, type_coerce
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+
+Daily = models.ToolUsageDaily
+UserDaily = models.ToolUsageUserDaily
+Log = models.ToolAccessLog
+
+DEFAULT_REPORT_DAYS = 30
+
+
+def record_usage(db: Session, events: Iterable[dict]):
+    """
+    Fold access events (employee_id, tool_id, timestamp) into the counters.
+
+    Does not commit; call it in the transaction that writes the events.
+    Events from employees that no longer exist are ignored.
+    """
+    events = list(events)
+    if not events:
+        return
+
+    employee_ids = {e["employee_id"] for e in events}
+    departments = dict(db.execute(
+        select(models.Employee.employee_id, models.Employee.department_id)
+        .where(models.Employee.employee_id.in_(employee_ids))
+    ).all())
+
+    access_counts = Counter()
+    user_rows = {}
+    for e in events:
+        if e["employee_id"] not in departments:
+            continue
+        department_id = departments[e["employee_id"]]
+        day = e["timestamp"].date()
+        access_counts[(day, e["tool_id"], department_id)] += 1
+        user_rows[(day, e["tool_id"], e["employee_id"])] = department_id
+    if not access_counts:
+        return
+
+    insert_ = dialect_insert(db)
+
+    # Only first sightings come back from RETURNING; those are the new users
+    new_users = Counter()
+    if user_rows:
+        first_seen = db.execute(
+            insert_(UserDaily)
+            .values([
+                {"day": day, "tool_id": tool_id, "employee_id": employee_id, "department_id": dept}
+                for (day, tool_id, employee_id), dept in sorted(user_rows.items())
+            ])
+            .on_conflict_do_nothing(index_elements=["day", "tool_id", "employee_id"])
+            .returning(UserDaily.day, UserDaily.tool_id, UserDaily.department_id)
+        ).all()
+        new_users.update((day, tool_id, dept) for day, tool_id, dept in first_seen)
+
+    stmt = insert_(Daily).values([
+        {
+            "day": day,
+            "tool_id": tool_id,
+            "department_id": dept,
+            "access_count": count,
+            "distinct_users": new_users[(day, tool_id, dept)],
+        }
+        # Sorted so concurrent writers lock counter rows in the same order
+        for (day, tool_id, dept), count in sorted(
+            access_counts.items(), key=lambda item: (item[0][0], item[0][1], item[0][2] or 0)
+        )
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[Daily.day, Daily.tool_id, func.coalesce(Daily.department_id, literal_column("0"))],
+        set_={
+            "access_count": Daily.access_count + stmt.excluded.access_count,
+            "distinct_users": Daily.distinct_users + stmt.excluded.distinct_users,
+        },
+    ))
+
+
+def rebuild_usage(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    Recompute counters for [start, end] (inclusive, open-ended if omitted) from
+    tool_access_logs. Does not commit. Returns the number of counter rows written.
+    """
+    day = type_coerce(func.date(Log.timestamp), Date)
+    log_start = log_end = None
+    counter_scope = []
+    if start is not None:
+        log_start = datetime.combine(start, datetime.min.time())
+        counter_scope.append(lambda model: model.day >= start)
+    if end is not None:
+        log_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+        counter_scope.append(lambda model: model.day <= end)
+
+    for model in (Daily, UserDaily):
+        db.execute(delete(model).where(*[clause(model) for clause in counter_scope]))
+
+    logs = select(
+        day.label("day"),
+        Log.tool_id,
+        Log.employee_id,
+        models.Employee.department_id,
+    ).join(models.Employee, models.Employee.employee_id == Log.employee_id).where(Log.in_period(log_start, log_end))
+
+    db.execute(insert(UserDaily).from_select(
+        ["day", "tool_id", "employee_id", "department_id"],
+        logs.distinct(),
+    ))
+
+    grouped = logs.subquery()
+    result = db.execute(insert(Daily).from_select(
+        ["day", "tool_id", "department_id", "access_count", "distinct_users"],
+        select(
+            grouped.c.day,
+            grouped.c.tool_id,
+            grouped.c.department_id,
+            func.count(),
+            func.count(grouped.c.employee_id.distinct()),
+        ).group_by(grouped.c.day, grouped.c.tool_id, grouped.c.department_id),
+    ))
+    db.flush()
+    return result.rowcount
+
+
+def usage_report(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    department_id: Optional[int] = None,
+) -> dict:
+    """
+    Tool usage between start and end (inclusive) from the daily counters.
+
+    Defaults to the last DEFAULT_REPORT_DAYS days. Distinct users are exact
+    over the whole range, per tool and per day.
+    """
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=DEFAULT_REPORT_DAYS - 1)
+
+    def scoped(query, model):
+        query = query.where(model.day >= start, model.day <= end)
+        if department_id is not None:
+            query = query.where(model.department_id == department_id)
+        return query
+
+    access_by_tool = dict(db.execute(scoped(
+        select(Daily.tool_id, func.sum(Daily.access_count)).group_by(Daily.tool_id), Daily
+    )).all())
+    users_by_tool = dict(db.execute(scoped(
+        select(UserDaily.tool_id, func.count(UserDaily.employee_id.distinct())).group_by(UserDaily.tool_id),
+        UserDaily,
+    )).all())
+    access_by_day = dict(db.execute(scoped(
+        select(Daily.day, func.sum(Daily.access_count)).group_by(Daily.day), Daily
+    )).all())
+    users_by_day = dict(db.execute(scoped(
+        select(UserDaily.day, func.count(UserDaily.employee_id.distinct())).group_by(UserDaily.day),
+        UserDaily,
+    )).all())
+    total_users = db.scalar(scoped(
+        select(func.count(UserDaily.employee_id.distinct())), UserDaily
+    )) or 0
+
+    tools: List[dict] = []
+    if access_by_tool:
+        names = db.execute(
+            select(models.AITool.tool_id, models.AITool.name, models.AITool.category)
+            .where(models.AITool.tool_id.in_(access_by_tool))
+        ).all()
+        tools = sorted(
+            (
+                {
+                    "tool_id": tool_id,
+                    "name": name,
+                    "category": category,
+                    "access_count": int(access_by_tool[tool_id]),
+                    "distinct_users": users_by_tool.get(tool_id, 0),
+                }
+                for tool_id, name, category in names
+            ),
+            key=lambda t: (-t["access_count"], t["tool_id"]),
+        )
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "department_id": department_id,
+        "totals": {
+            "access_count": int(sum(access_by_day.values())),
+            "distinct_users": total_users,
+        },
+        "tools": tools,
+        "daily": [
+            {
+                "date": day.isoformat(),
+                "access_count": int(access_by_day[day]),
+                "distinct_users": users_by_day.get(day, 0),
+            }
+            for day in sorted(access_by_day)
+        ],
+    }
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild daily tool usage counters")
+    parser.add_argument("--start", type=date.fromisoformat, default=None)
+    parser.add_argument("--end", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        written = rebuild_usage(db, args.start, args.end)
+        db.commit()
+        print(f"Rebuilt {written} daily tool usage rows")
+    finally:
+        db.close()
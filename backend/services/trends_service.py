@@ -0,0 +1,79 @@
+"""
+Trends engine - monthly adoption trends aggregated in the database
+
+Grouping, averages, sums and counts run as a single GROUP BY over the
+requested window instead of loading every metrics row into Python.
+"""
+
+from typing import List, Optional
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+import models
+
+Metric = models.AIAdoptionMetrics
+
+
+def monthly_trends(
+    db: Session,
+    months: int = 6,
+    department_id: Optional[int] = None,
+    role: Optional[str] = None,
+) -> List[dict]:
+    """
+    Return per-month adoption averages for the last `months` months of data.
+
+    Optional department and role filters are applied in SQL via a join on
+    employees. Results are in chronological order.
+    """
+    filters = []
+    if department_id is not None:
+        filters.append(models.Employee.department_id == department_id)
+    if role is not None:
+        filters.append(models.Employee.role == role)
+
+    def scoped(query):
+        if filters:
+            query = query.join(
+                models.Employee, models.Employee.employee_id == Metric.employee_id
+            ).filter(*filters)
+        return query
+
+    # Window ends at the latest month with data, counted as year * 12 + month
+    latest = scoped(db.query(func.max(Metric.year * 12 + Metric.month - 1))).scalar()
+    if latest is None:
+        return []
+    start_year, start_month = divmod(latest - max(months, 1) + 1, 12)
+    start_month += 1
+
+    rows = scoped(db.query(
+        Metric.year,
+        Metric.month,
+        # Zero values are treated as "not reported", matching the dashboard's
+        # historical behaviour
+        func.avg(func.nullif(Metric.adoption_score, 0)),
+        func.coalesce(func.sum(Metric.hours_saved), 0),
+        func.avg(func.nullif(Metric.tasks_ai_assisted, 0)),
+        func.count(Metric.id),
+    )).filter(
+        or_(
+            Metric.year > start_year,
+            and_(Metric.year == start_year, Metric.month >= start_month),
+        )
+    ).group_by(
+        Metric.year, Metric.month
+    ).order_by(
+        Metric.year, Metric.month
+    ).all()
+
+    return [
+        {
+            "month": f"{year}-{month:02d}",
+            "avg_adoption_score": round(float(avg_score or 0), 1),
+            "total_hours_saved": round(float(total_hours or 0), 1),
+            "avg_tasks_automated": round(float(avg_tasks or 0), 1),
+            "users_active": count,
+        }
+        for year, month, avg_score, total_hours, avg_tasks, count in rows
+    ]
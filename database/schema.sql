@@ -65,6 +65,7 @@ CREATE TABLE department_adoption_agg (
     total_hours_saved DECIMAL(12, 2),
     total_employees INTEGER,
     active_users INTEGER,
+    score_total INTEGER DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(department_id, month, year)
@@ -94,15 +95,44 @@ CREATE TABLE ai_tools (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Append-only, range-partitioned by month (see section 11)
 CREATE TABLE tool_access_logs (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     employee_id INTEGER NOT NULL REFERENCES employees(employee_id) ON DELETE CASCADE,
     tool_id INTEGER NOT NULL REFERENCES ai_tools(tool_id) ON DELETE CASCADE,
     action VARCHAR(50) NOT NULL,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE tool_access_logs_default PARTITION OF tool_access_logs DEFAULT;
 
 CREATE INDEX idx_tools_category ON ai_tools(category);
+
+-- Daily usage counters, maintained incrementally from tool access events
+CREATE TABLE tool_usage_daily (
+    id SERIAL PRIMARY KEY,
+    day DATE NOT NULL,
+    tool_id INTEGER NOT NULL REFERENCES ai_tools(tool_id) ON DELETE CASCADE,
+    department_id INTEGER REFERENCES departments(department_id) ON DELETE CASCADE,  -- NULL: no department
+    access_count INTEGER NOT NULL DEFAULT 0,
+    distinct_users INTEGER NOT NULL DEFAULT 0
+);
+
+-- NULLs are distinct in a plain UNIQUE, so the unassigned bucket is keyed as department 0
+CREATE UNIQUE INDEX ux_tool_usage_daily_key ON tool_usage_daily(day, tool_id, COALESCE(department_id, 0));
+
+CREATE TABLE tool_usage_user_daily (
+    id SERIAL PRIMARY KEY,
+    day DATE NOT NULL,
+    tool_id INTEGER NOT NULL REFERENCES ai_tools(tool_id) ON DELETE CASCADE,
+    employee_id INTEGER NOT NULL REFERENCES employees(employee_id) ON DELETE CASCADE,
+    department_id INTEGER REFERENCES departments(department_id) ON DELETE CASCADE,
+    UNIQUE(day, tool_id, employee_id)
+);
+
+CREATE INDEX idx_tool_usage_daily_dept ON tool_usage_daily(department_id, day);
+CREATE INDEX idx_tool_usage_user_daily_dept ON tool_usage_user_daily(department_id, day);
 CREATE INDEX idx_tool_access_logs_employee ON tool_access_logs(employee_id, timestamp);
 
 -- ============================================
@@ -171,6 +201,7 @@ CREATE TABLE user_points (
     employee_id INTEGER NOT NULL UNIQUE REFERENCES employees(employee_id) ON DELETE CASCADE,
     total_points INTEGER DEFAULT 0,
     month_points INTEGER DEFAULT 0,
+    rank INTEGER,
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -201,6 +232,42 @@ CREATE TABLE user_challenge_progress (
 CREATE INDEX idx_user_badges_employee ON user_badges(employee_id);
 CREATE INDEX idx_user_points_employee ON user_points(employee_id);
 
+-- Points per employee per not-yet-closed month, written with every award
+-- (backend/services/rewards_service.py) and cleared by the month-close job
+CREATE TABLE monthly_points_ledger (
+    id SERIAL PRIMARY KEY,
+    employee_id INTEGER NOT NULL REFERENCES employees(employee_id) ON DELETE CASCADE,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL CHECK (month BETWEEN 1 AND 12),
+    points INTEGER NOT NULL DEFAULT 0,
+    UNIQUE(employee_id, year, month)
+);
+
+-- Written by the month-close job (backend/services/month_close_service.py)
+CREATE TABLE monthly_points_history (
+    id SERIAL PRIMARY KEY,
+    employee_id INTEGER NOT NULL REFERENCES employees(employee_id) ON DELETE CASCADE,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL CHECK (month BETWEEN 1 AND 12),
+    points INTEGER NOT NULL DEFAULT 0,
+    total_points INTEGER NOT NULL DEFAULT 0,
+    month_rank INTEGER,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(employee_id, year, month)
+);
+
+-- Idempotency key: a month is closed at most once
+CREATE TABLE month_closes (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL CHECK (month BETWEEN 1 AND 12),
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    employees_archived INTEGER,
+    challenges_completed INTEGER,
+    points_awarded INTEGER,
+    PRIMARY KEY (year, month)
+);
+
 -- ============================================
 -- 6. NOTIFICATIONS
 -- ============================================
@@ -218,13 +285,23 @@ CREATE TABLE notifications (
 );
 
 CREATE INDEX idx_notifications_employee ON notifications(employee_id, is_read);
+-- Keyset feed: newest first, then by id
+CREATE INDEX idx_notifications_feed ON notifications(employee_id, created_at, id);
+
+-- Unread count per employee, kept in step with notifications by the app
+CREATE TABLE notification_counters (
+    employee_id INTEGER PRIMARY KEY REFERENCES employees(employee_id) ON DELETE CASCADE,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
 
 -- ============================================
 -- 7. AUDIT & LOGGING
 -- ============================================
 
+-- Append-only, range-partitioned by month (see section 11)
 CREATE TABLE audit_logs (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     employee_id INTEGER REFERENCES employees(employee_id),
     action VARCHAR(255) NOT NULL,
     resource_type VARCHAR(100),
@@ -232,8 +309,11 @@ CREATE TABLE audit_logs (
     details JSONB,
     ip_address VARCHAR(45),
     user_agent VARCHAR(500),
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT;
 
 CREATE INDEX idx_audit_logs_employee ON audit_logs(employee_id, timestamp);
 CREATE INDEX idx_audit_logs_action ON audit_logs(action, timestamp);
@@ -242,8 +322,12 @@ CREATE INDEX idx_audit_logs_action ON audit_logs(action, timestamp);
 -- 8. VIEWS FOR COMMON QUERIES
 -- ============================================
 
+-- Materialized so reporting reads never recompute the joins. Refreshed with
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY (needs the unique indexes below) by
+-- backend/services/reporting_service.py, which holds the same definitions.
+
 -- Current month scorecard per employee
-CREATE VIEW v_current_month_scorecard AS
+CREATE MATERIALIZED VIEW v_current_month_scorecard AS
 SELECT 
     e.employee_id,
     e.display_name,
@@ -253,8 +337,8 @@ SELECT
     COALESCE(m.tasks_ai_assisted, 0) AS tasks_automated,
     COALESCE(m.hours_saved, 0) AS hours_saved,
     COALESCE(m.tools_explored, 0) AS tools_explored,
-    EXTRACT(MONTH FROM CURRENT_DATE) AS month,
-    EXTRACT(YEAR FROM CURRENT_DATE) AS year
+    EXTRACT(MONTH FROM CURRENT_DATE)::INTEGER AS month,
+    EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER AS year
 FROM employees e
 LEFT JOIN departments d ON e.department_id = d.department_id
 LEFT JOIN ai_adoption_metrics m ON e.employee_id = m.employee_id 
@@ -262,8 +346,10 @@ LEFT JOIN ai_adoption_metrics m ON e.employee_id = m.employee_id
     AND m.year = EXTRACT(YEAR FROM CURRENT_DATE)
 WHERE e.status = 'active';
 
+CREATE UNIQUE INDEX ux_v_current_month_scorecard_employee_id ON v_current_month_scorecard(employee_id);
+
 -- Department leaderboard
-CREATE VIEW v_department_leaderboard AS
+CREATE MATERIALIZED VIEW v_department_leaderboard AS
 SELECT 
     d.department_id,
     d.name AS department_name,
@@ -279,26 +365,34 @@ LEFT JOIN employees e ON d.department_id = e.department_id AND e.status = 'activ
 LEFT JOIN ai_adoption_metrics m ON e.employee_id = m.employee_id 
     AND m.month = EXTRACT(MONTH FROM CURRENT_DATE) 
     AND m.year = EXTRACT(YEAR FROM CURRENT_DATE)
-GROUP BY d.department_id, d.name
-ORDER BY avg_score DESC;
+GROUP BY d.department_id, d.name;
+
+CREATE UNIQUE INDEX ux_v_department_leaderboard_department_id ON v_department_leaderboard(department_id);
 
--- User stats summary
-CREATE VIEW v_user_stats_summary AS
+-- User stats summary (pre-grouped per dimension; tools from the daily usage table)
+CREATE MATERIALIZED VIEW v_user_stats_summary AS
 SELECT 
     e.employee_id,
     e.display_name,
     COALESCE(up.total_points, 0) AS total_points,
-    COUNT(DISTINCT ub.badge_id) AS badge_count,
-    COUNT(DISTINCT CASE WHEN ulp.status = 'completed' THEN ulp.resource_id END) AS resources_completed,
-    COUNT(DISTINCT t.tool_id) AS tools_used
+    COALESCE(ub.n, 0) AS badge_count,
+    COALESCE(ulp.n, 0) AS resources_completed,
+    COALESCE(tu.n, 0) AS tools_used
 FROM employees e
 LEFT JOIN user_points up ON e.employee_id = up.employee_id
-LEFT JOIN user_badges ub ON e.employee_id = ub.employee_id
-LEFT JOIN user_learning_progress ulp ON e.employee_id = ulp.employee_id
-LEFT JOIN tool_access_logs tal ON e.employee_id = tal.employee_id
-LEFT JOIN ai_tools t ON tal.tool_id = t.tool_id
-WHERE e.status = 'active'
-GROUP BY e.employee_id, e.display_name, up.total_points;
+LEFT JOIN (
+    SELECT employee_id, COUNT(DISTINCT badge_id) AS n FROM user_badges GROUP BY employee_id
+) ub ON e.employee_id = ub.employee_id
+LEFT JOIN (
+    SELECT employee_id, COUNT(DISTINCT resource_id) AS n FROM user_learning_progress
+    WHERE status = 'completed' GROUP BY employee_id
+) ulp ON e.employee_id = ulp.employee_id
+LEFT JOIN (
+    SELECT employee_id, COUNT(DISTINCT tool_id) AS n FROM tool_usage_user_daily GROUP BY employee_id
+) tu ON e.employee_id = tu.employee_id
+WHERE e.status = 'active';
+
+CREATE UNIQUE INDEX ux_v_user_stats_summary_employee_id ON v_user_stats_summary(employee_id);
 
 -- ============================================
 -- 9. INDEXES FOR PERFORMANCE
@@ -356,6 +450,45 @@ CREATE TRIGGER trigger_audit_ai_adoption AFTER INSERT OR UPDATE ON ai_adoption_m
 CREATE TRIGGER trigger_audit_user_badges AFTER INSERT ON user_badges
     FOR EACH ROW EXECUTE FUNCTION audit_table_changes();
 
+-- ============================================
+-- 11. MONTHLY PARTITIONS FOR LOG TABLES
+-- ============================================
+
+-- Create the monthly partition of `parent` that contains `month_start`, named
+-- <parent>_yYYYYmMM. Rows that already landed in the default partition for
+-- that month are moved in before the partition is attached. Idempotent.
+-- Upcoming partitions and retention are managed by
+-- backend/services/partition_service.py.
+CREATE OR REPLACE FUNCTION create_monthly_partition(parent TEXT, month_start DATE)
+RETURNS TEXT AS $$
+DECLARE
+    lower_bound DATE := date_trunc('month', month_start)::DATE;
+    upper_bound DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::DATE;
+    partition_name TEXT := format('%s_y%sm%s', parent, to_char(lower_bound, 'YYYY'), to_char(lower_bound, 'MM'));
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name, parent);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM %I WHERE "timestamp" >= %L AND "timestamp" < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        parent || '_default', lower_bound, upper_bound, partition_name
+    );
+    EXECUTE format(
+        'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        parent, partition_name, lower_bound, upper_bound
+    );
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Current month plus the next three
+SELECT create_monthly_partition(parent, (date_trunc('month', CURRENT_DATE) + make_interval(months => n))::DATE)
+FROM unnest(ARRAY['tool_access_logs', 'audit_logs']) AS parent,
+     generate_series(0, 3) AS n;
+
 -- ============================================
 -- SCHEMA VERSION
 -- ============================================
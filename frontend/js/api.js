@@ -9,17 +9,22 @@
 const APIClient = {
     baseURL: 'http://localhost:8000/api',
 
+    // Last ETag and body per GET endpoint, for If-None-Match revalidation
+    etagCache: new Map(),
+
     /**
      * Make HTTP request with error handling
      */
     async request(method, endpoint, body = null) {
         const token = localStorage.getItem('auth_token');
+        const cached = method === 'GET' ? this.etagCache.get(endpoint) : undefined;
         
         const options = {
             method,
             headers: {
                 'Content-Type': 'application/json',
-                ...(token ? { 'Authorization': `Bearer ${token}` } : {})
+                ...(token ? { 'Authorization': `Bearer ${token}` } : {}),
+                ...(cached ? { 'If-None-Match': cached.etag } : {})
             }
         };
 
@@ -30,11 +35,20 @@ const APIClient = {
         try {
             const response = await fetch(`${this.baseURL}${endpoint}`, options);
             
+            if (response.status === 304 && cached) {
+                return cached.data;
+            }
+
             if (!response.ok) {
                 throw new Error(`API Error: ${response.status} ${response.statusText}`);
             }
 
-            return await response.json();
+            const data = await response.json();
+            const etag = response.headers.get('ETag');
+            if (method === 'GET' && etag) {
+                this.etagCache.set(endpoint, { etag, data });
+            }
+            return data;
         } catch (error) {
             console.error('API request error:', error);
             throw error;
@@ -52,6 +66,7 @@ const APIClient = {
     // Tools endpoints
     tools: {
         getCatalog: () => APIClient.request('GET', '/tools/catalog'),
+        search: (params = {}) => APIClient.request('GET', `/tools?${new URLSearchParams(params)}`),
         accessTool: (toolId) => APIClient.request('POST', `/tools/${toolId}/access`, {}),
         getCategories: () => APIClient.request('GET', '/tools/categories')
     },
@@ -69,14 +84,34 @@ const APIClient = {
         getBadges: () => APIClient.request('GET', '/badges'),
         getChallenges: () => APIClient.request('GET', '/challenges'),
         getPoints: () => APIClient.request('GET', '/points'),
-        getLeaderboard: () => APIClient.request('GET', '/leaderboard')
+        getLeaderboard: (skip = 0, limit = 100) => APIClient.request('GET', `/leaderboard?skip=${skip}&limit=${limit}`),
+        getMyRank: (radius = 5) => APIClient.request('GET', `/leaderboard/me?radius=${radius}`)
     },
 
     // Notifications endpoints
     notifications: {
-        getList: () => APIClient.request('GET', '/notifications'),
+        getList: (limit = 50, cursor = null) => APIClient.request('GET', `/notifications?${new URLSearchParams({ limit, ...(cursor ? { cursor } : {}) })}`),
+        // Push updates over server-sent events; returns the EventSource (call .close() to stop)
+        subscribe: (onNotification, onUnread) => {
+            const source = new EventSource(`${APIClient.baseURL}/notifications/stream`);
+            // The server may resend recent rows after a reconnect; deliver each id once
+            const seen = new Set();
+            source.addEventListener('notification', (e) => {
+                const notification = JSON.parse(e.data);
+                if (seen.has(notification.id)) return;
+                seen.add(notification.id);
+                onNotification(notification);
+            });
+            if (onUnread) {
+                source.addEventListener('unread', (e) => onUnread(JSON.parse(e.data).unread));
+            }
+            return source;
+        },
+        getUnreadCount: () => APIClient.request('GET', '/notifications/unread-count'),
         markRead: (notifId) => APIClient.request('POST', `/notifications/${notifId}/read`, {}),
-        markAllRead: () => APIClient.request('POST', '/notifications/read-all', {})
+        markManyRead: (ids) => APIClient.request('POST', '/notifications/read', { ids }),
+        markAllRead: () => APIClient.request('POST', '/notifications/read-all', {}),
+        broadcast: (data) => APIClient.request('POST', '/notifications/broadcast', data)
     },
 
     // User endpoints
@@ -89,7 +124,7 @@ const APIClient = {
     // Analytics endpoints
     analytics: {
         getROI: () => APIClient.request('GET', '/analytics/roi'),
-        getTrends: (months = 6) => APIClient.request('GET', `/analytics/trends?months=${months}`),
+        getTrends: (months = 6, filters = {}) => APIClient.request('GET', `/analytics/trends?${new URLSearchParams({ months, ...filters })}`),
         getDepartmentStats: (deptId) => APIClient.request('GET', `/analytics/departments/${deptId}`)
     }
 };
@@ -1,10 +1,26 @@
 #!/usr/bin/env python3
+"""
+Synthetic user data generator for load testing
+
+Users are generated in shards across a process pool. Each shard has its own
+seeded RNG and a contiguous userId range, so output is reproducible for a
+given --seed and --shards regardless of --workers. Shards are streamed to
+disk as NDJSON (or compact JSON arrays). Leaderboard ranks come from merging
+per-shard point histograms, not from sorting every user in memory.
+
+Usage:
+    python generate_testdata.py --users 1000000 --shards 32 --workers 8
+"""
+import argparse
 import json
+import os
 import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
-# Seed for reproducibility
-random.seed(42)
+# Fixed so the default output does not depend on the machine's core count
+DEFAULT_SHARDS = 8
 
 # Data templates
 first_names_arabic = ['Mohammed', 'Ahmed', 'Ali', 'Hassan', 'Khalid', 'Omar', 'Saleh', 'Ibrahim', 'Nabil', 'Faisal', 'Jamal', 'Tariq', 'Wael', 'Karim', 'Majed', 'Yousef', 'Rashid', 'Mansour', 'Saeed', 'Amr']
@@ -58,24 +74,24 @@ ai_tools = [
     'Employee Analytics'
 ]
 
-def generate_name():
-    rand = random.random()
+def generate_name(rng):
+    rand = rng.random()
     if rand < 0.25:
-        return random.choice(first_names_arabic) + ' ' + random.choice(last_names_arabic)
+        return rng.choice(first_names_arabic) + ' ' + rng.choice(last_names_arabic)
     elif rand < 0.35:
-        return random.choice(first_names_female_arabic) + ' ' + random.choice(last_names_arabic)
+        return rng.choice(first_names_female_arabic) + ' ' + rng.choice(last_names_arabic)
     elif rand < 0.55:
-        return random.choice(first_names_western) + ' ' + random.choice(last_names_western)
+        return rng.choice(first_names_western) + ' ' + rng.choice(last_names_western)
     elif rand < 0.65:
-        return random.choice(first_names_female_western) + ' ' + random.choice(last_names_western)
+        return rng.choice(first_names_female_western) + ' ' + rng.choice(last_names_western)
     else:
-        return random.choice(first_names_indian) + ' ' + random.choice(last_names_western)
+        return rng.choice(first_names_indian) + ' ' + rng.choice(last_names_western)
 
-def generate_user(user_id):
-    join_year = random.randint(2015, 2024)
-    dept = random.choice(departments)
-    role = random.choice(roles_by_dept[dept])
-    location = random.choice(locations)
+def generate_user(user_id, rng, as_of):
+    join_year = rng.randint(2015, 2024)
+    dept = rng.choice(departments)
+    role = rng.choice(roles_by_dept[dept])
+    location = rng.choice(locations)
     
     # Seniority mapping
     is_senior = 'Manager' in role or 'Lead' in role or 'Supervisor' in role or 'VP' in role or 'Chief' in role or 'Director' in role or 'Officer' in role or 'CFO' in role or 'Controller' in role or 'Treasurer' in role
@@ -83,25 +99,25 @@ def generate_user(user_id):
     
     # Adoption score correlates with tenure and seniority
     if is_senior:
-        base_adoption = random.randint(75, 88)
+        base_adoption = rng.randint(75, 88)
     elif years_tenure >= 5:
-        base_adoption = random.randint(65, 82)
+        base_adoption = rng.randint(65, 82)
     elif years_tenure >= 3:
-        base_adoption = random.randint(55, 75)
+        base_adoption = rng.randint(55, 75)
     else:
-        base_adoption = random.randint(45, 65)
+        base_adoption = rng.randint(45, 65)
     
     adoption_score = min(100, base_adoption)
     
     # Generate monthly trend (realistic progression)
     trend = []
-    current = max(30, adoption_score - random.randint(8, 15))
+    current = max(30, adoption_score - rng.randint(8, 15))
     for _ in range(6):
         trend.append(current)
-        current = min(adoption_score, current + random.randint(1, 4))
+        current = min(adoption_score, current + rng.randint(1, 4))
     
     ai_tools_count = max(1, min(5, (adoption_score // 20)))
-    tools_used = random.sample(ai_tools, ai_tools_count)
+    tools_used = rng.sample(ai_tools, ai_tools_count)
     
     tasks_automated = max(1, int((adoption_score / 100) * 45))
     
@@ -121,7 +137,7 @@ def generate_user(user_id):
         badges.append('Power User')
     if adoption_score >= 85:
         badges.append('AI Innovator')
-    if adoption_score >= 75 and random.random() < 0.4:
+    if adoption_score >= 75 and rng.random() < 0.4:
         badges.append('Learning Champion')
     
     # Learning path
@@ -152,31 +168,31 @@ def generate_user(user_id):
     
     if adoption_score >= 80:
         roi_category = 'High'
-        productivity_gain = random.randint(18, 25)
+        productivity_gain = rng.randint(18, 25)
     elif adoption_score >= 60:
         roi_category = 'Medium'
-        productivity_gain = random.randint(10, 17)
+        productivity_gain = rng.randint(10, 17)
     else:
         roi_category = 'Low'
-        productivity_gain = random.randint(5, 9)
+        productivity_gain = rng.randint(5, 9)
     
     # Leaderboard points correlate with adoption
     leaderboard_points = int((adoption_score / 100) * 8750)
     
     # Monthly tasks trend
     tasks_trend = []
-    current_tasks = max(1, tasks_automated - random.randint(4, 8))
+    current_tasks = max(1, tasks_automated - rng.randint(4, 8))
     for _ in range(6):
         tasks_trend.append(current_tasks)
-        current_tasks = min(tasks_automated, current_tasks + random.randint(0, 2))
+        current_tasks = min(tasks_automated, current_tasks + rng.randint(0, 2))
     
     # Last active date (within 90 days)
-    days_ago = random.randint(0, 90)
-    last_active = (datetime.now() - timedelta(days=days_ago)).strftime('%Y-%m-%d')
+    days_ago = rng.randint(0, 90)
+    last_active = (as_of - timedelta(days=days_ago)).strftime('%Y-%m-%d')
     
     return {
         'userId': user_id,
-        'employeeName': generate_name(),
+        'employeeName': generate_name(rng),
         'department': dept,
         'role': role,
         'location': location,
@@ -190,7 +206,7 @@ def generate_user(user_id):
         'leaderboardPoints': leaderboard_points,
         'leaderboardRank': 0,
         'aiToolsUsed': tools_used,
-        'ssoEnabled': random.random() < 0.95,
+        'ssoEnabled': rng.random() < 0.95,
         'learningPath': learning_path,
         'tutorialsCompleted': tutorials_completed,
         'certificationsEarned': certs,
@@ -202,23 +218,148 @@ def generate_user(user_id):
         'monthlyTasksAutomatedTrend': tasks_trend
     }
 
-# Generate 1050 users (to include 50 seed + 1000 generated)
-users = []
-for i in range(1051, 2101):
-    users.append(generate_user(i))
+# ============================================
+# SHARDED GENERATION
+# ============================================
+
+def shard_bounds(shard, shards, users, start_id):
+    """Return the [first, last) userId range owned by a shard"""
+    per_shard, extra = divmod(users, shards)
+    first = start_id + shard * per_shard + min(shard, extra)
+    size = per_shard + (1 if shard < extra else 0)
+    return first, first + size
+
+
+def shard_path(output_dir, shard, shards, fmt):
+    extension = 'ndjson' if fmt == 'ndjson' else 'json'
+    return os.path.join(output_dir, f'users-{shard:05d}-of-{shards:05d}.{extension}')
+
+
+def write_records(path, records, fmt):
+    """Stream records to a shard file; returns the number written"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        if fmt == 'json':
+            f.write('[')
+        for record in records:
+            if fmt == 'json':
+                f.write(',\n' if count else '\n')
+                f.write(json.dumps(record, separators=(',', ':')))
+            else:
+                f.write(json.dumps(record, separators=(',', ':')))
+                f.write('\n')
+            count += 1
+        if fmt == 'json':
+            f.write('\n]\n')
+    return count
+
+
+def read_records(path):
+    """Read back a shard written by write_records, one record at a time"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip().rstrip(',')
+            if line and line not in ('[', ']'):
+                yield json.loads(line)
+
+
+def generate_shard(task):
+    """Pass 1: generate a shard without ranks; returns its points histogram"""
+    shard, config = task
+    rng = random.Random(f"{config['seed']}:{config['shards']}:{shard}")
+    as_of = datetime.strptime(config['as_of'], '%Y-%m-%d')
+    first, last = shard_bounds(shard, config['shards'], config['users'], config['start_id'])
+
+    histogram = Counter()
+
+    def records():
+        for user_id in range(first, last):
+            user = generate_user(user_id, rng, as_of)
+            histogram[user['leaderboardPoints']] += 1
+            yield user
+
+    path = shard_path(config['output_dir'], shard, config['shards'], config['format'])
+    write_records(path + '.part', records(), config['format'])
+    return shard, histogram
+
+
+def rank_shard(task):
+    """Pass 2: stamp global leaderboard ranks into a generated shard"""
+    shard, offsets, config = task
+    path = shard_path(config['output_dir'], shard, config['shards'], config['format'])
+    seen = Counter()
+
+    def ranked():
+        for user in read_records(path + '.part'):
+            points = user['leaderboardPoints']
+            user['leaderboardRank'] = offsets[points] + seen[points] + 1
+            seen[points] += 1
+            yield user
+
+    count = write_records(path, ranked(), config['format'])
+    os.remove(path + '.part')
+    return count
+
+
+def merge_rank_offsets(histograms):
+    """
+    Turn per-shard point histograms into per-shard rank offsets.
+
+    Users are ranked by points descending, ties broken by userId ascending.
+    Shards own ascending userId ranges, so a user's rank is: everyone with
+    more points, plus users on the same points in earlier shards, plus those
+    before it in its own shard (counted while stamping).
+    """
+    totals = Counter()
+    for histogram in histograms:
+        totals.update(histogram)
+
+    higher = {}
+    running = 0
+    for points in sorted(totals, reverse=True):
+        higher[points] = running
+        running += totals[points]
+
+    offsets = []
+    earlier = Counter()
+    for histogram in histograms:
+        offsets.append({points: higher[points] + earlier[points] for points in histogram})
+        earlier.update(histogram)
+    return offsets
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic AI Hub user test data')
+    parser.add_argument('--users', type=int, default=1050)
+    parser.add_argument('--start-id', type=int, default=1051)
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--format', choices=['ndjson', 'json'], default='ndjson')
+    parser.add_argument('--as-of', default='2026-01-28', help='Reference date for lastActiveDate (YYYY-MM-DD)')
+    parser.add_argument('--output-dir', default=os.path.join('data', 'generated'))
+    args = parser.parse_args()
+
+    shards = max(1, min(args.shards, args.users))
+    config = {
+        'users': args.users,
+        'start_id': args.start_id,
+        'shards': shards,
+        'seed': args.seed,
+        'format': args.format,
+        'as_of': args.as_of,
+        'output_dir': args.output_dir,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
 
-# Assign leaderboard ranks based on leaderboard points
-users_sorted = sorted(users, key=lambda x: x['leaderboardPoints'], reverse=True)
-for rank, user in enumerate(users_sorted, 1):
-    user['leaderboardRank'] = rank
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = dict(pool.map(generate_shard, [(shard, config) for shard in range(shards)]))
+        offsets = merge_rank_offsets([results[shard] for shard in range(shards)])
+        total = sum(pool.map(rank_shard, [(shard, offsets[shard], config) for shard in range(shards)]))
 
-# Randomize order
-random.shuffle(users)
+    print(f'Generated {total} user records in {shards} shards')
+    print(f'Saved to {args.output_dir}')
 
-# Save to JSON
-output_file = r'data\users_testdata_full.json'
-with open(output_file, 'w') as f:
-    json.dump(users, f, indent=2)
 
-print(f'Generated {len(users)} user records')
-print(f'Saved to {output_file}')
+if __name__ == '__main__':
+    main()